@@ -1,213 +1,269 @@
-####################################################################################################
-#NOTE: Some sections of this library have been commented out
-## This is because it is too large to use with the other libraries and only limited
-## functionality is needed
-####################################################################################################
 import ustruct
+import regcache
+from micropython import const
+
+#Registers and bit fields are const integers (names starting with an underscore are inlined by
+#the compiler and take no RAM), lookups are tuples/bytes rather than dicts
+#- Slave Addr
+_SLAVE_ADDR = const(0x29)
+#- I2C Command Bits
+_COMMAND_CMD_BIT    = const(0x80)
+_COMMAND_TYPE_RPT   = const(0x00) #Repeated byte protocol transaction
+_COMMAND_TYPE_AUTO  = const(0x20) #Auto-increment protocol transaction
+_COMMAND_TYPE_SPEC  = const(0x60) #Special function
+_COMMAND_SF_BITS    = const(0x06) #Special function: clear interrupt
+#- Registers
+_REG_ENABLE     = const(0x00) #Enables states and interrupts
+_REG_ATIME      = const(0x01) #RGBC time
+_REG_WTIME      = const(0x03) #Wait time
+_REG_AILTL      = const(0x04) #Clear interrupt low threshold low byte
+_REG_AILTH      = const(0x05) #Clear interrupt low threshold high byte
+_REG_AIHTL      = const(0x06) #Clear interrupt high threshold low byte
+_REG_AIHTH      = const(0x07) #Clear interrupt high threshold high byte
+_REG_PERS       = const(0x0C) #Interrupt persistence filter
+_REG_CONFIG     = const(0x0D) #Configuration
+_REG_CONTROL    = const(0x0F) #Control
+_REG_ID         = const(0x12) #Device ID
+_REG_STATUS     = const(0x13) #Device status
+_REG_CDATAL     = const(0x14) #Clear data low byte
+_REG_CDATAH     = const(0x15) #Clear data high byte
+_REG_RDATAL     = const(0x16) #Red data low byte
+_REG_RDATAH     = const(0x17) #Red data high byte
+_REG_GDATAL     = const(0x18) #Green data low byte
+_REG_GDATAH     = const(0x19) #Green data high byte
+_REG_BDATAL     = const(0x1A) #Blue data low byte
+_REG_BDATAH     = const(0x1B) #Blue data high byte
+#- Enable register bits
+_ENABLE_PON     = const(0x01) #Power on
+_ENABLE_AEN     = const(0x02) #RGBC enable
+_ENABLE_WEN     = const(0x08) #Wait enable
+_ENABLE_AIEN    = const(0x10) #RGBC interrupt enable
+#- Config register bits
+_CONFIG_WLONG   = const(0x02) #Wait cycles increased by a factor 12x from WTIME reg
+#- Status register bits
+_STATUS_AVALID  = const(0x01) #RGBC integration cycle complete
+_STATUS_AINT    = const(0x10) #Clear channel interrupt
 
 class TCS34725Lib:
     #Constants
-    #- Slave Addr
-    __SLAVE_ADDR = 0x29
-    #- I2C Command Bits
-    __COMMAND_CMD_BIT = 0x80
-    __COMMAND_TYPE_BITS = {
-        "RPT"   : 0x00, #Repeated byte protocol transaction
-        "AUTO"  : 0x20, #Auto-increment protocol transaction
-        "SPEC"  : 0x60 #Special function
-    }
-    __COMMAND_SF_BITS = 0x06
-    #- I2C Enable Register Bits
-
-    #Types
-    #- Registers
-    INTERNAL_REGISTER = {
-        "ENABLE"    : 0x00, #Enables states and interrupts
-        #"ATIME"     : 0x01, #RGBC time
-        #"WTIME"     : 0x03, #Wait time
-        #"AILTL"     : 0x04, #Clear interrupt low threshold low byte
-        #"AILTH"     : 0x05, #Clear interrupt low threshold high byte
-        #"AIHTL"     : 0x06, #Clear interrupt high threshold low byte
-        #"AIHTH"     : 0x07, #Clear interrupt high threshold high byte
-        #"PERS"      : 0x0C, #Interrupt persistence filter
-        #"CONFIG"    : 0x0D, #Configuration
-        #"CONTROL"   : 0x0F, #Control
-        "ID"        : 0x12, #Device ID
-        "STATUS"    : 0x13, #Device status
-        "CDATAL"    : 0x14, #Clear data low byte
-        #"CDATAH"    : 0x15, #Clear data high byte
-        "RDATAL"    : 0x16, #Red data low byte
-        #"RDATAH"    : 0x17, #Red data high byte
-        "GDATAL"    : 0x18, #Green data low byte
-        #"GDATAH"    : 0x19, #Green data high byte
-        "BDATAL"    : 0x1A, #Blue data low byte
-        #"BDATAH"    : 0x1B  #Blue data high byte
-    }
-    #- RGBC Timing
-    RGBC_INTEG_CYCLES = {
-    #Integ cycles : Value, Time, Max Count
-        1   : 0xFF, #2.4ms, 1024
-        10  : 0xF6, #24ms, 10240
-        42  : 0xD5, #101ms, 43008
-        64  : 0xC0, #154ms, 65535
-        256 : 0x00  #700ms, 65535
-    }
-    #- Wait Times for WTIME reg
-    WAIT_TIMES = {
-    #Wait time : Reg value, Time (WLONG = 0), Time (WLONG = 1)
-        1   : 0xFF, #2.4ms, 0.029s
-        85  : 0xAB, #204ms, 2.45s
-        256 : 0x00  #614ms, 7.4s
-    }
-    ##- Persistence Values
-    #PERS_VALUES = {
-    #    0   : 0x0, #Every RGBC cycle generates an interrupt
-    #    1   : 0x1, #1 clear channel consecutive values out of range
-    #    2   : 0x2, #2 clear channel consecutive values out of range
-    #    3   : 0x3, #3 clear channel consecutive values out of range
-    #    5   : 0x4, #5 clear channel consecutive values out of range
-    #    10  : 0x5, #10 clear channel consecutive values out of range
-    #    15  : 0x6, #15 clear channel consecutive values out of range
-    #    20  : 0x7, #20 clear channel consecutive values out of range
-    #    25  : 0x8, #25 clear channel consecutive values out of range
-    #    30  : 0x9, #30 clear channel consecutive values out of range
-    #    35  : 0xA, #35 clear channel consecutive values out of range
-    #    40  : 0xB, #40 clear channel consecutive values out of range
-    #    45  : 0xC, #45 clear channel consecutive values out of range
-    #    50  : 0xD, #50 clear channel consecutive values out of range
-    #    55  : 0xE, #55 clear channel consecutive values out of range
-    #    60  : 0xF  #60 clear channel consecutive values out of range
-    #}
-    #- Control register bits (RGBC gain)
-    RGBC_GAINS = {
-        1   : 0x0, #1x gain
-        4   : 0x1, #4x gain
-        16  : 0x2, #16x gain
-        60  : 0x3  #60x gain
-    }
+    #- I2C address (fixed)
+    SLAVE_ADDR = _SLAVE_ADDR
+    #- RGBC Timing: integration cycles and ATIME value at the same index
+    ## 2.4ms/1024, 24ms/10240, 101ms/43008, 154ms/65535, 700ms/65535 (time, max count)
+    RGBC_INTEG_CYCLES = (1, 10, 42, 64, 256)
+    RGBC_ATIME = b'\xff\xf6\xd5\xc0\x00'
+    #- Wait times (cycles) and WTIME value at the same index
+    ## 2.4ms/0.029s, 204ms/2.45s, 614ms/7.4s (time with WLONG = 0, WLONG = 1)
+    WAIT_TIMES = (1, 85, 256)
+    WAIT_WTIME = b'\xff\xab\x00'
+    #- Persistence: consecutive clear channel values out of range before an interrupt, index is PERS value
+    ## 0: every RGBC cycle generates an interrupt
+    PERS_VALUES = b'\x00\x01\x02\x03\x05\x0a\x0f\x14\x19\x1e\x23\x28\x2d\x32\x37\x3c'
+    #- RGBC gains, index is control register value
+    RGBC_GAINS = (1, 4, 16, 60)
+    #- Auto-ranging settings, index is integration cycles index * 4 + gain index
+    AUTO_RANGE_CYCLES = RGBC_INTEG_CYCLES
+    AUTO_RANGE_GAINS = RGBC_GAINS
+    AUTO_RANGES = (
+        #Integration time (0.1ms), Gain, Max count
+        (24,   1,  1024), #2.4ms
+        (24,   4,  1024),
+        (24,   16, 1024),
+        (24,   60, 1024),
+        (240,  1,  10240), #24ms
+        (240,  4,  10240),
+        (240,  16, 10240),
+        (240,  60, 10240),
+        (1008, 1,  43008), #101ms
+        (1008, 4,  43008),
+        (1008, 16, 43008),
+        (1008, 60, 43008),
+        (1536, 1,  65535), #154ms
+        (1536, 4,  65535),
+        (1536, 16, 65535),
+        (1536, 60, 65535),
+        (6144, 1,  65535), #700ms
+        (6144, 4,  65535),
+        (6144, 16, 65535),
+        (6144, 60, 65535)
+    )
 
     #Constructor
-    def __init__(self,i2c):
+    ## snapshot: configuration registers saved with Snapshot(), when the device has kept them since
+    def __init__(self,i2c,snapshot=None):
         self.i2c = i2c; #Keep reference of I2C module
-        self.__regEnable = 0x00 #Enable register initial value
+        #Scratch buffer for all transfers, with fixed length views so register access doesn't allocate
+        ## Shared by every method, so the driver must not be used from a hard interrupt handler
+        self.__buf = bytearray(8)
+        view = memoryview(self.__buf)
+        self.__buf1 = view[:1]
+        self.__buf2 = view[:2]
+        self.__buf8 = view
+        #Shadow of configuration registers (ENABLE through CONTROL, and ID), loaded from device
+        self.__cache = regcache.RegCache(self.__ReadData, self.__WriteData, 0x13,
+            (_REG_ENABLE, _REG_ATIME, _REG_WTIME, _REG_AILTL, _REG_AILTH, _REG_AIHTL, _REG_AIHTH, _REG_PERS, _REG_CONFIG, _REG_CONTROL, _REG_ID), snapshot)
+
+    #Copy of the configuration registers (for the constructor after a restart of the host only)
+    def Snapshot(self):
+        return self.__cache.Snapshot()
 
     #Writes data to a particular register (or two registers)
     def __WriteData(self,reg,data,length):
-        if length == 1: #Single byte, pack as data
-            sendData = ustruct.pack("<B",data)
-        elif length == 2: #Multibyte, pack as data
-            sendData = ustruct.pack("<H",data)
+        buf = self.__buf
+        buf[0] = data & 0xFF
+        if length == 1: #Single byte
+            sendData = self.__buf1
+        elif length == 2: #Multibyte, little endian
+            buf[1] = data >> 8
+            sendData = self.__buf2
         else: #Otherwise, doesn't accept this
             raise Exception("Unsupported data write length")
-        reg |= TCS34725Lib.__COMMAND_CMD_BIT | TCS34725Lib.__COMMAND_TYPE_BITS["AUTO"] #Add bit to access command register and setup auto write next byte
-        self.i2c.writeto_mem(TCS34725Lib.__SLAVE_ADDR, reg, sendData) #Write to register
+        reg |= _COMMAND_CMD_BIT | _COMMAND_TYPE_AUTO #Add bit to access command register and setup auto write next byte
+        self.i2c.writeto_mem(_SLAVE_ADDR, reg, sendData) #Write to register
 
     #Read data from a particular register (or two registers)
     def __ReadData(self,reg,length):
-        reg |= TCS34725Lib.__COMMAND_CMD_BIT | TCS34725Lib.__COMMAND_TYPE_BITS["AUTO"] #Add bits to access command register and setup auto read next byte
-        data = self.i2c.readfrom_mem(TCS34725Lib.__SLAVE_ADDR, reg, length) #Read register (length number of bytes)
-        if length == 1: #Single byte, unpack data as byte
-            return ustruct.unpack("<B",data)[0]
-        elif length == 2: #Multibyte, unpack data as short
-            return ustruct.unpack("<H",data)[0]
+        reg |= _COMMAND_CMD_BIT | _COMMAND_TYPE_AUTO #Add bits to access command register and setup auto read next byte
+        buf = self.__buf
+        if length == 1: #Single byte
+            self.i2c.readfrom_mem_into(_SLAVE_ADDR, reg, self.__buf1)
+            return buf[0]
+        elif length == 2: #Multibyte, unsigned short little endian
+            self.i2c.readfrom_mem_into(_SLAVE_ADDR, reg, self.__buf2)
+            return buf[0] | (buf[1] << 8)
         else: #Otherwise doesn't accept this
             raise Exception("Unsupported data read length")
 
+    #Reload register shadow from device (e.g. after device has been reset)
+    def Resync(self):
+        self.__cache.Resync()
+
+    #Set or clear bits of the enable register
+    def __SetEnable(self,setBits,clrBits):
+        regEnable = (self.__cache.Read(_REG_ENABLE) & ~clrBits) | setBits
+        self.__cache.Write(_REG_ENABLE,regEnable,1)
+
     #Clear Current Interrupt
     def ClrIntr(self):
-        #Address command reg, special mode: clear interrupt
-        reg = 0x00 | TCS34725Lib.__COMMAND_CMD_BIT | TCS34725Lib.__COMMAND_TYPE_BITS["SPEC"] | TCS34725Lib.__COMMAND_SF_BITS
-        self.i2c.writeto_mem(TCS34725Lib.__SLAVE_ADDR, reg, b'\x00') #Write command
+        #Address command reg, special mode: clear interrupt (command byte only, no data follows)
+        self.__buf[0] = _COMMAND_CMD_BIT | _COMMAND_TYPE_SPEC | _COMMAND_SF_BITS
+        self.i2c.writeto(_SLAVE_ADDR, self.__buf1)
 
     #Enable interrupt for RGBC detection
     def EnableIntrRGBC(self):
-        self.__regEnable |= 0x10 #Set AIEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(_ENABLE_AIEN,0x00) #Set AIEN bit
 
     #Disable interrupt for RGBC detection
     def DisableIntrRGBC(self):
-        self.__regEnable &= 0xEF #Clear AIEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(0x00,_ENABLE_AIEN) #Clear AIEN bit
 
     #Enable wait timers
     def EnableWaitTimer(self):
-        self.__regEnable |= 0x08 #Set WEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(_ENABLE_WEN,0x00) #Set WEN bit
 
     #Disable wait timers
     def DisableWaitTimer(self):
-        self.__regEnable &= 0xF7 #Clear WEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(0x00,_ENABLE_WEN) #Clear WEN bit
 
     #Enable RGBC detection
     def EnableRGBC(self):
-        self.__regEnable |= 0x02 #Set AEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(_ENABLE_AEN,0x00) #Set AEN bit
 
     #Disable RGBC detection
     def DisableRGBC(self):
-        self.__regEnable &= 0xFD #Clear AEN bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(0x00,_ENABLE_AEN) #Clear AEN bit
 
     #Turn on device
     def PowerOn(self):
-        self.__regEnable |= 0x01 #Set PON bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(_ENABLE_PON,0x00) #Set PON bit
 
     #Turn off device
     def PowerOff(self):
-        self.__regEnable &= 0xFE #Clear PON bit
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ENABLE"],self.__regEnable,1)
+        self.__SetEnable(0x00,_ENABLE_PON) #Clear PON bit
 
     #Set timing mode of device
     def SetRGBCTiming(self,mode):
         if mode in TCS34725Lib.RGBC_INTEG_CYCLES: #If mode exists, write to device
-            self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["ATIME"],TCS34725Lib.RGBC_INTEG_CYCLES[mode],1)
+            self.__cache.Write(_REG_ATIME,TCS34725Lib.RGBC_ATIME[TCS34725Lib.RGBC_INTEG_CYCLES.index(mode)],1)
         else: #Otherwise error
             raise Exception("Unexpected timing mode")
 
+    #Get RGBC integration time in ms (each integration cycle is 2.4ms)
+    def GetIntegTimeMs(self):
+        cycles = 256 - self.__cache.Read(_REG_ATIME)
+        return (cycles * 24 + 9) // 10 #Round up to whole ms
+
+    #Get time between RGBC results in ms (integration time, plus wait time when the wait timer is enabled)
+    def GetCycleTimeMs(self):
+        cycles = 256 - self.__cache.Read(_REG_ATIME)
+        if self.__cache.Read(_REG_ENABLE) & _ENABLE_WEN:
+            wait = 256 - self.__cache.Read(_REG_WTIME)
+            if self.__cache.Read(_REG_CONFIG) & _CONFIG_WLONG:
+                wait *= 12
+            cycles += wait
+        return (cycles * 24 + 9) // 10 #Round up to whole ms
+
+    #Get index into AUTO_RANGES of current setting
+    def GetRange(self):
+        cycles = 256 - self.__cache.Read(_REG_ATIME)
+        gain = self.__cache.Read(_REG_CONTROL) & 0x03
+        #Closest listed integration time not shorter than current
+        for i in range(len(TCS34725Lib.AUTO_RANGE_CYCLES)):
+            if TCS34725Lib.AUTO_RANGE_CYCLES[i] >= cycles:
+                return i * 4 + gain
+        return (len(TCS34725Lib.AUTO_RANGE_CYCLES) - 1) * 4 + gain
+
+    #Set integration time and gain from AUTO_RANGES index
+    def SetRange(self,index):
+        if index < 0 or index >= len(TCS34725Lib.AUTO_RANGES):
+            raise Exception("Range index is not valid")
+        self.SetRGBCTiming(TCS34725Lib.AUTO_RANGE_CYCLES[index >> 2])
+        self.SetRGBCGain(TCS34725Lib.AUTO_RANGE_GAINS[index & 0x03])
+
     #Set size of wait timer
     def SetWaitTime(self,wait):
         if wait in TCS34725Lib.WAIT_TIMES: #If wait time exists, write to device
-            self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["WTIME"],TCS34725Lib.WAIT_TIMES[wait],1)
+            self.__cache.Write(_REG_WTIME,TCS34725Lib.WAIT_WTIME[TCS34725Lib.WAIT_TIMES.index(wait)],1)
         else: #Otherwise error
             raise Exception("Unexpected wait time")
 
-    #Set lower interrupt threshold
+    #Set lower interrupt threshold (clear channel count)
     def SetRGBCLowIntr(self,value):
-        if value > 255 or value < 0: #Make sure value is within unsigned byte size
+        if value > 65535 or value < 0: #Make sure value is within unsigned short size
             raise Exception("Value out of bounds")
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["AILTL"],value,2)
+        self.__cache.Write(_REG_AILTL,value,2)
 
-    #Set higher interrupt threshold
+    #Set higher interrupt threshold (clear channel count)
     def SetRGBCHighIntr(self,value):
-        if value > 255 or value < 0: #Make sure value is within unsigned byte size
+        if value > 65535 or value < 0: #Make sure value is within unsigned short size
             raise Exception("Value out of bounds")
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["AIHTL"],value,2)
+        self.__cache.Write(_REG_AIHTL,value,2)
 
-    ##Set persistence of interrupt
-    #def SetIntrPers(self,pers):
-    #    self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["PERS"],TCS34725Lib.PERS_VALUES[pers],1)
+    #Set persistence of interrupt (consecutive out of range values, one of PERS_VALUES)
+    def SetIntrPers(self,pers):
+        index = TCS34725Lib.PERS_VALUES.find(bytes((pers,))) if 0 <= pers <= 255 else -1
+        if index < 0:
+            raise Exception("Unexpected persistence value")
+        self.__cache.Write(_REG_PERS,index,1)
 
     #Set wait long mode
     def SetWaitLong(self): #Wait long: when asserted wait cycles are increased by a factor 12x from WTIME reg
-        WLONG_BIT = 0x02 #Wait long command bits
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["CONFIG"],WLONG_BIT,1)
+        self.__cache.Write(_REG_CONFIG,_CONFIG_WLONG,1)
 
     #Turn off wait long mode
     def UnsetWaitLong(self):
-        self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["CONFIG"],0x00,1)
+        self.__cache.Write(_REG_CONFIG,0x00,1)
 
     #Set gain of RGBC device
     def SetRGBCGain(self,gain):
         if gain in TCS34725Lib.RGBC_GAINS: #If actual gain value, write to device
-            self.__WriteData(TCS34725Lib.INTERNAL_REGISTER["CONTROL"],TCS34725Lib.RGBC_GAINS[gain],1)
+            self.__cache.Write(_REG_CONTROL,TCS34725Lib.RGBC_GAINS.index(gain),1)
         else: #Otherwise error
             raise Exception("Invalid gain value")
 
     #Get ID of device
     def GetID(self):
-        idVal = self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["ID"],1) #Get ID
+        idVal = self.__cache.Read(_REG_ID,1) #Get ID
         #Convert to string
         if idVal == 0x44:
             return "TCS34721/TCS347235"
@@ -218,24 +274,59 @@ class TCS34725Lib:
 
     #Get value of clear colour interrupt
     def GetRGBCIntrClr(self):
-        return (self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["STATUS"],1) & 0x10) >> 4
+        return (self.__ReadData(_REG_STATUS,1) & _STATUS_AINT) >> 4
 
     #Check if RGBC integration cycle is complete
     def GetRGBCValid(self):
-        return self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["STATUS"],1) & 0x01
+        return self.__ReadData(_REG_STATUS,1) & _STATUS_AVALID
 
     #Get value of clear colour data
     def GetClearDataByte(self):
-        return self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["CDATAL"],2)
+        return self.__ReadData(_REG_CDATAL,2)
 
     #Get value of red colour data
     def GetRedDataByte(self):
-        return self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["RDATAL"],2)
+        return self.__ReadData(_REG_RDATAL,2)
 
     #Get value of green colour data
     def GetGreenDataByte(self):
-        return self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["GDATAL"],2)
+        return self.__ReadData(_REG_GDATAL,2)
 
     #Get value of blue colour data
     def GetBlueDataByte(self):
-        return self.__ReadData(TCS34725Lib.INTERNAL_REGISTER["BDATAL"],2)
+        return self.__ReadData(_REG_BDATAL,2)
+
+    #Read all colour channels in a single transaction, as (red, green, blue, clear)
+    ## into: optional array/list of 4 to fill and return instead of a new tuple (no allocation)
+    def ReadRGBC(self,into=None):
+        #Auto-increment from CDATAL through BDATAH (8 bytes) so all channels come from the same integration cycle
+        reg = _REG_CDATAL | _COMMAND_CMD_BIT | _COMMAND_TYPE_AUTO
+        buf = self.__buf
+        self.i2c.readfrom_mem_into(_SLAVE_ADDR, reg, self.__buf8)
+        if into is None:
+            clear, red, green, blue = ustruct.unpack_from("<HHHH",buf) #Registers are ordered clear, red, green, blue
+            return red, green, blue, clear
+        self.__Decode(into)
+        return into
+
+    #Read colour channels only if a new RGBC result is ready, returns True if into (array of 4) was filled
+    ## A poll that finds no new result is a single one byte STATUS read, the channels are only read
+    ## (8 byte burst) when there is one. Needs SetIntrPers(0), so AINT is set at the end of every
+    ## integration cycle; it is only cleared (one command byte) when it was set
+    def ReadRGBCIfNew(self,into):
+        status = self.__ReadData(_REG_STATUS,1)
+        if not status & _STATUS_AINT: #No cycle completed since the last result
+            return False
+        new = status & _STATUS_AVALID
+        if new:
+            self.ReadRGBC(into) #Before the clear command overwrites the scratch buffer
+        self.ClrIntr()
+        return bool(new)
+
+    #Copy channels from scratch buffer (clear, red, green, blue) into into as red, green, blue, clear
+    def __Decode(self,into):
+        buf = self.__buf
+        into[0] = buf[2] | (buf[3] << 8)
+        into[1] = buf[4] | (buf[5] << 8)
+        into[2] = buf[6] | (buf[7] << 8)
+        into[3] = buf[0] | (buf[1] << 8)
@@ -1,214 +1,313 @@
 import ustruct
+import array
+import regcache
+from micropython import const
 
-#?? Change some values to constants for readability
+#Registers and bit fields are const integers (names starting with an underscore are inlined by
+#the compiler and take no RAM), lookups are tuples/arrays rather than dicts
+#- Command byte bits
+_COMMAND_BIT    = const(0x80)
+_WORD_BIT       = const(0x20)
+_INTR_CLR_BIT   = const(0x40)
+#- Registers
+_REG_CONTROL        = const(0x0)
+_REG_TIMING         = const(0x1)
+_REG_THRESLOWLOW    = const(0x2)
+_REG_THRESLOWHIGH   = const(0x3)
+_REG_THRESHIGHLOW   = const(0x4)
+_REG_THRESHIGHHIGH  = const(0x5)
+_REG_INTERRUPT      = const(0x6)
+_REG_CRC            = const(0x8)
+_REG_ID             = const(0xA)
+_REG_DATA0LOW       = const(0xC)
+_REG_DATA0HIGH      = const(0xD)
+_REG_DATA1LOW       = const(0xE)
+_REG_DATA1HIGH      = const(0xF)
+#- Timing register fields
+_TIMING_GAIN    = const(0x10) #16x gain
+_TIMING_MANUAL  = const(0x08) #Manual integration running
+_TIMING_INTEG   = const(0x03) #Integration time field
+#- Interrupt register fields
+_INTR_CTRL      = const(0x30)
+_INTR_PERSIST   = const(0x0F)
+#- Integer lux calculation (CS package, see datasheet CalculateLux)
+_LUX_SCALE      = const(14) #Scale lux by 2^14
+_RATIO_SCALE    = const(9) #Scale channel ratio by 2^9
+_CH_SCALE       = const(10) #Scale channel values by 2^10
+
+#Gain modes (SetGainMode)
+GAIN_X1         = const(0)
+GAIN_X16        = const(1)
 
 class TSL2561Lib:
     #Constants
-    #- Read Data (bits used for I2C)
-    __COMMAND_BIT   = 0x80
-    __WORD_BIT      = 0x20
-    __INTR_CLR_BIT  = 0x40
-
-    # Dictionaries for used values
-    #- Register
-    INTERNAL_REGISTER = {
-        "CONTROL"        : 0x0,
-        "TIMING"         : 0x1,
-        "THRESLOWLOW"    : 0x2,
-        "THRESLOWHIGH"   : 0x3,
-        "THRESHIGHLOW"   : 0x4,
-        "THRESHIGHHIGH"  : 0x5,
-        "INTERRUPT"      : 0x6,
-        "CRC"            : 0x8,
-        "ID"             : 0xA,
-        "DATA0LOW"       : 0xC,
-        "DATA0HIGH"      : 0xD,
-        "DATA1LOW"       : 0xE,
-        "DATA1HIGH"      : 0xF
-    }
-    #- Gain Modes
-    GAIN_MODE = {
-        "X1"    : False,
-        "X16"   : True
-    }
-    #- Timing Controller (Integration Time)
-    INTEG_TIME = {
-        #Nominal integration time : Integration Field Value
-        "13.7ms"    : 0x0, #Scale 0.034
-        "101ms"     : 0x1, #Scale 0.252
-        "402ms"     : 0x2, #Scale 1
-        "MAN"       : 0x3, #Scale N/A, NOTE: Only for manual mode (integration controlled by manual bit)
-    }
-    #- Interrupt Control Reg Constants
-    #-- Control Select
-    INTR_CTRL_SEL = {
-        "OFF"   : 0x00, #Interrupt output disabled
-        "LVL"   : 0x10, #Level interrupt
-        "SMB"   : 0x20, #SMBAlert Compliant ?? May need function to respond
-        "TST"   : 0x30, #Test mode: Sets interrupt and functions as mode 10 ?? May need SMB function to respond
-    }
-    #-- Persistence Select
-    INTR_PERS_SEL = (
-        0x0,    #Every ADC cycle generates interrupt
-        0x1,    #Any value outside of threshold range
-        0x2,    #2 integration time periods out of range
-        0x3,    #3 integration time periods out of range
-        0x4,    #4 integration time periods out of range
-        0x5,    #5 integration time periods out of range
-        0x6,    #6 integration time periods out of range
-        0x7,    #7 integration time periods out of range
-        0x8,    #8 integration time periods out of range
-        0x9,    #9 integration time periods out of range
-        0xA,    #10 integration time periods out of range
-        0xB,    #11 integration time periods out of range
-        0xC,    #12 integration time periods out of range
-        0xD,    #13 integration time periods out of range
-        0xE,    #14 integration time periods out of range
-        0xF     #15 integration time periods out of range
+    #- Clear interrupt command (command byte only, no data)
+    __INTR_CLR_CMD  = bytes((_COMMAND_BIT | _INTR_CLR_BIT,))
+
+    #- Timing Controller (Integration Time), index is INTEG field value
+    ## Scale 0.034, 0.252, 1 and N/A (manual mode, integration controlled by manual bit)
+    INTEG_TIME = ("13.7ms", "101ms", "402ms", "MAN")
+    #- Integration time in ms for each INTEG field value (manual mode assumed to be nominal 402ms)
+    INTEG_TIME_MS = (14, 101, 402, 402)
+    #- Auto-ranging settings, index is INTEG field * 2 + gain bit
+    AUTO_RANGES = (
+        #Integration time (0.1ms), Gain, Max count
+        (137,   1,  5047),
+        (137,   16, 5047),
+        (1010,  1,  37177),
+        (1010,  16, 37177),
+        (4020,  1,  65535),
+        (4020,  16, 65535)
+    )
+    #- Interrupt control select, index is INTR field value
+    ## Output disabled, level interrupt, SMBAlert compliant, test mode (sets interrupt and functions as level)
+    INTR_CTRL_SEL = ("OFF", "LVL", "SMB", "TST")
+    #- Interrupt persistence (PERSIST field is the value directly)
+    ## 0: every ADC cycle generates interrupt, 1: any value outside of threshold range,
+    ## N: N integration time periods out of range (up to 15)
+    INTR_PERS_MAX = 15
+    #-- Channel scale factor per INTEG field value (scales result to 402ms)
+    LUX_CH_SCALE = (
+        0x7517, #13.7ms: 322/11 * 2^CH_SCALE
+        0x0FE7, #101ms: 322/81 * 2^CH_SCALE
+        0x0400, #402ms: 1 * 2^CH_SCALE
+        0x0400  #Manual: no scaling
     )
+    #-- Ratio breakpoints and coefficients, flattened (K: ratio threshold, B: CH0 coefficient, M: CH1 coefficient)
+    LUX_COEFFS = array.array("H", (
+        #K,     B,      M
+        0x043, 0x0204, 0x01AD, #Ratio 0.13, 0.0315, 0.0262
+        0x085, 0x0228, 0x02C1, #Ratio 0.26, 0.0337, 0.0430
+        0x0C8, 0x0253, 0x0363, #Ratio 0.39, 0.0363, 0.0529
+        0x10A, 0x0282, 0x03DF, #Ratio 0.52, 0.0392, 0.0605
+        0x14D, 0x0177, 0x01DD, #Ratio 0.65, 0.0229, 0.0291
+        0x19A, 0x0101, 0x0127, #Ratio 0.80, 0.0157, 0.0180
+        0x29A, 0x0037, 0x002B  #Ratio 1.3, 0.00338, 0.00260
+    ))
     #- Possible I2C addresses (depending on connection of ADDR pin)
-    SLAVE_ADDRS = {
-        "GND"   : 0x29, #0101001/49
-        "FLOAT" : 0x39, #0111001/57
-        "VDD"   : 0x49  #1001001/73
-    }
-
-    #Constructor
-    def __init__(self,i2c,addr="FLOAT"):
+    SLAVE_ADDR_PINS = ("GND", "FLOAT", "VDD")
+    SLAVE_ADDRS = b'\x29\x39\x49' #0101001/49, 0111001/57, 1001001/73
+
+    #Constructor, addr is the ADDR pin connection (SLAVE_ADDR_PINS) or the address itself
+    ## snapshot: configuration registers saved with Snapshot(), when the device has kept them since
+    def __init__(self,i2c,addr="FLOAT",snapshot=None):
         #Load I2C object passed
         self.i2c = i2c
         #Set Slave Address
-        self.__SLAVE_ADDR = TSL2561Lib.SLAVE_ADDRS[addr]
+        if isinstance(addr, int):
+            if addr not in TSL2561Lib.SLAVE_ADDRS:
+                raise Exception("Unexpected slave address")
+            self.__SLAVE_ADDR = addr
+        else:
+            self.__SLAVE_ADDR = TSL2561Lib.SLAVE_ADDRS[TSL2561Lib.SLAVE_ADDR_PINS.index(addr)]
+        #Scratch buffer for all transfers, with fixed length views so register access doesn't allocate
+        ## Shared by every method, so the driver must not be used from a hard interrupt handler
+        self.__buf = bytearray(4)
+        view = memoryview(self.__buf)
+        self.__buf1 = view[:1]
+        self.__buf2 = view[:2]
+        self.__buf4 = view
         # Internal State
-        self.__deviceOn = False
-        self.__regTiming = 0x00 #Timing Register contents ?? Load from device instead of using default
-        self.__regIntrCtrl = 0x00 #Interrupt Control Register contents ?? Load from device instead of using default
+        #- Shadow of configuration registers (CONTROL through INTERRUPT, and ID), loaded from device
+        self.__cache = regcache.RegCache(self.__CacheRead, self.__CacheWrite, 0x10, (_REG_CONTROL, _REG_TIMING, _REG_THRESLOWLOW, _REG_THRESLOWHIGH, _REG_THRESHIGHLOW, _REG_THRESHIGHHIGH, _REG_INTERRUPT, _REG_ID), snapshot)
+
+    #Copy of the configuration registers (for the constructor after a restart of the host only)
+    def Snapshot(self):
+        return self.__cache.Snapshot()
 
     def __WriteData(self,reg,data,twoBytes=False):
-        reg |= TSL2561Lib.__COMMAND_BIT #Prepare address for device format
+        reg |= _COMMAND_BIT #Prepare address for device format
+        buf = self.__buf
+        buf[0] = data & 0xFF
         #Need to add word bit if data is longer
-        if twoBytes: #Multibyte, pack as data
-            reg |= TSL2561Lib.__WORD_BIT #Add word bit since writing a word
-            sendData = ustruct.pack("<H",data)
-        else: #Single byte, pack as data
-            sendData = ustruct.pack("<B",data)
-        self.i2c.writeto_mem(self.__SLAVE_ADDR, reg, sendData) #?? Check ACKs received and resend if necessary
+        if twoBytes: #Multibyte, little endian
+            reg |= _WORD_BIT #Add word bit since writing a word
+            buf[1] = data >> 8
+            sendData = self.__buf2
+        else: #Single byte
+            sendData = self.__buf1
+        self.i2c.writeto_mem(self.__SLAVE_ADDR, reg, sendData)
 
     def __ReadData(self,reg,twoBytes=False):
-        reg |= TSL2561Lib.__COMMAND_BIT #Prepare address for device format
+        reg |= _COMMAND_BIT #Prepare address for device format
+        buf = self.__buf
         if twoBytes:
-            reg |= TSL2561Lib.__WORD_BIT #Add word bit since reading a word
-            data = self.i2c.readfrom_mem(self.__SLAVE_ADDR, reg, 2) #Read two bytes
-            return ustruct.unpack("<H",data)[0] #Convert from unsigned short to integer
+            reg |= _WORD_BIT #Add word bit since reading a word
+            self.i2c.readfrom_mem_into(self.__SLAVE_ADDR, reg, self.__buf2) #Read two bytes
+            return buf[0] | (buf[1] << 8) #Unsigned short, little endian
         else:
-            data = self.i2c.readfrom_mem(self.__SLAVE_ADDR, reg, 1) #Read single byte
-            return ustruct.unpack("<B",data)[0] #Convert from unsigned byte to int
+            self.i2c.readfrom_mem_into(self.__SLAVE_ADDR, reg, self.__buf1) #Read single byte
+            return buf[0]
+
+    #Register cache access (cache uses byte lengths rather than word flag)
+    def __CacheRead(self,reg,length):
+        return self.__ReadData(reg,length == 2)
+
+    def __CacheWrite(self,reg,data,length):
+        self.__WriteData(reg,data,length == 2)
+
+    #Reload register shadow from device (e.g. after device has been reset)
+    def Resync(self):
+        self.__cache.Resync()
+
+    def __GetTiming(self):
+        return self.__cache.Read(_REG_TIMING)
+
+    def __SetTiming(self,value):
+        self.__cache.Write(_REG_TIMING,value)
 
     def PowerOn(self,force=False):
-        if not self.__deviceOn or force:
-            self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["CONTROL"],0x03)
-            self.__deviceOn = True
+        self.__cache.Write(_REG_CONTROL,0x03,1,force)
 
     def PowerOff(self,force=False):
-        if self.__deviceOn or force:
-            self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["CONTROL"],0x00)
-            self.__deviceOn = False
+        self.__cache.Write(_REG_CONTROL,0x00,1,force)
 
     def SetGainMode(self,mode):
         if mode: #X16 mode
-            self.__regTiming |= 0x10 #Write a 1 to bit 4
+            self.__SetTiming(self.__GetTiming() | _TIMING_GAIN) #Write a 1 to bit 4
         else: #X1 mode
-            self.__regTiming &= 0xEF #Write a 0 to bit 4
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["TIMING"],self.__regTiming)
+            self.__SetTiming(self.__GetTiming() & ~_TIMING_GAIN) #Write a 0 to bit 4
 
     def GetGainMode(self):
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["TIMING"]) & 0x10 #Get bit 4 of TIMING reg
+        return self.__GetTiming() & _TIMING_GAIN #Get bit 4 of TIMING reg
 
     def ChangeTiming(self,timingSetting):
         if not timingSetting in TSL2561Lib.INTEG_TIME:
             raise Exception("Timing setting is not valid")
-        self.__regTiming &= 0xF0 #Clear lower 4 bits (related to timing)
-        self.__regTiming |= TSL2561Lib.INTEG_TIME[timingSetting] #Set INTEG bits (integration time for conversion)
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["TIMING"],self.__regTiming)
+        regTiming = self.__GetTiming() & 0xF0 #Clear lower 4 bits (related to timing)
+        regTiming |= TSL2561Lib.INTEG_TIME.index(timingSetting) #Set INTEG bits (integration time for conversion)
+        self.__SetTiming(regTiming)
+
+    def GetIntegTimeMs(self):
+        return TSL2561Lib.INTEG_TIME_MS[self.__GetTiming() & _TIMING_INTEG]
+
+    def GetRange(self): #Index into AUTO_RANGES of current setting (manual mode treated as 402ms)
+        regTiming = self.__GetTiming()
+        return min(regTiming & _TIMING_INTEG, 2) * 2 + ((regTiming >> 4) & 0x01)
+
+    def SetRange(self,index): #Set gain and integration time together from AUTO_RANGES index
+        if index < 0 or index >= len(TSL2561Lib.AUTO_RANGES):
+            raise Exception("Range index is not valid")
+        self.__SetTiming((self.__GetTiming() & 0xE0) | ((index & 0x01) << 4) | (index >> 1))
 
     def StartIntegCycle(self):
-        if self.__regTiming & 0x03 != 0x03:
+        regTiming = self.__GetTiming()
+        if regTiming & _TIMING_INTEG != _TIMING_INTEG:
             raise Exception("Attempting to start integration cycle while not in manual timing mode")
-        self.__regTiming |= 0x08 #Set manual timing bit
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["TIMING"],self.__regTiming)
+        self.__SetTiming(regTiming | _TIMING_MANUAL) #Set manual timing bit
 
     def EndIntegCycle(self):
-        if self.__regTiming & 0x0B == 0x03:
+        regTiming = self.__GetTiming()
+        if regTiming & (_TIMING_MANUAL | _TIMING_INTEG) == _TIMING_INTEG:
             raise Exception("Attempted to stop integration cycle while it was not running")
-        elif self.__regTiming & 0x03 != 0x03:
+        elif regTiming & _TIMING_INTEG != _TIMING_INTEG:
             raise Exception("Attempting to stop interation cycle while not in manual timing mode")
-        self.__regTiming &= 0xF7 #Clear manual timing bit
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["TIMING"],self.__regTiming)
+        self.__SetTiming(regTiming & ~_TIMING_MANUAL) #Clear manual timing bit
 
     def SetIntrThreshold(self,low,high):
         if low is not None:
             if low > 65000 or low < 0:
                 raise Exception("Low value out of bounds")
             else:
-                self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["THRESLOWLOW"],low,True)
+                self.__cache.Write(_REG_THRESLOWLOW,low,2)
         if high is not None:
             if high > 65000 or high < 0:
                 raise Exception("High value out of bounds")
             else:
-                self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["THRESHIGHLOW"],high,True)
+                self.__cache.Write(_REG_THRESHIGHLOW,high,2)
 
     def GetIntrLowThreshold(self):
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["THRESLOWLOW"],True)
+        return self.__cache.Read(_REG_THRESLOWLOW,2)
 
     def GetIntrHighThreshold(self):
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["THRESHIGHLOW"],True)
+        return self.__cache.Read(_REG_THRESHIGHLOW,2)
 
     def SetIntrCtrlSel(self,read):
-        self.__regIntrCtrl &= 0xCF #Clear INTR field value
-        self.__regIntrCtrl |= TSL2561Lib.INTR_CTRL_SEL[read] #Combine new INTR field
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["INTERRUPT"],self.__regIntrCtrl,True)
+        if not read in TSL2561Lib.INTR_CTRL_SEL:
+            raise Exception("Interrupt control setting is not valid")
+        regIntrCtrl = self.__cache.Read(_REG_INTERRUPT) & ~_INTR_CTRL #Clear INTR field value
+        regIntrCtrl |= TSL2561Lib.INTR_CTRL_SEL.index(read) << 4 #Combine new INTR field
+        self.__cache.Write(_REG_INTERRUPT,regIntrCtrl)
 
     def SetIntrPersSel(self,func):
-        self.__regIntrCtrl &= 0xF0 #Clear PERSIST field value
-        self.__regIntrCtrl |= TSL2561Lib.INTR_PERS_SEL[func] #Combine new PERSIST field
-        self.__WriteData(TSL2561Lib.INTERNAL_REGISTER["INTERRUPT"],self.__regIntrCtrl,True)
+        if func < 0 or func > TSL2561Lib.INTR_PERS_MAX:
+            raise Exception("Persistence setting is not valid")
+        regIntrCtrl = self.__cache.Read(_REG_INTERRUPT) & ~_INTR_PERSIST #Clear PERSIST field value
+        regIntrCtrl |= func #Combine new PERSIST field
+        self.__cache.Write(_REG_INTERRUPT,regIntrCtrl)
 
     def ClrIntr(self):
-        self.i2c.writeto_mem(self.__SLAVE_ADDR, TSL2561Lib.__INTR_CLR_BIT, 0)
+        self.i2c.writeto(self.__SLAVE_ADDR, TSL2561Lib.__INTR_CLR_CMD) #Command byte with CLEAR bit set
 
     def GetPartNumber(self):
-        partNo = self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["ID"])
+        partNo = self.__cache.Read(_REG_ID)
         if partNo: #If bits 7:4 = 0001, TSL2561, else TSL2560
             return "TSL2561"
         else:
             return "TSL2560"
 
     def GetRevNumber(self):
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["ID"]) & 0x0F #Revision number is lower 4 bits of reg
+        return self.__cache.Read(_REG_ID) & 0x0F #Revision number is lower 4 bits of reg
 
     def ReadADC0(self): #Visible and IR
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["DATA0LOW"],True)
+        return self.__ReadData(_REG_DATA0LOW,True)
 
     def ReadADC1(self): #Just IR
-        return self.__ReadData(TSL2561Lib.INTERNAL_REGISTER["DATA1LOW"],True)
+        return self.__ReadData(_REG_DATA1LOW,True)
 
-    def GetLux(self):
-        ch0 = self.ReadADC0()
-        ch1 = self.ReadADC1()
-        if ch0:
-            ratio = ch1/ch0 #Ratio of light levels
-        else:
+    #Both channels in a single transaction, as (visible and IR, just IR)
+    ## into: optional array/list of 2 to fill and return instead of a new tuple (no allocation)
+    def ReadADCs(self,into=None):
+        reg = _REG_DATA0LOW | _COMMAND_BIT | _WORD_BIT
+        buf = self.__buf
+        self.i2c.readfrom_mem_into(self.__SLAVE_ADDR, reg, self.__buf4) #DATA0LOW through DATA1HIGH
+        if into is None:
+            return ustruct.unpack_from("<HH",buf)
+        into[0] = buf[0] | (buf[1] << 8)
+        into[1] = buf[2] | (buf[3] << 8)
+        return into
+
+    def CalculateLux(self,ch0,ch1):
+        #Integer version of the datasheet lux equations, scaled to the configured gain and integration time
+        ## Intermediates are kept below 2^30 so they stay small ints (a bigint is allocated otherwise):
+        ## 1x gain is scaled up to 16x on the result rather than the channels, the ratio is taken from
+        ## the counts (the scale cancels), and the count is split off chScale's low bits for the multiply
+        regTiming = self.__GetTiming()
+        chScale = TSL2561Lib.LUX_CH_SCALE[regTiming & _TIMING_INTEG]
+        luxScale = _LUX_SCALE if regTiming & _TIMING_GAIN else _LUX_SCALE - 4
+        if not ch0:
             return 0 #Lux is zero when ratio is infinite
-        if ratio < 0:
-            raise Exception("Somehow negative ratio occurred")
-        elif ratio <= 0.52:
-            lux = 0.0315 * ch0 - 0.0593 * ch0 * pow(ratio,1.4)
-        elif ratio <= 0.65:
-            lux = 0.0229 * ch0 - 0.0291 * ch1
-        elif ratio <= 0.8:
-            lux = 0.0157 * ch0 - 0.0180 * ch1
-        elif ratio <= 1.3:
-            lux = 0.00338 * ch0 - 0.00260 * ch1
-        else:
+        channel0 = (ch0 * (chScale >> 2) + ((ch0 * (chScale & 3)) >> 2)) >> (_CH_SCALE - 2)
+        channel1 = (ch1 * (chScale >> 2) + ((ch1 * (chScale & 3)) >> 2)) >> (_CH_SCALE - 2)
+        ratio = ((ch1 << (_RATIO_SCALE + 1)) // ch0 + 1) >> 1 #Rounded ratio of light levels
+        b = 0
+        m = 0
+        coeffs = TSL2561Lib.LUX_COEFFS
+        for i in range(0, len(coeffs), 3):
+            if ratio <= coeffs[i]:
+                b = coeffs[i + 1]
+                m = coeffs[i + 2]
+                break
+        lux = channel0 * b - channel1 * m
+        if lux < 0:
             lux = 0
-        return lux
+        return (lux + (1 << (luxScale - 1))) >> luxScale #Round off fractional lux
+
+    #Channel 0 count at which the current gain and integration time give lux (e.g. for interrupt thresholds)
+    ## Channel 1 (IR) is taken as channel 0 >> irShift (a quarter by default, typical of daylight and
+    ## indoor light), the count is found by bisection of CalculateLux
+    def LuxToCount(self,lux,irShift=2):
+        low = 0
+        high = 65535
+        while low < high:
+            mid = (low + high) >> 1
+            if self.CalculateLux(mid, mid >> irShift) < lux:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def GetLux(self):
+        buf = self.__buf
+        self.i2c.readfrom_mem_into(self.__SLAVE_ADDR, _REG_DATA0LOW | _COMMAND_BIT | _WORD_BIT, self.__buf4)
+        return self.CalculateLux(buf[0] | (buf[1] << 8), buf[2] | (buf[3] << 8))
@@ -0,0 +1,160 @@
+#Alarm scheduler
+## Alarms are converted to their next fire time (seconds since epoch) once and kept in a
+## min-heap, a one-shot timer is armed for the earliest so alarms are never polled or missed
+## Alarm entry: [fire time, id, hour, minute, weekday mask (bit 0 Monday), one-shot]
+##
+## The time alarms were last checked is kept (in flash with the alarms), and fire times are computed
+## from it rather than from the current time, so alarms that fell in (last check, now] still fire:
+## alarms passed during deep sleep or a reset, or skipped by a forward clock correction.
+import time
+import json
+import machine
+import micropython
+import uheapq
+
+ALARMS_PATH = "alarms.json" #Alarms kept in flash (survive reset and deep sleep)
+ALL_DAYS = 0x7F
+MAX_TIMER_MS = 3600000 #Longest timer period armed, timer is re-armed if the alarm is further away
+MAX_LATE_S = 3600 #Alarms missed by longer than this (e.g. device switched off) are skipped
+
+#Next time (seconds since epoch) after now that hour:minute falls on a day in the weekday mask (None if mask is empty)
+def NextFire(now,hour,minute,mask=ALL_DAYS):
+    t = time.localtime(now)
+    dayStart = now - (t[3] * 3600 + t[4] * 60 + t[5])
+    for day in range(8):
+        fire = dayStart + day * 86400 + hour * 3600 + minute * 60
+        if fire > now and (mask >> ((t[6] + day) % 7)) & 0x01:
+            return fire
+    return None
+
+class AlarmScheduler:
+    #Constructor, callback(alarmId) is called when an alarm fires
+    def __init__(self,callback,timerId=-1,path=ALARMS_PATH):
+        self.callback = callback
+        self.path = path
+        self.heap = []
+        self.nextId = 1 #Id 0 is free for a caller managed alarm
+        self.lastCheck = None #Time (seconds since epoch) alarms were last checked, alarms up to it have fired
+        self.timer = machine.Timer(timerId)
+        #Keep reference to handler so scheduling it from the timer doesn't allocate
+        self.fireRef = self.__Fire
+        self.__Load()
+        self.__Arm()
+
+    #Add alarm (replacing alarm with same id if given), returns id
+    def Add(self,hour,minute,mask=ALL_DAYS,oneShot=False,alarmId=None):
+        if hour < 0 or hour > 23 or minute < 0 or minute > 59:
+            raise Exception("Alarm time out of range")
+        if alarmId is None:
+            alarmId = self.nextId
+            self.nextId += 1
+        else:
+            self.__Remove(alarmId)
+        now = time.time()
+        self.lastCheck = now #New alarm doesn't fire for times already passed
+        fire = NextFire(now, hour, minute, mask)
+        if fire is not None:
+            uheapq.heappush(self.heap, [fire, alarmId, hour, minute, mask, oneShot])
+        self.__Save()
+        self.__Arm()
+        return alarmId
+
+    #Remove alarm by id
+    def Remove(self,alarmId):
+        self.__Remove(alarmId)
+        self.__Save()
+        self.__Arm()
+
+    #Remove all alarms
+    def Clear(self):
+        self.heap = []
+        self.__Save()
+        self.__Arm()
+
+    #Recompute fire times (after the clock has been changed), alarms skipped by moving it forward fire
+    def Rearm(self):
+        since = self.__Since(time.time())
+        heap = []
+        for entry in self.heap:
+            entry[0] = NextFire(since, entry[2], entry[3], entry[4])
+            if entry[0] is not None:
+                heap.append(entry)
+        uheapq.heapify(heap)
+        self.heap = heap
+        self.__Arm()
+
+    #Seconds until earliest alarm (None if no alarms)
+    def SecondsUntilNext(self):
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - time.time(), 0)
+
+    #Time from which alarms are due: the last check, unless the clock has been set back before it
+    ## or it's more than MAX_LATE_S ago
+    def __Since(self,now):
+        if self.lastCheck is None or self.lastCheck > now:
+            return now
+        return max(self.lastCheck, now - MAX_LATE_S)
+
+    def __Remove(self,alarmId):
+        heap = [entry for entry in self.heap if entry[1] != alarmId]
+        uheapq.heapify(heap)
+        self.heap = heap
+
+    #Arm timer for earliest alarm
+    def __Arm(self):
+        self.timer.deinit()
+        if not self.heap:
+            return
+        delay = min(max(self.heap[0][0] - time.time(), 0) * 1000, MAX_TIMER_MS)
+        self.timer.init(period=delay, mode=machine.Timer.ONE_SHOT, callback=self.__TimerIrq)
+
+    #Timer handler, defers work out of interrupt context
+    def __TimerIrq(self,timer):
+        try:
+            micropython.schedule(self.fireRef, 0)
+        except RuntimeError: #Schedule queue full, try again shortly
+            self.timer.init(period=10, mode=machine.Timer.ONE_SHOT, callback=self.__TimerIrq)
+
+    #Fire every alarm that is due, then re-arm for the next one
+    def __Fire(self,arg):
+        now = time.time()
+        fired = False
+        while self.heap and self.heap[0][0] <= now:
+            entry = uheapq.heappop(self.heap)
+            if not entry[5]: #One-shot alarm is removed
+                entry[0] = NextFire(now, entry[2], entry[3], entry[4])
+                uheapq.heappush(self.heap, entry)
+            self.callback(entry[1])
+            fired = True
+        if fired: #Check time is saved so alarms don't fire again after a reset
+            self.lastCheck = now
+            self.__Save()
+        self.__Arm()
+
+    #Save alarms and the last check time to flash
+    def __Save(self):
+        alarms = [entry[1:] for entry in self.heap]
+        try:
+            with open(self.path, "w") as f:
+                json.dump({'last': self.lastCheck, 'alarms': alarms}, f)
+        except OSError: #Alarms still run, they are only lost on reset
+            pass
+
+    #Load alarms from flash, alarms passed since the last check fire once the timer is armed
+    def __Load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(saved, list): #Alarms only (saved before the last check time was kept)
+            saved = {'last': None, 'alarms': saved}
+        self.lastCheck = saved.get('last')
+        since = self.__Since(time.time())
+        for alarmId, hour, minute, mask, oneShot in saved.get('alarms', ()):
+            fire = NextFire(since, hour, minute, mask)
+            if fire is not None:
+                self.heap.append([fire, alarmId, hour, minute, mask, oneShot])
+            self.nextId = max(self.nextId, alarmId + 1)
+        uheapq.heapify(self.heap)
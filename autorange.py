@@ -0,0 +1,72 @@
+#Automatic gain/integration time selection for light sensors
+## Each sensor describes its ranges as (integration time in 0.1ms, gain, max count)
+## The shortest integration time that still gives MIN_COUNT counts is chosen,
+## stepping down when the reading approaches the max count of the range
+
+#Greatest common divisor
+def Gcd(a,b):
+    while b:
+        a, b = b, a % b
+    return a
+
+class AutoRange:
+    #Constructor
+    def __init__(self,ranges,index,minCount=1000):
+        self.ranges = ranges
+        self.index = index #Current range
+        self.minCount = minCount #Counts needed for adequate resolution
+        self.settling = False #Set when range has just changed (reading in progress uses old setting)
+        #Sensitivity (counts per unit light) of each range
+        self.sens = [r[0] * r[1] for r in ranges]
+        self.maxSens = max(self.sens)
+        #Normalising factor of each range (maxSens / sens) as a reduced fraction, so a count up to the
+        #range's max count times the numerator stays a small int (value * maxSens would be up to 2.4e10)
+        self.normNum = []
+        self.normDen = []
+        for s in self.sens:
+            g = Gcd(self.maxSens, s)
+            self.normNum.append(self.maxSens // g)
+            self.normDen.append(s // g)
+        #Search order: shortest integration time first, highest gain first
+        self.order = sorted(range(len(ranges)), key=lambda i: (ranges[i][0], -ranges[i][1]))
+
+    #Count at which a range is considered saturated (7/8 of max count)
+    def __HighCount(self,index):
+        return self.ranges[index][2] - (self.ranges[index][2] >> 3)
+
+    #Check whether the next reading should be skipped (True once after each range change)
+    def Settling(self):
+        if self.settling:
+            self.settling = False
+            return True
+        return False
+
+    #Feed raw count from current range, returns True if a new range has been selected
+    def Update(self,count):
+        cur = self.index
+        curOk = self.minCount <= count < self.__HighCount(cur)
+        choice = None
+        for i in self.order:
+            if i == cur:
+                if curOk: #Current range reached before any shorter suitable range
+                    return False
+                continue
+            predicted = count * self.sens[i] // self.sens[cur]
+            #Require twice the minimum so readings near the limit don't flip between ranges
+            if self.minCount * 2 <= predicted < self.__HighCount(i):
+                choice = i
+                break
+        if choice is None: #No range gives adequate resolution
+            if count >= self.__HighCount(cur): #Saturated, use least sensitive range
+                choice = min(self.order, key=lambda i: self.sens[i])
+            else: #Too dark, use most sensitive range
+                choice = max(self.order, key=lambda i: self.sens[i])
+        if choice == cur:
+            return False
+        self.index = choice
+        self.settling = True
+        return True
+
+    #Scale a reading from the current range to the most sensitive range so readings are comparable
+    def Normalise(self,value):
+        return value * self.normNum[self.index] // self.normDen[self.index]
@@ -0,0 +1,81 @@
+#Closed loop colour temperature/brightness control using colour sensor feedback
+## Lux and colour temperature are found from RGBC counts with the DN40 method in integer maths,
+## and PI controllers trim the fade engine output to follow the target along the sunrise ramp
+
+#DN40 coefficients (scaled by 1000 where fractional)
+DN40_R_COEF = 136 #0.136
+DN40_G_COEF = 1000 #1.000
+DN40_B_COEF = -444 #-0.444
+DN40_DF = 310 #Device factor
+DN40_CT_COEF = 3810
+DN40_CT_OFFSET = 1391
+TRIM_ONE = 1024 #Trim of 1.0 (Q10)
+
+#Lux and correlated colour temperature (K) from RGBC counts, integTime in 0.1ms, gain as multiplier
+def Dn40(red,green,blue,clear,integTime,gain):
+    ir = max((red + green + blue - clear) // 2, 0) #IR component in each channel
+    red -= ir
+    green -= ir
+    blue -= ir
+    g = DN40_R_COEF * red + DN40_G_COEF * green + DN40_B_COEF * blue
+    #Lux = G'' / CPL, CPL = (ATIME_ms * AGAINx) / (GA * DF) with GA = 1
+    lux = max(g * DN40_DF * 10 // (1000 * integTime * gain), 0)
+    cct = DN40_CT_COEF * blue // red + DN40_CT_OFFSET if red > 0 else 0
+    return lux, cct
+
+#Proportional-integral controller with integer gains (gain = num / den)
+class PI:
+    #Constructor
+    def __init__(self,kpNum,kiNum,den,outMin,outMax):
+        self.kpNum = kpNum
+        self.kiNum = kiNum
+        self.den = den
+        self.outMin = outMin
+        self.outMax = outMax
+        self.integral = 0
+
+    def Reset(self):
+        self.integral = 0
+
+    #Output for new error value
+    def Update(self,error):
+        #Limit integral to output range (anti-windup)
+        self.integral = min(max(self.integral + error * self.kiNum, self.outMin * self.den), self.outMax * self.den)
+        return min(max((error * self.kpNum + self.integral) // self.den, self.outMin), self.outMax)
+
+class ColourControl:
+    #Constructor, targets go linearly from start to end along the fade
+    def __init__(self,fader,cctStart=2000,cctEnd=6500,luxMax=300):
+        self.fade = fader
+        self.cctStart = cctStart
+        self.cctEnd = cctEnd
+        self.luxMax = luxMax
+        self.enabled = True
+        #Brightness trim (Q10 offset from 1.0) from lux error
+        self.luxLoop = PI(8, 1, 4, -TRIM_ONE // 2, TRIM_ONE)
+        #Red/blue balance (Q10) from colour temperature error, positive is cooler
+        self.cctLoop = PI(1, 1, 16, -TRIM_ONE // 2, TRIM_ONE // 2)
+        self.lux = 0 #Last measured values
+        self.cct = 0
+        self.active = False #Trims set by the controllers (not 1.0)
+
+    #Target lux and colour temperature at current fade position
+    def Target(self):
+        last = self.fade.steps - 1
+        return self.luxMax * self.fade.index // last, self.cctStart + (self.cctEnd - self.cctStart) * self.fade.index // last
+
+    #Update trims from a new sensor reading (run at the sensor integration rate)
+    def Update(self,red,green,blue,clear,integTime,gain):
+        self.lux, self.cct = Dn40(red, green, blue, clear, integTime, gain)
+        if not self.enabled or not self.fade.index: #Lights off, nothing to control
+            if self.active: #Only once when the lights go off, so LED outputs aren't rewritten every sample
+                self.active = False
+                self.luxLoop.Reset()
+                self.cctLoop.Reset()
+                self.fade.SetTrim(TRIM_ONE, TRIM_ONE, TRIM_ONE)
+            return
+        self.active = True
+        targetLux, targetCct = self.Target()
+        bright = TRIM_ONE + self.luxLoop.Update(targetLux - self.lux)
+        balance = self.cctLoop.Update(targetCct - self.cct) if self.cct else 0
+        self.fade.SetTrim(bright * (TRIM_ONE - balance) >> 10, bright, bright * (TRIM_ONE + balance) >> 10)
@@ -0,0 +1,120 @@
+#Profiling of the running firmware, published as diagnostics
+## Only used when PROFILE is set in main.py and i2cbus.py (const, so with it 0 the compiler drops
+## the profiling code and production builds have no overhead, see tools/build.py --profile).
+##
+## Each span (a main loop phase, or the transactions to an I2C device address) has a histogram of
+## its durations in a fixed array, with power of 4 buckets: < 64us, < 256us, < 1ms, ... , >= 1s.
+## Periodic phases also count overruns (started more than an eighth of their period late) and
+## the worst lateness. The heap is sampled for the lowest free memory and the garbage collections
+## seen (in use memory dropping between samples).
+##
+## Spans recorded by main.py: mqtt (broker poll), display (writeTime and oled.show), lux and colour
+## (sensor samples), send (telemetry sample, frame pack and publish), alarm (alarm check and
+## lighting), diag (heap sampling and reports), loop (whole main loop pass, sequential mode only).
+## i2cbus.py records a span for each device address.
+import array
+import time
+import gc
+
+BUCKETS = 8
+FIRST_BUCKET_US = 64 #Upper bound of the first bucket, each next bucket is 4 times larger
+OVERRUN_SHIFT = 3 #Started late by more than period >> shift
+
+#Span array (index)
+HIST_TOTAL_US = BUCKETS
+HIST_MAX_US = BUCKETS + 1
+HIST_OVERRUNS = BUCKETS + 2
+HIST_MAX_LATE_US = BUCKETS + 3
+HIST_SIZE = BUCKETS + 4
+
+class Profiler:
+    #Constructor
+    def __init__(self):
+        self.spans = {} #Span key: array (see HIST_*)
+        self.memFreeMin = None
+        self.memAlloc = gc.mem_alloc()
+        self.collections = 0
+        self.startMs = time.ticks_ms()
+
+    #Span array of a key (created on first use)
+    def __Span(self,key):
+        span = self.spans.get(key)
+        if span is None:
+            span = array.array("L", [0] * HIST_SIZE)
+            self.spans[key] = span
+        return span
+
+    #Add a duration (us) to a span
+    def Record(self,key,us):
+        span = self.__Span(key)
+        bucket = 0
+        limit = FIRST_BUCKET_US
+        while us >= limit and bucket < BUCKETS - 1:
+            limit <<= 2
+            bucket += 1
+        span[bucket] += 1
+        span[HIST_TOTAL_US] += us
+        if us > span[HIST_MAX_US]:
+            span[HIST_MAX_US] = us
+
+    #Add the time since start (ticks_us) to a span, returns the end time (start of the next span)
+    def Span(self,key,start):
+        now = time.ticks_us()
+        self.Record(key, time.ticks_diff(now, start))
+        return now
+
+    #Periodic phase started lateUs after it was due
+    def Late(self,key,lateUs,periodUs):
+        span = self.__Span(key)
+        if lateUs > periodUs >> OVERRUN_SHIFT:
+            span[HIST_OVERRUNS] += 1
+        if lateUs > span[HIST_MAX_LATE_US]:
+            span[HIST_MAX_LATE_US] = lateUs
+
+    #Sample the heap (lowest free memory, collections since the last sample)
+    def Heap(self):
+        alloc = gc.mem_alloc()
+        if alloc < self.memAlloc: #Only a collection frees memory
+            self.collections += 1
+        self.memAlloc = alloc
+        free = gc.mem_free()
+        if self.memFreeMin is None or free < self.memFreeMin:
+            self.memFreeMin = free
+
+    #Diagnostics since the last reset as a dict (extra items are added as they are)
+    ## Spans keyed by an I2C address are reported as "i2c_0x.."
+    def Report(self,extra=None):
+        spans = {}
+        for key, span in self.spans.items():
+            count = 0
+            for bucket in range(BUCKETS):
+                count += span[bucket]
+            if not count and not span[HIST_MAX_LATE_US]: #Nothing recorded in this period
+                continue
+            spans["i2c_0x%02x" % key if isinstance(key, int) else key] = {
+                'n': count,
+                'mean_us': span[HIST_TOTAL_US] // count if count else 0,
+                'max_us': span[HIST_MAX_US],
+                'hist': list(span[:BUCKETS]),
+                'overruns': span[HIST_OVERRUNS],
+                'max_late_us': span[HIST_MAX_LATE_US]
+            }
+        report = {
+            'period_ms': time.ticks_diff(time.ticks_ms(), self.startMs),
+            'spans': spans,
+            'mem_free': gc.mem_free(),
+            'mem_free_min': self.memFreeMin,
+            'gc': self.collections
+        }
+        if extra:
+            report.update(extra)
+        return report
+
+    #Clear all counts
+    def Reset(self):
+        for span in self.spans.values():
+            for i in range(HIST_SIZE):
+                span[i] = 0
+        self.memFreeMin = None
+        self.collections = 0
+        self.startMs = time.ticks_ms()
@@ -0,0 +1,120 @@
+#Sunrise fade engine
+## A hardware timer steps the LEDs through a precomputed gamma corrected table of duty cycles,
+## going from dim warm light to full daylight white over the ramp duration
+## The timer handler only does integer maths and table lookups (no allocation)
+import array
+import machine
+
+FADE_STEPS = 256 #Entries in duty table
+TICK_MS = 10 #Timer period (100Hz)
+GAMMA = 2.2 #Perceived brightness correction
+DUTY_MAX = 1023 #LEDs are off at max duty cycle
+#Colour along the ramp (position, relative red, green, blue), brightness rises linearly with position
+CURVE = (
+    (0.0, 1.0, 0.2,  0.0), #Deep orange
+    (0.4, 1.0, 0.45, 0.1), #Warm
+    (0.7, 1.0, 0.75, 0.45), #Warm white
+    (1.0, 1.0, 1.0,  1.0) #Daylight white
+)
+
+#Build duty table (red, green, blue duty for each step), only done once
+def BuildTable(steps=FADE_STEPS,gamma=GAMMA):
+    table = array.array("H", [DUTY_MAX] * (3 * steps))
+    for i in range(steps):
+        pos = i / (steps - 1)
+        #Find curve segment containing position
+        k = 1
+        while pos > CURVE[k][0]:
+            k += 1
+        start = CURVE[k - 1]
+        end = CURVE[k]
+        f = (pos - start[0]) / (end[0] - start[0])
+        for c in range(1, 4):
+            level = pos * (start[c] + (end[c] - start[c]) * f)
+            table[3 * i + c - 1] = DUTY_MAX - int(DUTY_MAX * level ** gamma + 0.5)
+    return table
+
+class Fade:
+    #Constructor
+    def __init__(self,pwmR,pwmG,pwmB,timerId=-1,table=None):
+        self.pwm = (pwmR, pwmG, pwmB)
+        self.table = BuildTable() if table is None else table
+        self.steps = len(self.table) // 3
+        self.timer = machine.Timer(timerId)
+        self.index = 0 #Current table entry (0 is off)
+        self.tick = 0 #Timer ticks since start of ramp
+        self.ticks = 1 #Timer ticks in whole ramp
+        self.running = False
+        #Output scaling of each channel (Q10, 1024 is unscaled) for closed loop correction
+        self.trim = array.array("H", [1024, 1024, 1024])
+        #Keep reference to handler so arming the timer doesn't allocate
+        self.tickRef = self.__Tick
+
+    #Start ramp lasting durationMs from off to full, continuing from the current level
+    def Start(self,durationMs):
+        self.ticks = max(durationMs // TICK_MS, 1)
+        self.tick = self.index * self.ticks // (self.steps - 1)
+        if not self.Finished():
+            self.__Run()
+
+    #Stop ramp, holding current level
+    def Pause(self):
+        self.timer.deinit()
+        self.running = False
+
+    #Continue paused ramp
+    def Resume(self):
+        if not self.running and not self.Finished():
+            self.__Run()
+
+    #Stop ramp and turn LEDs off
+    def Abort(self):
+        self.Pause()
+        self.Seek(0)
+
+    #Stop ramp and go to full light
+    def Finish(self):
+        self.Pause()
+        self.Seek(self.steps - 1)
+
+    #Check whether ramp has reached full light
+    def Finished(self):
+        return self.index == self.steps - 1
+
+    #Set LEDs to table entry
+    def Seek(self,index):
+        self.index = index
+        self.__Apply(index)
+
+    #Scale output of each channel (Q10) and update LEDs (if any changed)
+    def SetTrim(self,red,green,blue):
+        trim = self.trim
+        if trim[0] == red and trim[1] == green and trim[2] == blue:
+            return
+        trim[0] = red
+        trim[1] = green
+        trim[2] = blue
+        self.__Apply(self.index)
+
+    def __Run(self):
+        self.running = True
+        self.timer.init(period=TICK_MS, mode=machine.Timer.PERIODIC, callback=self.tickRef)
+
+    def __Apply(self,index):
+        i = 3 * index
+        for c in range(3):
+            #Scale on time (LEDs are on for the low part of the duty cycle)
+            on = ((DUTY_MAX - self.table[i + c]) * self.trim[c]) >> 10
+            self.pwm[c].duty(DUTY_MAX - min(on, DUTY_MAX))
+
+    #Timer handler, moves to the table entry for the current tick
+    def __Tick(self,timer):
+        self.tick += 1
+        index = self.tick * (self.steps - 1) // self.ticks
+        if index >= self.steps - 1:
+            index = self.steps - 1
+            self.timer.deinit()
+            self.running = False
+        if index != self.index:
+            self.index = index
+            self.__Apply(index)
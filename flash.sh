@@ -1,14 +1,11 @@
 #!/bin/bash
+# Build firmware and upload the files that changed since the last flash
+# Extra options are passed to tools/build.py (e.g. --source if mpy-cross isn't installed)
 
-mkdir tmp
-for i in *.py; do
-   sed -e "s/\s*#.*$//;/^\s*$/d" $i > tmp/$i
-done
-cd tmp
-for i in *.py; do
-   ampy -p $1 -b 115200 put $i
-done
-cd ..
-rm tmp -r
-
-ampy -p $1 -b 115200 reset
+if [ -z "$1" ]; then
+   echo "Usage: ./flash.sh [SERIAL PORT] [OPTIONS]"
+   exit 1
+fi
+port=$1
+shift
+python3 "$(dirname "$0")/tools/build.py" deploy --port "$port" "$@"
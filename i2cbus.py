@@ -0,0 +1,193 @@
+#Shared I2C bus used by the sensors and the screen
+## Wraps the machine I2C object with the same methods, so drivers are given the bus in its place.
+## Every transaction is counted per device address (transactions, bytes, time on the bus, NACKs),
+## and a transaction that isn't acknowledged is retried a bounded number of times before the
+## error is passed on to the caller.
+##
+## Per device stats (index into the stats array):
+##- STAT_TRANSACTIONS, STAT_BYTES (payload including register address), STAT_US (time in transfers),
+##- STAT_NACKS (attempts not acknowledged), STAT_FAILURES (transactions given up after all retries)
+## Counts are unsigned 32 bit and wrap (STAT_US first, after about 71 minutes of bus time), so they
+## are read with Stats(reset=True) for counts of one period, or the difference of two reads is
+## taken mod 2**32 (see CountDelta).
+##
+## With PROFILE set, the duration of every transaction is also given to a profiler (diag.py) for
+## a histogram per device address.
+import array
+import time
+import machine
+from micropython import const
+
+BUS_FREQ = 400000 #Fast mode, all devices on the bus support it
+HARDWARE_ID = 0 #Hardware I2C peripheral (on ports that have one)
+RETRIES = 2 #Extra attempts after a NACK
+RETRY_DELAY_US = 100 #Pause before retrying (lets a busy device finish, e.g. EEPROM style write cycles)
+PROFILE = const(0) #Transaction time histograms, set with main.PROFILE (0 compiles them out)
+
+STAT_TRANSACTIONS = 0
+STAT_BYTES = 1
+STAT_US = 2
+STAT_NACKS = 3
+STAT_FAILURES = 4
+STAT_SIZE = 5
+
+#Difference of two reads of a count, correct across one wrap of the 32 bit counter
+def CountDelta(new,old):
+    return (new - old) & 0xFFFFFFFF
+
+#Open the bus on the given pin numbers
+## Hardware I2C is used when the port has a peripheral that can use the pins, otherwise software I2C
+## (the ESP8266 only has software I2C). Returns (I2C object, True if hardware)
+def Open(scl,sda,freq=BUS_FREQ):
+    try:
+        return machine.I2C(HARDWARE_ID, scl=machine.Pin(scl), sda=machine.Pin(sda), freq=freq), True
+    except (ValueError, TypeError, OSError): #No hardware peripheral, or not on these pins
+        pass
+    if hasattr(machine, "SoftI2C"):
+        return machine.SoftI2C(scl=machine.Pin(scl), sda=machine.Pin(sda), freq=freq), False
+    return machine.I2C(-1, machine.Pin(scl), machine.Pin(sda), freq=freq), False #Older firmware
+
+class I2CBus:
+    #Constructor, i2c is the machine I2C object (see Open)
+    def __init__(self,i2c,freq=BUS_FREQ,hardware=False,retries=RETRIES):
+        self.i2c = i2c
+        self.freq = freq
+        self.hardware = hardware
+        self.retries = retries
+        self.present = () #Addresses found by the last Scan()
+        self.__stats = {} #Address: stats array
+        self.profiler = None #diag.Profiler given transaction times (PROFILE only)
+        self.__startMs = time.ticks_ms()
+
+    #Stats array of an address (created on first use)
+    def __Stats(self,addr):
+        stats = self.__stats.get(addr)
+        if stats is None:
+            stats = array.array("L", (0,) * STAT_SIZE)
+            self.__stats[addr] = stats
+        return stats
+
+    #Count a completed transaction
+    def __Done(self,addr,start,nbytes):
+        stats = self.__Stats(addr)
+        stats[STAT_TRANSACTIONS] += 1
+        stats[STAT_BYTES] += nbytes
+        us = time.ticks_diff(time.ticks_us(), start)
+        stats[STAT_US] += us
+        if PROFILE and self.profiler is not None:
+            self.profiler.Record(addr, us)
+
+    #Count a NACK, raises error once the retries are used up
+    def __Nack(self,addr,start,tries,error):
+        stats = self.__Stats(addr)
+        stats[STAT_NACKS] += 1
+        if tries > self.retries:
+            stats[STAT_FAILURES] += 1
+            stats[STAT_US] += time.ticks_diff(time.ticks_us(), start)
+            raise error
+        time.sleep_us(RETRY_DELAY_US)
+
+    #Find devices on the bus, returns list of addresses
+    def Scan(self):
+        self.present = tuple(self.i2c.scan())
+        return self.present
+
+    #First of the candidate addresses that was found by Scan(), or default if none were
+    def Find(self,candidates,default=None):
+        for addr in candidates:
+            if addr in self.present:
+                return addr
+        return default
+
+    #Transactions (same arguments as machine.I2C)
+    def writeto(self,addr,buf,stop=True):
+        start = time.ticks_us()
+        tries = 0
+        while True:
+            tries += 1
+            try:
+                result = self.i2c.writeto(addr, buf, stop)
+                break
+            except OSError as e:
+                self.__Nack(addr, start, tries, e)
+        self.__Done(addr, start, len(buf))
+        return result
+
+    def readfrom_into(self,addr,buf,stop=True):
+        start = time.ticks_us()
+        tries = 0
+        while True:
+            tries += 1
+            try:
+                self.i2c.readfrom_into(addr, buf, stop)
+                break
+            except OSError as e:
+                self.__Nack(addr, start, tries, e)
+        self.__Done(addr, start, len(buf))
+
+    def writeto_mem(self,addr,memaddr,buf):
+        start = time.ticks_us()
+        tries = 0
+        while True:
+            tries += 1
+            try:
+                self.i2c.writeto_mem(addr, memaddr, buf)
+                break
+            except OSError as e:
+                self.__Nack(addr, start, tries, e)
+        self.__Done(addr, start, len(buf) + 1)
+
+    def readfrom_mem_into(self,addr,memaddr,buf):
+        start = time.ticks_us()
+        tries = 0
+        while True:
+            tries += 1
+            try:
+                self.i2c.readfrom_mem_into(addr, memaddr, buf)
+                break
+            except OSError as e:
+                self.__Nack(addr, start, tries, e)
+        self.__Done(addr, start, len(buf) + 1)
+
+    #Allocating reads, kept for callers that need a new buffer
+    def readfrom(self,addr,nbytes,stop=True):
+        buf = bytearray(nbytes)
+        self.readfrom_into(addr, buf, stop)
+        return bytes(buf)
+
+    def readfrom_mem(self,addr,memaddr,nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def scan(self):
+        return self.Scan()
+
+    #Stats array of a device (see STAT_*), None if nothing has been sent to it
+    def DeviceStats(self,addr):
+        return self.__stats.get(addr)
+
+    #Share of time spent in transfers since stats were reset (0.0 to 1.0)
+    def Utilisation(self):
+        elapsedUs = time.ticks_diff(time.ticks_ms(), self.__startMs) * 1000
+        if elapsedUs <= 0:
+            return 0.0
+        busy = 0
+        for stats in self.__stats.values():
+            busy += stats[STAT_US]
+        return busy / elapsedUs
+
+    #Stats of all devices as {address: (transactions, bytes, us, nacks, failures)}, cleared after
+    #reading if reset is set (read Utilisation() first, it covers the same period)
+    def Stats(self,reset=False):
+        stats = {addr: tuple(counts) for addr, counts in self.__stats.items()}
+        if reset:
+            self.ResetStats()
+        return stats
+
+    #Clear all counts
+    def ResetStats(self):
+        for stats in self.__stats.values():
+            for i in range(STAT_SIZE):
+                stats[i] = 0
+        self.__startMs = time.ticks_ms()
@@ -0,0 +1,64 @@
+#Deep sleep duty cycling
+## State needed to resume is kept in RTC memory, which survives deep sleep
+##
+## RTC memory format (version 2, little endian):
+##- Header: magic (B), version (B), light level (H), alarm hour (b, -1 if none), alarm minute (b), telemetry frame length (H), device state length (B)
+##- Device state (I2C addresses and sensor registers, so they aren't probed and configured again on wake)
+##- Telemetry frame (unsent samples)
+import ustruct
+import machine
+
+MAGIC = 0xA5
+VERSION = 2
+STATE_FMT = "<BBHbbHB"
+STATE_SIZE = 9
+RTC_MEMORY_SIZE = 492 #Bytes of user RTC memory on ESP8266
+
+#Seconds until the device next needs to be awake
+## sinceSample: seconds since last sample, untilAlarm: seconds until alarm deadline (None if no alarm)
+## alarmLead: seconds to wake before the alarm (time to reconnect and start up)
+def NextWake(sinceSample,samplePeriod,untilAlarm,alarmLead):
+    delay = max(samplePeriod - sinceSample, 0)
+    if untilAlarm is not None:
+        delay = min(delay, max(untilAlarm - alarmLead, 0))
+    return delay
+
+#Save state to RTC memory, returns False if the frame didn't fit (state is then saved without it)
+## devices: bytes kept for the device drivers (up to 255)
+def SaveState(rtc,lightLevel,alarmHour,alarmMin,frame=None,devices=b''):
+    start = STATE_SIZE + len(devices) #Frame position
+    fits = frame is None or start + len(frame) <= RTC_MEMORY_SIZE
+    length = len(frame) if frame is not None and fits else 0
+    data = bytearray(start + length)
+    ustruct.pack_into(STATE_FMT, data, 0, MAGIC, VERSION, lightLevel,
+        -1 if alarmHour is None else alarmHour, -1 if alarmMin is None else alarmMin, length, len(devices))
+    data[STATE_SIZE:start] = devices
+    if length:
+        data[start:] = frame
+    rtc.memory(data)
+    return fits
+
+#Load state from RTC memory, returns (light level, alarm hour, alarm minute, telemetry frame or None, device bytes),
+#None if no state saved
+def LoadState(rtc):
+    data = rtc.memory()
+    if len(data) < STATE_SIZE:
+        return None
+    magic, version, lightLevel, alarmHour, alarmMin, length, devicesLength = ustruct.unpack_from(STATE_FMT, data, 0)
+    start = STATE_SIZE + devicesLength
+    if magic != MAGIC or version != VERSION or len(data) < start + length:
+        return None
+    rtc.memory(b'') #State only used once
+    frame = data[start:start + length] if length else None
+    return lightLevel, None if alarmHour < 0 else alarmHour, None if alarmMin < 0 else alarmMin, frame, data[STATE_SIZE:start]
+
+#Check whether the device has just woken from deep sleep
+def WokeFromSleep():
+    return machine.reset_cause() == machine.DEEPSLEEP_RESET
+
+#Enter deep sleep for a number of ms (needs GPIO16 connected to RST to wake)
+def DeepSleep(ms):
+    rtc = machine.RTC()
+    rtc.irq(trigger=rtc.ALARM0, wake=machine.DEEPSLEEP)
+    rtc.alarm(rtc.ALARM0, ms)
+    machine.deepsleep()
@@ -1,10 +1,79 @@
 import ssd1306 #Screen library
+import i2cbus #Shared I2C bus
 import time #Used for delays
 import machine #Used for accessing ESP8266 hardware
+import micropython #Scheduling work out of interrupt handlers
+from micropython import const
 import json #Converting to/from JSON strings
+import array #Preallocated sensor count buffers
 import mqtt #Broker control class
 import TSL2561Lib #Light sensor class
 import TCS34725Lib #Colour sensor class
+import autorange #Sensor gain/integration time selection
+import sampler #Sensors read only when a new result is ready
+import lowpower #Deep sleep between samples
+import alarms #Alarm scheduler
+import fade #Sunrise fade engine
+import colourctl #Closed loop colour control
+import streamstats #Running statistics and noise filtering of readings
+try:
+    import uasyncio as asyncio #Cooperative scheduler (on device)
+except ImportError:
+    import asyncio #Cooperative scheduler (on host)
+
+#Task periods (ms)
+DISPLAY_PERIOD_MS = 1000 #Clock display refresh
+PUBLISH_PERIOD_MS = 1000 #Sensor data added to telemetry (sent to broker in batches)
+ALARM_PERIOD_MS = 1000 #Alarm check and light ramp step
+MQTT_POLL_MS = 20 #Broker message poll (non-blocking)
+LOOP_PERIOD_MS = 1000 #Sequential main loop (mainLoop sleeps this long after each pass)
+SENSOR_MIN_PERIOD_MS = 50 #Shortest sensor sampling period, sensors are otherwise sampled at their integration time
+#Target time from a command being received to the LEDs changing (ms), each alarm command's latency is
+#acknowledged on esys/tbd/ack with whether it was over target
+CMD_LATENCY_TARGET_MS = 50
+#Light level above which the sunrise ramp advances (lux)
+LUX_ALARM_THRESHOLD = 500
+LUX_ALARM_RELEASE = 400 #Light level the alarm trigger resets below (hysteresis)
+LUX_ALARM_DWELL_MS = 2000 #Time the light level must stay past a level before the trigger changes
+LUX_MEDIAN_SAMPLES = 5 #Samples the trigger takes the median of (rejects single sample spikes)
+#Use the TSL2561 interrupt pin instead of polling the light level
+LUX_INTR_MODE = True
+LUX_INTR_PIN = 2
+LUX_INTR_PERSIST = 2 #Integration periods out of range before the interrupt triggers (0 would trigger every cycle)
+LUX_INTR_READ_MS = 30000 #Interrupt mode: lux is also read if there's been no reading for this long (one telemetry frame, telemetry.Telemetry flushSeconds)
+#Time for the sunrise ramp to go from off to full light
+RAMP_DURATION_MS = 30 * 60 * 1000
+#Correct LED output with colour sensor feedback during the sunrise ramp
+COLOUR_CONTROL = True
+#Id of the alarm set by the "time" command
+MAIN_ALARM_ID = 0
+#Deep sleep between samples while the lights are off (needs GPIO16 connected to RST)
+LOW_POWER_MODE = False
+LOW_POWER_SAMPLE_S = 300 #Time between wake ups to take samples
+LOW_POWER_AWAKE_MS = 3000 #Time awake after each wake up (sampling, publishing and receiving commands)
+LOW_POWER_MIN_SLEEP_S = 30 #Shorter sleeps than this are not worth the wake up cost
+ALARM_LEAD_S = 30 #Wake up this long before the alarm time
+#I2C bus pins, and addresses the screen may use (first found is used)
+I2C_SCL_PIN = 5
+I2C_SDA_PIN = 4
+OLED_ADDRS = (0x3D, 0x3C)
+#Automatically select sensor gain and integration time (lux sensor only when not in interrupt mode, as thresholds are raw counts)
+AUTO_RANGE = True
+
+#Profiling: phase and I2C transaction time histograms, overruns and heap, published on esys/tbd/diag
+## 0 compiles the profiling code out, set together with i2cbus.PROFILE (tools/build.py --profile sets both)
+PROFILE = const(0)
+DIAG_SAMPLE_MS = 1000 #Heap sampling period
+DIAG_PERIOD_MS = 60000 #Diagnostics report period
+
+if PROFILE:
+    import diag #Profiler (profiling builds only)
+
+#Sleep current task for a number of ms (asyncio on host has no sleep_ms)
+def sleepMs(ms):
+    if hasattr(asyncio, "sleep_ms"):
+        return asyncio.sleep_ms(ms)
+    return asyncio.sleep(ms / 1000)
 
 #Function called when MQTT message is recieved
 def callbackMQTT(topic, data):
@@ -20,14 +89,34 @@ def callbackMQTT(topic, data):
         #Get JSON string from "command" field and check command type
         if data_dict['command'] == "time":
             #Set internal alarm time
-            m.alarmHour = int(data_dict['hour'])
-            m.alarmMin = int(data_dict['min'])
+            m.setAlarm(int(data_dict['hour']), int(data_dict['min']))
+        elif data_dict['command'] == "addalarm":
+            #Add another alarm (days is a weekday mask, bit 0 Monday)
+            m.alarms.Add(int(data_dict['hour']), int(data_dict['min']), int(data_dict.get('days', alarms.ALL_DAYS)), bool(data_dict.get('once', False)))
+        elif data_dict['command'] == "clearalarms":
+            #Remove all alarms
+            m.alarms.Clear()
+            m.alarmHour = None
+            m.alarmMin = None
         elif data_dict['command'] == "alarm":
-            #Turn off alarm
-            m.alertsOff()
+            #Turn off alarm (or hold the current light level if pause is set)
+            m.alertsOff(bool(data_dict.get('pause', False)))
+        elif data_dict['command'] == "deadband":
+            #Change publish-on-change settings (missing fields are left unchanged)
+            m.mqtt.SetDeadband(data_dict.get('enable'), data_dict.get('lux'), data_dict.get('colour'), data_dict.get('rel'), data_dict.get('heartbeat'))
 
 class main:
     def __init__(self):
+        #Waking from deep sleep: the devices kept their settings (only the ESP8266 was powered down), so
+        #with the state saved in RTC memory the bus isn't probed and the devices aren't configured again
+        self.resumeState = None
+        if LOW_POWER_MODE and lowpower.WokeFromSleep():
+            self.resumeState = lowpower.LoadState(machine.RTC())
+        self.wokeFromSleep = self.resumeState is not None
+        if PROFILE:
+            self.profiler = diag.Profiler()
+            self.diagTicks = time.ticks_ms() #Time of last diagnostics report
+            self.loopDueUs = None #Time the next main loop pass is due
         #Startup system
         self.initMQTT()
         self.initRTC()
@@ -35,36 +124,77 @@ class main:
         self.initI2C()
         self.initSensors()
         self.initOLED()
-        #Current lighting level
-        self.lightCount = 0
         #Check if alarm is currently on
         self.alarmCurrent = False
         #Current alarm time
         self.alarmHour = None
         self.alarmMin = None
+        #Latest sensor readings
+        self.luxValue = 0
+        self.colValue = array.array('l', (0, 0, 0, 0)) #Filled in place (normalised counts)
+        #Streaming statistics (fixed buffers, adding a reading doesn't allocate)
+        self.luxStats = streamstats.Window(LUX_MEDIAN_SAMPLES)
+        self.luxTrigger = streamstats.Trigger(LUX_ALARM_THRESHOLD, LUX_ALARM_RELEASE, LUX_ALARM_DWELL_MS)
+        self.luxAck = False #Light alarm turned off by the user, until the light drops below the release level
+        self.luxMean = streamstats.Accumulator(1) #Readings since the last publish
+        self.colMean = streamstats.Accumulator(4)
+        self.colPublished = array.array('l', (0, 0, 0, 0)) #Colour published (mean of readings)
+        #Raw counts, filled in place by the drivers so sampling doesn't allocate
+        self.luxCounts = array.array('H', (0, 0))
+        self.colCounts = array.array('H', (0, 0, 0, 0))
+        #Command latency measurement
+        ## A command read by a poll arrived after the previous poll finished, so latency is taken from then
+        ## (worst case, it includes the poll period and any time the poll ran late)
+        self.pollTicks = time.ticks_ms() #End of last broker poll
+        self.cmdTicks = self.pollTicks #Earliest arrival of the commands being handled
+        self.cmdLatency = 0
+        self.cmdLatencyMax = 0
+        self.cmdLatencyOver = 0 #Commands over CMD_LATENCY_TARGET_MS
+        if self.wokeFromSleep:
+            self.restoreState()
+        self.resumeState = None
+        #Alarms last, an alarm missed while asleep or reset fires as soon as the scheduler starts
+        self.initAlarms()
 
     #MQTT broker (send callback function for recieving messages)
     def initMQTT(self):
-        self.mqtt = mqtt.MQTT(callbackMQTT)
+        self.mqtt = mqtt.MQTT(callbackMQTT, resume=self.wokeFromSleep)
 
     #Realtime clock
     def initRTC(self):
         self.rtc = machine.RTC()
 
+    #Alarm scheduler (alarms kept in flash)
+    def initAlarms(self):
+        self.alarms = alarms.AlarmScheduler(self.alarmFired)
+
     #Update internal clock with time string (in RFC3339 format)
     def updateTime(self,timeString):
         #Extract time from string
         ext_dattim = self.convTime(timeString)
         #Insert time into real time clock
         self.rtc.datetime((ext_dattim[0], ext_dattim[1], ext_dattim[2], 1, ext_dattim[3], ext_dattim[4], ext_dattim[5], 0))
+        #Alarm fire times depend on the clock
+        self.alarms.Rearm()
+
+    #Set daily alarm time
+    def setAlarm(self,hour,minute):
+        self.alarmHour = hour
+        self.alarmMin = minute
+        self.alarms.Add(hour, minute, alarmId=MAIN_ALARM_ID)
 
-    #Check if alarm is on
+    #Alarm time reached (called by alarm scheduler)
+    def alarmFired(self,alarmId):
+        #Turn on alarm
+        self.alarmCurrent = True
+        self.alarmOn()
+
+    #Check if light level should advance the alarm (alarm times are handled by the alarm scheduler)
+    ## The light level is the median of the latest readings, and must stay above the threshold for
+    ## LUX_ALARM_DWELL_MS (brief light such as headlights or a phone screen doesn't start the ramp).
+    ## Once turned off by the user it stays off until the light has dropped below LUX_ALARM_RELEASE
     def checkAlarm(self):
-        #Check if current time is alarm time
-        if (self.alarmHour == self.rtc.datetime()[4] and self.alarmMin == self.rtc.datetime()[5]):
-            #Turn on alarm
-            self.alarmCurrent = True
-        elif self.lux.GetLux() > 500: #This check is used because the interrupt code (see initSensors method) isn't triggering the TSL2561 intr
+        if self.luxTrigger.state and not self.luxAck:
             #Increment alarm
             self.lightRamp()
 
@@ -93,86 +223,427 @@ class main:
         self.pwmLEDr.duty(1023)
         self.pwmLEDg.duty(1023)
         self.pwmLEDb.duty(1023)
+        #Timer driven sunrise ramp (fade.index is the current lighting level)
+        self.fade = fade.Fade(self.pwmLEDr, self.pwmLEDg, self.pwmLEDb)
 
-    #I2C Protocol
+    #I2C bus shared by sensors and screen, devices are found by scanning the bus
     def initI2C(self):
-        self.i2c = machine.I2C(-1, machine.Pin(5), machine.Pin(4))
+        i2c, hardware = i2cbus.Open(I2C_SCL_PIN, I2C_SDA_PIN)
+        self.i2c = i2cbus.I2CBus(i2c, hardware=hardware)
+        if PROFILE:
+            self.i2c.profiler = self.profiler
+        #Devices that didn't answer the scan (reported with the diagnostics)
+        self.missingDevices = []
+        if self.wokeFromSleep: #Addresses found before sleeping
+            devices = self.resumeState[4]
+            self.luxAddr = devices[0]
+            self.oledAddr = devices[1]
+            return
+        present = self.i2c.Scan()
+        #Light sensor address depends on its ADDR pin (0x29 is taken by the colour sensor)
+        colAddr = TCS34725Lib.TCS34725Lib.SLAVE_ADDR
+        self.luxAddr = self.i2c.Find([a for a in TSL2561Lib.TSL2561Lib.SLAVE_ADDRS if a != colAddr], 0x39)
+        self.oledAddr = self.i2c.Find(OLED_ADDRS, OLED_ADDRS[0])
+        self.missingDevices = [name for name, addr in (("lux", self.luxAddr), ("colour", colAddr), ("screen", self.oledAddr)) if addr not in present]
 
     #Lux and colour sensors
     def initSensors(self):
+        #Registers saved before deep sleep (both sensors were only powered off)
+        luxSnapshot = None
+        colSnapshot = None
+        if self.wokeFromSleep:
+            devices = self.resumeState[4]
+            luxEnd = 3 + devices[2]
+            luxSnapshot = devices[3:luxEnd]
+            colSnapshot = devices[luxEnd:]
         #Active light sensor, turn on
-        self.lux = TSL2561Lib.TSL2561Lib(self.i2c)
+        self.lux = TSL2561Lib.TSL2561Lib(self.i2c, self.luxAddr, luxSnapshot)
         self.lux.PowerOn()
         #Active colour sensor, turn on, enable colour detection
-        self.col = TCS34725Lib.TCS34725Lib(self.i2c)
+        self.col = TCS34725Lib.TCS34725Lib(self.i2c, colSnapshot)
         self.col.PowerOn()
-        self.col.EnableRGBC()
-####################################################################################################
-        #Chip interrupt should work this way but seems to trigger immediately on run instead.
-        ## Setup interrupts and thresholds
-        #self.lux.SetIntrThreshold(0, 13000)
-        #self.lux.SetIntrCtrlSel("LVL")
-        #self.p2 = machine.Pin(2, machine.Pin.IN)
-        #self.p2.irq(trigger=machine.Pin.IRQ_FALLING, handler=self.lightRamp)
-####################################################################################################
+        if not self.wokeFromSleep:
+            self.col.EnableRGBC()
+            #Colour sensor flags every completed cycle (AINT with persistence 0), so only new results are read
+            self.col.SetIntrPers(0)
+        self.colGate = sampler.SampleGate(self.col.ReadRGBCIfNew, self.col.GetCycleTimeMs, True, SENSOR_MIN_PERIOD_MS)
+        #Lux sensor is polled on its interrupt output in polling mode (in interrupt mode it is read on interrupt)
+        self.luxGate = None
+        if not LUX_INTR_MODE:
+            self.initLuxReady()
+        #Gain/integration time controllers, started from the current sensor settings
+        self.luxRange = None
+        self.colRange = None
+        if AUTO_RANGE:
+            self.luxRange = autorange.AutoRange(TSL2561Lib.TSL2561Lib.AUTO_RANGES, self.lux.GetRange())
+            self.colRange = autorange.AutoRange(TCS34725Lib.TCS34725Lib.AUTO_RANGES, self.col.GetRange())
+        if LUX_INTR_MODE:
+            self.initLuxIntr()
+        #Closed loop colour control (needs fade engine from initLED)
+        self.colourCtl = colourctl.ColourControl(self.fade) if COLOUR_CONTROL else None
+
+    #Light level interrupt, lux sensor is read when the alarm threshold is crossed (and once a telemetry frame in between)
+    def initLuxIntr(self):
+        #Setup thresholds and persistence before enabling interrupt output (kept by the sensor in deep sleep)
+        if not self.wokeFromSleep:
+            self.setLuxIntrThreshold(False)
+            self.lux.SetIntrPersSel(LUX_INTR_PERSIST)
+            self.lux.SetIntrCtrlSel("LVL")
+        self.lux.ClrIntr()
+        #First read after the first integration (the sensor has only just been powered on)
+        self.luxReadTicks = time.ticks_add(time.ticks_ms(), self.lux.GetIntegTimeMs() - LUX_INTR_READ_MS)
+        #Keep reference to handler so scheduling it from the interrupt doesn't allocate
+        self.luxIntrRef = self.luxIntr
+        #Interrupt output is active low
+        self.luxIntrPin = machine.Pin(LUX_INTR_PIN, machine.Pin.IN)
+        self.luxIntrPin.irq(trigger=machine.Pin.IRQ_FALLING, handler=self.luxIntrHandler)
+
+    #Interrupt thresholds (raw channel 0 counts at the current gain and integration time)
+    ## While the alarm trigger is off the interrupt fires above LUX_ALARM_THRESHOLD, while it is on
+    ## below LUX_ALARM_RELEASE, so the trigger gets readings when the light crosses either level
+    def setLuxIntrThreshold(self,triggered):
+        if triggered:
+            self.lux.SetIntrThreshold(self.lux.LuxToCount(LUX_ALARM_RELEASE), 65000)
+        else:
+            self.lux.SetIntrThreshold(0, min(self.lux.LuxToCount(LUX_ALARM_THRESHOLD), 65000))
+
+    #Lux sensor interrupt output asserted at the end of every integration (persistence 0), used as data ready
+    def initLuxReady(self):
+        if not self.wokeFromSleep:
+            self.lux.SetIntrPersSel(0)
+            self.lux.SetIntrCtrlSel("LVL")
+        self.lux.ClrIntr()
+        self.luxIntrPin = machine.Pin(LUX_INTR_PIN, machine.Pin.IN)
+        self.luxGate = sampler.SampleGate(self.readLuxIfReady, self.lux.GetIntegTimeMs, False, SENSOR_MIN_PERIOD_MS)
+
+    #Read lux sensor counts into into if a new integration result is ready (no bus access if not)
+    def readLuxIfReady(self,into):
+        if self.luxIntrPin.value(): #Active low
+            return False
+        self.lux.ReadADCs(into)
+        self.lux.ClrIntr()
+        return True
+
+    #Interrupt pin handler, defers bus access out of interrupt context
+    def luxIntrHandler(self,pin):
+        try:
+            micropython.schedule(self.luxIntrRef, pin)
+        except RuntimeError: #Schedule queue full, interrupt stays asserted until cleared
+            pass
+
+    #Light threshold crossed
+    def luxIntr(self,pin):
+        self.sampleLux()
+        #Clear interrupt so it can trigger again on the next out of range period
+        self.lux.ClrIntr()
 
     #Screen activation
     def initOLED(self):
-        #Send reset
         self.oled_reset = machine.Pin(15, machine.Pin.OUT, None)
-        self.oled_reset.value(0)
-        #Wait for reset to complete
-        time.sleep_ms(200)
+        if not self.wokeFromSleep: #Screen is only powered off during deep sleep
+            #Send reset
+            self.oled_reset.value(0)
+            #Wait for reset to complete
+            time.sleep_ms(200)
         #Turn off reset
         self.oled_reset.value(1)
-        #Connect screen
-        self.oled = ssd1306.SSD1306_I2C(128, 64, self.i2c, 0x3D)
+        #Connect screen (after deep sleep it has kept its settings and contents, it is only switched on)
+        self.oled = ssd1306.SSD1306_I2C(128, 64, self.i2c, self.oledAddr, init=not self.wokeFromSleep)
 
     #Gradually increase light level
     def lightRamp(self):
-        if self.lightCount < 1020: #Up to max light value
-            self.lightCount += 10 #Increase light level
-            self.pwmLEDb.duty(1020-self.lightCount) #Increasing duty cycle
+        #Start fade if not already running, continuing from current level
+        if not self.fade.running and not self.fade.Finished():
+            self.fade.Start(RAMP_DURATION_MS)
 
-    #Turn alarm on
+    #Turn alarm on (called every ALARM_PERIOD_MS while the alarm is on)
     def alarmOn(self):
+        if self.fade.Finished() and not self.fade.running: #Already full light, LEDs and timer are left alone
+            return
         #Lowest duty cycle (white light on)
-        self.pwmLEDr.duty(0)
-        self.pwmLEDg.duty(0)
-        self.pwmLEDb.duty(0)
+        self.fade.Finish()
 
-    #Turn off all alerts regardless of light/time trigger.
-    def alertsOff(self):
-        #Highest duty cycle (all light off)
-        self.pwmLEDr.duty(1023)
-        self.pwmLEDg.duty(1023)
-        self.pwmLEDb.duty(1023)
+    #Turn off all alerts regardless of light/time trigger (pause holds the current light level)
+    def alertsOff(self,pause=False):
+        if pause:
+            self.fade.Pause()
+        else:
+            #Highest duty cycle (all light off)
+            self.fade.Abort()
         #Turn off alarm variable
         self.alarmCurrent = False
-        #Reset light output level
-        self.lightCount = 0
+        #Light alarm stays off while it is still light
+        self.luxAck = self.luxTrigger.state
+        #Record time taken from command arrival to LEDs changing
+        self.cmdLatency = time.ticks_diff(time.ticks_ms(), self.cmdTicks)
+        if self.cmdLatency > self.cmdLatencyMax:
+            self.cmdLatencyMax = self.cmdLatency
+        over = self.cmdLatency > CMD_LATENCY_TARGET_MS
+        if over:
+            self.cmdLatencyOver += 1
+        self.mqtt.PublishAck('alarm', self.cmdLatency, over)
 
-    #Main running loop
-    def mainLoop(self):
-        #Check MQTT broker for messages
+    #Check MQTT broker for messages
+    def pollMQTT(self):
+        self.cmdTicks = self.pollTicks
         self.mqtt.CheckMsg()
-        #Write time to screen
-        self.writeTime()
-        #Send data to MQTT broker
-        colour_string = "R"+hex(self.col.GetRedDataByte())+"G"+hex(self.col.GetGreenDataByte())+"B"+hex(self.col.GetBlueDataByte())
-        self.mqtt.SendData(self.lux.GetLux(),colour_string)
+        self.pollTicks = time.ticks_ms()
+
+    #Read light level
+    def sampleLux(self):
+        counts = self.luxCounts
+        if self.luxGate is None: #Interrupt mode, called on interrupt or by the periodic read (latest result)
+            self.lux.ReadADCs(counts)
+            self.luxReadTicks = time.ticks_ms()
+        elif not self.luxGate.Poll(counts): #No new integration result yet
+            return
+        if self.luxRange is not None and self.luxRange.Settling(): #Result integrated (partly) before the range change
+            return
+        ch0 = counts[0] #Indexed rather than unpacked, unpacking an array allocates an iterator
+        ch1 = counts[1]
+        self.luxValue = self.lux.CalculateLux(ch0, ch1) #Lux is already scaled for gain and integration time
+        self.luxStats.Add(self.luxValue)
+        self.luxMean.Add1(self.luxValue)
+        #Median rejects single sample spikes, and the latest reading must agree with it: the median lags
+        #by half the window, which with interrupt bursts could otherwise stretch a short pulse past the dwell
+        median = self.luxStats.Median()
+        level = max(median, self.luxValue) if self.luxTrigger.state else min(median, self.luxValue)
+        changed = self.luxTrigger.Update(level, time.ticks_ms())
+        if changed and not self.luxTrigger.state: #Light gone, next light alarm isn't acknowledged
+            self.luxAck = False
+        #Channel 0 (visible and IR) is always the larger count
+        rangeChanged = self.luxRange is not None and self.luxRange.Update(ch0)
+        if rangeChanged:
+            self.lux.SetRange(self.luxRange.index)
+        if self.luxGate is not None:
+            if rangeChanged:
+                self.luxGate.Restart() #Timing change restarts integration
+        elif changed or rangeChanged: #Interrupt thresholds depend on the trigger state and the range
+            self.setLuxIntrThreshold(self.luxTrigger.state)
+
+    #Read all colour channels
+    def sampleColour(self):
+        counts = self.colCounts
+        if not self.colGate.Poll(counts): #No new result yet (single burst read of status and all channels)
+            return
+        value = self.colValue
+        if self.colRange is None:
+            for c in range(4):
+                value[c] = counts[c]
+            self.colMean.Add(counts)
+            self.controlColour(counts, self.col.GetRange())
+            return
+        if self.colRange.Settling(): #Result integrated (partly) before the range change
+            return
+        self.controlColour(counts, self.colRange.index)
+        red = counts[0]
+        green = counts[1]
+        blue = counts[2]
+        clear = counts[3]
+        #Scale to the most sensitive range so readings are comparable across ranges
+        norm = self.colRange.Normalise
+        value[0] = norm(red)
+        value[1] = norm(green)
+        value[2] = norm(blue)
+        value[3] = norm(clear)
+        self.colMean.Add(value)
+        #Clear is always the largest channel
+        if self.colRange.Update(clear):
+            self.col.SetRange(self.colRange.index)
+
+    #Update LED correction from raw colour reading taken in range (index into AUTO_RANGES)
+    def controlColour(self,rgbc,rangeIndex):
+        if self.colourCtl is not None:
+            integTime, gain, maxCount = TCS34725Lib.TCS34725Lib.AUTO_RANGES[rangeIndex]
+            self.colourCtl.Update(rgbc[0], rgbc[1], rgbc[2], rgbc[3], integTime, gain)
+
+    #Add sensor readings to telemetry sent to MQTT broker
+    ## Each sample is the mean of the readings taken since the last one (the latest readings if there
+    ## were none), so sensor noise is averaged out before the telemetry deadband
+    def sendData(self):
+        lux = self.luxMean.Mean()
+        if lux is None:
+            lux = self.luxValue
+        self.mqtt.AddSample(lux, self.colMean.Means(self.colPublished))
+        self.luxMean.Clear()
+        self.colMean.Clear()
+
+    #Check alarm state and update lighting
+    def updateAlarm(self):
         #Check if alarm is currently running
         self.checkAlarm()
         #If alarm is on, change lighting
         if self.alarmCurrent:
             self.alarmOn()
+
+    #Interrupt mode: read the light level if there's been no interrupt for a telemetry frame, so frames carry the current level
+    def refreshLux(self):
+        if self.luxRefreshMs() == 0:
+            self.sampleLux()
+
+    #Time until the interrupt mode lux read is due
+    def luxRefreshMs(self):
+        return max(LUX_INTR_READ_MS - time.ticks_diff(time.ticks_ms(), self.luxReadTicks), 0)
+
+    #Time until the lux sensor's next result is due
+    def luxPeriod(self):
+        return self.luxGate.NextMs()
+
+    #Time until the colour sensor's next result is due
+    def colPeriod(self):
+        return self.colGate.NextMs()
+
+    #Main running loop (all phases in sequence)
+    def mainLoop(self):
+        if PROFILE:
+            start = time.ticks_us()
+            if self.loopDueUs is not None: #Each pass runs late by the time the last one took
+                self.profiler.Late("loop", time.ticks_diff(start, self.loopDueUs), LOOP_PERIOD_MS * 1000)
+            self.loopDueUs = time.ticks_add(start, LOOP_PERIOD_MS * 1000)
+            mark = start
+        #Check MQTT broker for messages
+        self.pollMQTT()
+        if PROFILE:
+            mark = self.profiler.Span("mqtt", mark)
+        #Write time to screen
+        self.writeTime()
+        if PROFILE:
+            mark = self.profiler.Span("display", mark)
+        #Read sensors and send data to MQTT broker
+        self.sampleColour()
+        if PROFILE:
+            mark = self.profiler.Span("colour", mark)
+        if LUX_INTR_MODE:
+            self.refreshLux()
+        else:
+            self.sampleLux()
+        if PROFILE:
+            mark = self.profiler.Span("lux", mark)
+        self.sendData()
+        if PROFILE:
+            mark = self.profiler.Span("send", mark)
+        #Check alarm and change lighting
+        self.updateAlarm()
+        if PROFILE:
+            self.profiler.Span("alarm", mark)
+            self.profiler.Span("loop", start)
+            self.checkDiag()
         #Wait for 1 second
-        time.sleep(1)
+        time.sleep_ms(LOOP_PERIOD_MS)
+
+    #Sample the heap, and publish a diagnostics report every DIAG_PERIOD_MS (PROFILE only)
+    ## The report has the profiler's spans and heap figures, and the I2C and sample gate stats of the
+    ## same period (all are reset after each report), I2C devices missing at boot and the last WiFi
+    ## connection time
+    def checkDiag(self):
+        self.profiler.Heap()
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self.diagTicks) < DIAG_PERIOD_MS:
+            return
+        self.diagTicks = now
+        utilisation = self.i2c.Utilisation()
+        extra = {
+            'i2c': {"0x%02x" % addr: stats for addr, stats in self.i2c.Stats(True).items()}, #Counts of this period (32 bit counters wrap)
+            'i2c_utilisation': utilisation,
+            'colour_gate': self.colGate.Stats(),
+            'cmd_latency_max_ms': self.cmdLatencyMax,
+            'cmd_latency_over': self.cmdLatencyOver,
+            'i2c_missing': self.missingDevices,
+            'wifi': {'connect_ms': self.mqtt.net.connectMs, 'cached': self.mqtt.net.usedCache}
+        }
+        if self.luxGate is not None:
+            extra['lux_gate'] = self.luxGate.Stats()
+        self.mqtt.PublishDiag(json.dumps(self.profiler.Report(extra)))
+        self.profiler.Reset()
+        self.colGate.ResetStats()
+        if self.luxGate is not None:
+            self.luxGate.ResetStats()
+
+    #Restore state saved before deep sleep
+    def restoreState(self):
+        lightLevel, self.alarmHour, self.alarmMin, frame, devices = self.resumeState
+        self.fade.Seek(lightLevel)
+        if frame is not None: #Samples taken before sleeping
+            self.mqtt.QueueFrame(frame)
+
+    #Enter deep sleep if nothing needs the device awake before the next sample
+    def trySleep(self):
+        #LEDs are driven by PWM, which stops in deep sleep
+        if self.alarmCurrent or self.fade.index:
+            return
+        if self.mqtt.net.joining: #Stay awake to send the samples once connected
+            return
+        untilAlarm = self.alarms.SecondsUntilNext()
+        #Samples have just been taken during the awake time
+        delay = lowpower.NextWake(0, LOW_POWER_SAMPLE_S, untilAlarm, ALARM_LEAD_S)
+        if delay >= LOW_POWER_MIN_SLEEP_S:
+            self.enterSleep(delay)
+
+    #Save state, power down peripherals and deep sleep for delay seconds
+    def enterSleep(self,delay):
+        self.lux.PowerOff()
+        self.col.PowerOff()
+        self.oled.poweroff()
+        #Addresses and sensor registers (after power off, so they are powered on again on wake)
+        luxSnapshot = self.lux.Snapshot()
+        devices = bytes((self.luxAddr, self.oledAddr, len(luxSnapshot))) + luxSnapshot + self.col.Snapshot()
+        frame = self.mqtt.TakeFrame() #Unsent samples
+        if not lowpower.SaveState(self.rtc, self.fade.index, self.alarmHour, self.alarmMin, frame, devices):
+            self.mqtt.spool.Put(frame) #Too large for RTC memory, keep in flash instead
+        self.mqtt.spool.Flush() #Queued frames are lost from RAM in deep sleep
+        lowpower.DeepSleep(delay * 1000)
+
+    #Stay awake for a while after each wake up, then sleep
+    async def lowPowerTask(self):
+        while True:
+            await sleepMs(LOW_POWER_AWAKE_MS)
+            self.trySleep()
+
+    #Run function every period (periodFn returns period in ms)
+    ## span: profiler span of the phase (PROFILE only), its run time and lateness are recorded
+    async def periodicTask(self,function,periodFn,span=None):
+        if PROFILE:
+            dueUs = None #Time the next run is due
+        while True:
+            start = time.ticks_ms()
+            if PROFILE:
+                startUs = time.ticks_us()
+                if dueUs is not None:
+                    self.profiler.Late(span, time.ticks_diff(startUs, dueUs), periodUs)
+            function()
+            if PROFILE:
+                self.profiler.Span(span, startUs)
+            #Sleep for remainder of period
+            elapsed = time.ticks_diff(time.ticks_ms(), start)
+            period = periodFn()
+            if PROFILE:
+                periodUs = period * 1000
+                dueUs = time.ticks_add(startUs, periodUs)
+            await sleepMs(max(period - elapsed, 0))
+
+    #Start each phase as its own task on the cooperative scheduler
+    async def runTasks(self):
+        #Join the cached access point before the tasks start, a stale cached lease resets the board (see netup)
+        await self.mqtt.net.Connect(True)
+        asyncio.create_task(self.mqtt.Start())
+        asyncio.create_task(self.periodicTask(self.writeTime, lambda: DISPLAY_PERIOD_MS, "display"))
+        if LUX_INTR_MODE: #Read on interrupt, and once a telemetry frame in between
+            asyncio.create_task(self.periodicTask(self.refreshLux, self.luxRefreshMs, "lux"))
+        else:
+            asyncio.create_task(self.periodicTask(self.sampleLux, self.luxPeriod, "lux"))
+        asyncio.create_task(self.periodicTask(self.sampleColour, self.colPeriod, "colour"))
+        asyncio.create_task(self.periodicTask(self.sendData, lambda: PUBLISH_PERIOD_MS, "send"))
+        asyncio.create_task(self.periodicTask(self.updateAlarm, lambda: ALARM_PERIOD_MS, "alarm"))
+        if LOW_POWER_MODE:
+            asyncio.create_task(self.lowPowerTask())
+        if PROFILE:
+            asyncio.create_task(self.periodicTask(self.checkDiag, lambda: DIAG_SAMPLE_MS, "diag"))
+        await self.periodicTask(self.pollMQTT, lambda: MQTT_POLL_MS, "mqtt")
 
     #Write current time to the screen
     def writeTime(self):
-        #Empty screen
-        self.oled.fill(0)
+        #Empty time area of screen (8 characters of 8x8 font), only this area is refreshed
+        self.oled.fill_rect(0, 0, 64, 8, 0)
         #Read hours
         hours = str(self.rtc.datetime()[4])
         if len(hours) == 1:
@@ -197,10 +668,9 @@ m = main()
 def runPart():
     m.mainLoop()
 
-#Run multiple loops forever
+#Run all tasks forever
 def run():
-    while True:
-        runPart()
+    asyncio.run(m.runTasks())
 
 #Run the program
 run()
@@ -1,33 +1,155 @@
 import machine #For device functions
 import json #Converting to/from JSON strings
 from umqtt.simple import MQTTClient #MQTT client for broker
-import network #Network access (wifi)
+import netup #WiFi bring-up
+import time #Sample timestamps
+import telemetry #Batched binary telemetry frames
+import spool #Queue for frames sent while disconnected
+
+#Topic for telemetry frames (versioned with the frame format)
+TELEMETRY_TOPIC = "esys/tbd/telemetry/v%d" % telemetry.VERSION
+#Topic for profiling reports (main.PROFILE)
+DIAG_TOPIC = "esys/tbd/diag"
+#Topic for command acknowledgements
+ACK_TOPIC = "esys/tbd/ack"
+#Broker address
+BROKER = '192.168.0.10'
+#Access point
+SSID = 'EEERover'
+PASSWORD = 'exhibition'
+STATIC_IP = None #(ip, netmask, gateway, dns) to skip DHCP, otherwise the last lease is reused
+#Delay between reconnection attempts (doubles after each failure, up to max)
+RECONNECT_MIN_MS = 1000
+RECONNECT_MAX_MS = 60000
 
 class MQTT:
-    def __init__(self,callback_function):
-        self.initNetwork() #Startup internet
-        self.localClient = MQTTClient(machine.unique_id(), '192.168.0.10') #New MQTT instance
-        self.localClient.connect() #Connect to instance
+    #clientClass can be replaced to connect to a stand-in broker, resume is set when waking from deep sleep
+    def __init__(self,callback_function,clientClass=MQTTClient,resume=False):
+        self.initNetwork(resume) #Startup internet
+        self.localClient = clientClass(machine.unique_id(), BROKER) #New MQTT instance
         self.localClient.set_callback(callback_function) #Callback function for reading from MQTT
-        self.localClient.subscribe("esys/time") #Time topic subscribed for updating time
-        self.localClient.subscribe("esys/tbd/command") #Command topic subscribed for setting alarm
-
-    #Connect to internet and access point
-    def initNetwork(self):
-        self.ap_if = network.WLAN(network.AP_IF) #Startup access point
-        self.ap_if.active(False) #Disable access point output
-        self.sta_if = network.WLAN(network.STA_IF) #Startup station recieving
-        if not self.sta_if.isconnected(): #If not connected to station
-            self.sta_if.active(True) #Activate station connection
-            self.sta_if.connect('EEERover', 'exhibition') #Connect to local station
-            while not self.sta_if.isconnected(): #While not connected, wait
-                pass
+        self.telemetry = telemetry.Telemetry() #Sample buffer sent as batched frames
+        self.deadband = telemetry.Deadband() #Only keep samples that have changed (plus heartbeat)
+        self.spool = spool.Spool(slotSize=len(self.telemetry.frame)) #Frames not yet sent
+        #Connection state
+        self.connected = False
+        self.reconnectDelay = RECONNECT_MIN_MS
+        self.reconnectTicks = time.ticks_ms() #Time of next connection attempt
+
+    #Join access point and connect to broker (coroutine, run as a task so joining doesn't hold up the others)
+    async def Start(self):
+        await self.net.Connect()
+        self.Connect()
+
+    #Connect to broker, on failure schedule the next attempt
+    def Connect(self):
+        if not self.sta_if.isconnected(): #Access point lost, station reconnects by itself
+            self.__ConnectFailed()
+            return False
+        try:
+            self.localClient.connect() #Connect to instance
+            self.localClient.subscribe("esys/time") #Time topic subscribed for updating time
+            self.localClient.subscribe("esys/tbd/command") #Command topic subscribed for setting alarm
+        except OSError:
+            self.__ConnectFailed()
+            return False
+        self.connected = True
+        self.reconnectDelay = RECONNECT_MIN_MS
+        #Send everything queued while disconnected
+        self.spool.Drain(self.__Publish)
+        return True
+
+    #Schedule next connection attempt with exponential backoff
+    def __ConnectFailed(self):
+        self.__Disconnected()
+        self.reconnectTicks = time.ticks_add(time.ticks_ms(), self.reconnectDelay)
+        self.reconnectDelay = min(self.reconnectDelay * 2, RECONNECT_MAX_MS)
+
+    #Mark connection as lost and release socket
+    def __Disconnected(self):
+        self.connected = False
+        try:
+            self.localClient.sock.close()
+        except (AttributeError, OSError): #No socket opened yet
+            pass
+
+    #Publish message, returns False if the connection has been lost
+    def __Publish(self,msg):
+        if not self.connected:
+            return False
+        try:
+            self.localClient.publish(TELEMETRY_TOPIC,msg)
+        except OSError:
+            self.__ConnectFailed()
+            return False
+        return True
+
+    #Publish a diagnostics report (JSON string), dropped when not connected, returns True if sent
+    def PublishDiag(self,report):
+        if not self.connected:
+            return False
+        try:
+            self.localClient.publish(DIAG_TOPIC,bytes(report,'utf-8'))
+        except OSError:
+            self.__ConnectFailed()
+            return False
+        return True
+
+    #Acknowledge a handled command with its latency (ms) and whether it was over target, dropped when not connected
+    def PublishAck(self,command,latencyMs,over):
+        if not self.connected:
+            return False
+        try:
+            self.localClient.publish(ACK_TOPIC,bytes(json.dumps({'command':command,'latency_ms':latencyMs,'over':over}),'utf-8'))
+        except OSError:
+            self.__ConnectFailed()
+            return False
+        return True
+
+    #Setup internet and access point connection (joined by Start, which gives up after a deadline, broker connection is then retried later)
+    def initNetwork(self,resume=False):
+        self.net = netup.NetUp(SSID, PASSWORD, STATIC_IP, resume=resume)
+        self.sta_if = self.net.sta_if
 
     #Send data to broker
     def SendData(self,lux,colour):
         data = json.dumps({'name':'Light','Level':lux,'Colour':colour}) #Assemble JSON string with lux
         self.localClient.publish("esys/tbd/lux",bytes(data,'utf-8')) #Send to client
 
-    #Check MQTT broker messages
+    #Buffer sample, sending a telemetry frame when enough samples have been collected
+    def AddSample(self,lux,colour):
+        now = time.time()
+        if self.deadband.Check(now,lux,colour):
+            if not self.telemetry.Fits(now): #Clock changed, buffered samples are sent in their own frame
+                self.QueueFrame(self.telemetry.Pack())
+            self.telemetry.Add(now,lux,colour)
+        if self.telemetry.Due(now):
+            #Queue frame behind any backlog so frames are sent in order, kept until connection is back
+            self.QueueFrame(self.telemetry.Pack())
+
+    #Pack buffered samples into a frame without sending it (None if no samples)
+    def TakeFrame(self):
+        if not self.telemetry.count:
+            return None
+        return self.telemetry.Pack()
+
+    #Queue a previously taken frame for sending
+    def QueueFrame(self,frame):
+        self.spool.Put(frame)
+        if self.connected:
+            self.spool.Drain(self.__Publish)
+
+    #Change publish-on-change settings (None leaves a setting unchanged)
+    def SetDeadband(self,enabled=None,absLux=None,absColour=None,rel=None,heartbeat=None):
+        self.deadband.Configure(enabled,absLux,absColour,rel,heartbeat)
+
+    #Check MQTT broker messages, reconnecting when the connection has been lost
     def CheckMsg(self):
-        self.localClient.check_msg()
+        if not self.connected:
+            if not self.net.joining and time.ticks_diff(time.ticks_ms(), self.reconnectTicks) >= 0:
+                self.Connect()
+            return
+        try:
+            self.localClient.check_msg()
+        except OSError:
+            self.__ConnectFailed()
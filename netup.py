@@ -0,0 +1,151 @@
+#WiFi station bring-up
+## The access point (BSSID, channel) and IP settings of the last good connection are kept in
+## flash, so the next boot can join that access point directly without a scan or DHCP.
+## If that fails before the deadline, the cache is dropped and a full scan is done instead.
+## A reused lease is set as a static IP configuration, which stops the DHCP client, and the
+## ESP8266 port can't start it again (there's no ifconfig('dhcp')). When a join with a reused
+## lease fails the cache is dropped and the board is reset, so it joins with DHCP. This is only
+## done at boot (main joins the cached access point before starting its tasks, so no state is
+## lost), and not when resuming from deep sleep: the RTC memory state would be lost, and waking
+## from the next deep sleep starts the DHCP client again anyway.
+## Joins wait on the scheduler, so other tasks keep running while the station connects.
+import network #Network access (wifi)
+import machine #Reset after a failed join with a reused lease
+try:
+    import uasyncio as asyncio #Cooperative scheduler (on device)
+except ImportError:
+    import asyncio #Cooperative scheduler (on host)
+import time #Connection deadline
+import json #Cache file format
+import os #Removing cache file
+import ubinascii #BSSID to/from hex string
+
+CACHE_PATH = "net.json"
+CACHED_TIMEOUT_MS = 3000 #Deadline when joining the cached access point
+SCAN_TIMEOUT_MS = 15000 #Deadline when joining after a full scan
+POLL_MS = 10 #Sleep between connection checks (other tasks run meanwhile)
+
+#Sleep current task for a number of ms (asyncio on host has no sleep_ms)
+def sleepMs(ms):
+    if hasattr(asyncio, "sleep_ms"):
+        return asyncio.sleep_ms(ms)
+    return asyncio.sleep(ms / 1000)
+
+class NetUp:
+    #Constructor
+    ## staticIP: (ip, netmask, gateway, dns) to always use, otherwise the cached DHCP lease is reused
+    ## resume: waking from deep sleep, interfaces are already set up from an earlier boot
+    def __init__(self,ssid,password,staticIP=None,reuseLease=True,resume=False):
+        self.ssid = ssid
+        self.password = password
+        self.staticIP = staticIP
+        self.reuseLease = reuseLease
+        self.bssid = None #Access point joined (hex string)
+        self.channel = None #Channel of access point (informational, the SDK finds it from the BSSID)
+        self.connectMs = None #Time taken to connect in last Connect call (None if it failed)
+        self.usedCache = False #Whether last connection used the cached settings
+        self.joining = False #Connect running
+        self.staleLease = False #Reused lease failed on resume, static until the next deep sleep
+        self.resume = resume
+        self.ap_if = network.WLAN(network.AP_IF) #Startup access point
+        if not resume: #The SDK keeps the interface mode in flash
+            self.ap_if.active(False) #Disable access point output
+        self.sta_if = network.WLAN(network.STA_IF) #Startup station recieving
+
+    #Connect to access point (coroutine), returns True when connected
+    ## cachedOnly: only try the cached access point (may reset the board, see above)
+    async def Connect(self,cachedOnly=False):
+        if self.sta_if.isconnected(): #Station may already be connected from saved configuration or an earlier call
+            return True
+        start = time.ticks_ms()
+        self.joining = True
+        try:
+            connected = await self.__Connect(cachedOnly)
+        finally:
+            self.joining = False
+        self.connectMs = time.ticks_diff(time.ticks_ms(), start) if connected else None
+        return connected
+
+    #Join cached access point, then any with the SSID after a scan (unless cachedOnly)
+    async def __Connect(self,cachedOnly):
+        self.usedCache = False
+        if self.staleLease:
+            return False
+        self.sta_if.active(True) #Activate station connection
+        cache = self.__LoadCache()
+        if cache is not None:
+            ifconfig = cache.get('ifconfig')
+            self.usedCache = await self.__Join(ifconfig, CACHED_TIMEOUT_MS)
+            if self.usedCache:
+                return True
+            self.__ClearCache()
+            if self.staticIP is None and ifconfig is not None and self.reuseLease:
+                if not self.resume:
+                    machine.reset() #Only way back to DHCP
+                self.staleLease = True
+                return False
+        if cachedOnly:
+            return False
+        self.__Scan()
+        if not await self.__Join(None, SCAN_TIMEOUT_MS):
+            return False
+        self.__SaveCache()
+        return True
+
+    #Join access point (self.bssid, or any with the SSID if None), waiting until deadline
+    async def __Join(self,ifconfig,timeoutMs):
+        if self.staticIP is not None:
+            self.sta_if.ifconfig(self.staticIP)
+        elif ifconfig is not None and self.reuseLease:
+            self.sta_if.ifconfig(tuple(ifconfig)) #Skip DHCP
+        if self.bssid is not None:
+            self.sta_if.connect(self.ssid, self.password, bssid=ubinascii.unhexlify(self.bssid))
+        else:
+            self.sta_if.connect(self.ssid, self.password)
+        deadline = time.ticks_add(time.ticks_ms(), timeoutMs)
+        while not self.sta_if.isconnected():
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                self.sta_if.disconnect()
+                return False
+            await sleepMs(POLL_MS)
+        return True
+
+    #Find strongest access point with our SSID
+    def __Scan(self):
+        self.bssid = None
+        self.channel = None
+        bestRssi = None
+        for ssid, bssid, channel, rssi, authmode, hidden in self.sta_if.scan():
+            if ssid == self.ssid.encode() and (bestRssi is None or rssi > bestRssi):
+                bestRssi = rssi
+                self.bssid = ubinascii.hexlify(bssid).decode()
+                self.channel = channel
+
+    #Load cached connection settings (None if no cache)
+    def __LoadCache(self):
+        try:
+            with open(CACHE_PATH) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get('ssid') != self.ssid:
+            return None
+        self.bssid = cache.get('bssid')
+        self.channel = cache.get('channel')
+        return cache
+
+    #Save settings of current connection
+    def __SaveCache(self):
+        cache = {'ssid':self.ssid,'bssid':self.bssid,'channel':self.channel,'ifconfig':list(self.sta_if.ifconfig())}
+        try:
+            with open(CACHE_PATH, "w") as f:
+                json.dump(cache, f)
+        except OSError: #Failing to cache only slows down the next boot
+            pass
+
+    #Remove cached settings
+    def __ClearCache(self):
+        try:
+            os.remove(CACHE_PATH)
+        except OSError:
+            pass
@@ -0,0 +1,59 @@
+#Write-through shadow of a device's configuration registers
+## Non-volatile registers are loaded once and then served from memory, and
+## writes that would not change a register are not sent to the device
+
+class RegCache:
+    #Constructor
+    ## readFn(reg,length) and writeFn(reg,data,length) perform the actual device access
+    ## cachedRegs lists the registers that only change when written by this driver
+    ## snapshot: shadow saved with Snapshot() while the device kept its registers (e.g. across deep
+    ## sleep of the host), used instead of loading them from the device
+    def __init__(self,readFn,writeFn,size,cachedRegs,snapshot=None):
+        self.__read = readFn
+        self.__write = writeFn
+        self.__shadow = bytearray(size) #Register contents
+        self.__cached = bytearray(size) #Non-zero for registers held in the shadow
+        for reg in cachedRegs:
+            self.__cached[reg] = 1
+        if snapshot is not None and len(snapshot) == size:
+            self.__shadow[:] = snapshot
+        else:
+            self.Resync()
+
+    #Copy of the shadow registers, to be passed back to the constructor
+    def Snapshot(self):
+        return bytes(self.__shadow)
+
+    #Reload all cached registers from the device
+    def Resync(self):
+        for reg in range(len(self.__shadow)):
+            if self.__cached[reg]:
+                self.__shadow[reg] = self.__read(reg,1)
+
+    #Check whether every byte of a (multibyte) register is cached
+    def IsCached(self,reg,length=1):
+        for i in range(reg, reg + length):
+            if not self.__cached[i]:
+                return False
+        return True
+
+    #Read register, from memory if cached
+    def Read(self,reg,length=1):
+        if not self.IsCached(reg,length): #Volatile register, go to device
+            return self.__read(reg,length)
+        value = 0
+        for i in range(length): #Registers are little endian
+            value |= self.__shadow[reg + i] << (8 * i)
+        return value
+
+    #Write register, only if the value differs from the shadow (or force is set)
+    ## Returns True if the device was written to
+    def Write(self,reg,data,length=1,force=False):
+        cached = self.IsCached(reg,length)
+        if cached and not force and self.Read(reg,length) == data:
+            return False
+        self.__write(reg,data,length)
+        for i in range(length): #Update shadow with written value
+            if self.__cached[reg + i]:
+                self.__shadow[reg + i] = (data >> (8 * i)) & 0xFF
+        return True
@@ -0,0 +1,148 @@
+#Sample-ready gating for the light sensors
+## A sensor is only read when it has a new integration result, so each result is read once and
+## no bus time is spent re-reading an old one. The gate keeps an estimate of when the sensor's
+## last cycle ended (as a window the end lies in) and of its cycle time, starting from the nominal
+## cycle time of its timing configuration, and polls just after the next cycle should have ended.
+##
+## The sensor's own clock is a few percent off nominal, so the cycle time is measured, and the
+## window grows by the allowed cycle time error each cycle. When it is over a quarter of the cycle
+## (or every SYNC_SAMPLES results) the poll is made in the middle of the window instead: a new
+## result halves the window for the next cycle, and no result is followed by retries that halve
+## what is left of it, until the end of a cycle is seen to within RETRY_MS. The time between two
+## such observations gives the actual cycle time.
+##
+## The ready check is done by the read function given to the gate:
+##- TCS34725: STATUS is read in the same burst as the data, AINT (set every cycle with PERS = 0)
+##  and AVALID show whether the data is new (TCS34725Lib.ReadRGBCIfNew)
+##- TSL2561: the interrupt output (set every cycle with PERSIST = 0) is checked without a bus
+##  transaction, and the counts are only read when it is asserted
+import time
+
+RETRY_MS = 2 #Shortest time before polling again when a result was expected but not ready
+SYNC_SAMPLES = 64 #Most results between polls made to observe the end of a cycle
+MIN_SYNC_CYCLES = 16 #Cycles between observations needed to measure the cycle time
+MAX_SYNC_US = 1 << 28 #Observations further apart are not used (ticks_us differences wrap)
+DRIFT_SHIFT = 4 #Cycle time may be off nominal by up to 1/16 until it has been measured
+MEASURED_DRIFT_SHIFT = 10 #and by up to 1/1024 once measured
+
+class SampleGate:
+    #Constructor
+    ## readFn(into): reads a sample into into (array) if a new result is ready, returns True if it was
+    ## periodFn(): nominal sensor cycle time in ms (integration time, plus wait time if enabled)
+    ## pollsUseBus: False if the ready check doesn't use the bus (only new results are read)
+    ## minPeriodMs: shortest time between reads (results in between are skipped)
+    def __init__(self,readFn,periodFn,pollsUseBus=True,minPeriodMs=0):
+        self.readFn = readFn
+        self.periodFn = periodFn
+        self.pollsUseBus = pollsUseBus
+        self.minPeriodMs = minPeriodMs
+        self.lastUs = time.ticks_us() #Time of last new result
+        self.Restart()
+        self.ResetStats()
+
+    #Sensor timing changed, cycle end and cycle time are unknown again
+    def Restart(self):
+        self.nominalMs = self.periodFn()
+        self.periodUs = self.nominalMs * 1000 #Cycle time (nominal until measured)
+        self.measured = False
+        self.endUs = time.ticks_us() #Latest time the last cycle could have ended
+        self.windowUs = self.periodUs #It ended no more than this before endUs
+        self.staleUs = None #Time of last poll that found no new result (since the last result)
+        self.syncUs = None #Cycle end observed (to within RETRY_MS) that the cycle time is measured from
+        self.syncCycles = 0 #Cycles counted (results read and missed) at syncUs
+        self.cycles = 0 #Cycles counted since restart
+        self.sinceSync = SYNC_SAMPLES #Results since the last observation (cycle end is looked for straight away)
+
+    #Allowed error of the cycle time
+    def __Drift(self):
+        return 250 + (self.periodUs >> (MEASURED_DRIFT_SHIFT if self.measured else DRIFT_SHIFT))
+
+    #Read a new result into into if one is ready, returns True if into was updated
+    def Poll(self,into):
+        self.polls += 1
+        if self.periodFn() != self.nominalMs: #Timing changed
+            self.Restart()
+        now = time.ticks_us()
+        if not self.readFn(into):
+            if self.pollsUseBus:
+                self.staleReads += 1
+            self.staleUs = now
+            return False
+        period = self.periodUs
+        lost = 0
+        if self.samples: #Results completed between the last read and this one were lost
+            lost = max((time.ticks_diff(now, self.lastUs) + (period >> 1)) // period - 1, 0)
+            self.missed += lost
+        self.cycles += lost + 1
+        #Cycle ended after the last poll and before this one, and within the cycle time (give or take
+        #the allowed error) of the last cycle end if no result was lost in between
+        lower = self.staleUs if self.staleUs is not None else self.lastUs
+        upper = now
+        if self.samples and not lost:
+            drift = self.__Drift()
+            early = time.ticks_add(self.endUs, period - self.windowUs - drift)
+            late = time.ticks_add(self.endUs, period + drift)
+            if time.ticks_diff(early, lower) > 0 and time.ticks_diff(upper, early) > 0:
+                lower = early
+            if time.ticks_diff(late, lower) > 0 and time.ticks_diff(upper, late) > 0:
+                upper = late
+        window = min(time.ticks_diff(upper, lower), period)
+        if self.staleUs is not None and window <= (RETRY_MS + 1) * 1000: #End of cycle observed
+            cycles = self.cycles - self.syncCycles #Each result read or missed is one cycle
+            if self.syncUs is not None and cycles >= MIN_SYNC_CYCLES and time.ticks_diff(now, self.syncUs) <= MAX_SYNC_US:
+                self.periodUs = time.ticks_diff(upper, self.syncUs) // cycles
+                self.measured = True
+            if self.syncUs is None or cycles >= MIN_SYNC_CYCLES:
+                self.syncUs = upper
+                self.syncCycles = self.cycles
+            self.sinceSync = 0
+        elif self.sinceSync < SYNC_SAMPLES:
+            self.sinceSync += 1
+        self.endUs = upper
+        self.windowUs = window
+        self.staleUs = None
+        self.samples += 1
+        self.lastUs = now
+        return True
+
+    #Time (ms) until the next poll should be made
+    def NextMs(self):
+        now = time.ticks_us()
+        nextEnd = time.ticks_add(self.endUs, self.periodUs) #Latest expected end of the current cycle
+        if self.staleUs is not None: #Result expected, try again half way to the latest expected end
+            return max(time.ticks_diff(nextEnd, self.staleUs) // 2000, RETRY_MS)
+        if self.sinceSync >= SYNC_SAMPLES or self.windowUs > self.periodUs >> 2: #Middle of the window the end is expected in
+            target = time.ticks_add(nextEnd, -(self.windowUs >> 1))
+        else: #Just after the latest expected end
+            target = time.ticks_add(nextEnd, self.__Drift())
+        wait = max(time.ticks_diff(target, now), self.minPeriodMs * 1000 - time.ticks_diff(now, self.lastUs))
+        return max((wait + 999) // 1000, RETRY_MS) #Not before the target
+
+    #Share of bus reads that returned a new result (1.0 when every read was of a new result)
+    def Efficiency(self):
+        reads = self.samples + self.staleReads
+        return self.samples / reads if reads else 1.0
+
+    #New results read per second since stats were reset
+    def SampleRate(self):
+        elapsed = time.ticks_diff(time.ticks_ms(), self.startMs)
+        return self.samples * 1000 / elapsed if elapsed > 0 else 0.0
+
+    #Counts and rates as a dict
+    def Stats(self):
+        return {
+            'samples': self.samples,
+            'polls': self.polls,
+            'stale_reads': self.staleReads,
+            'missed': self.missed,
+            'efficiency': self.Efficiency(),
+            'rate': self.SampleRate(),
+            'period_us': self.periodUs
+        }
+
+    def ResetStats(self):
+        self.polls = 0 #Calls to Poll
+        self.samples = 0 #New results read
+        self.staleReads = 0 #Bus reads that found no new result
+        self.missed = 0 #Results completed but never read
+        self.startMs = time.ticks_ms()
@@ -0,0 +1,249 @@
+#Host simulation of the Sun-Lite board
+## Stand-ins for the MicroPython modules used by the firmware (machine, network, framebuf,
+## umqtt.simple, uasyncio, ...) run on a virtual clock, with register level models of the
+## TSL2561 (0x39), TCS34725 (0x29) and SSD1306 (0x3D) on a virtual I2C bus, virtual
+## PWM/Pin/RTC/Timer, and an in-process MQTT broker. main.py runs unmodified:
+##
+##   import sim
+##   board = sim.install()
+##   sim.run(60) #Run firmware for 60 virtual seconds
+##
+## or from the repository root: python -m sim --seconds 60
+import sys
+import os
+import types
+import builtins
+import struct
+import binascii
+import heapq
+import json
+import calendar
+from . import clock as _clock
+from . import i2c as _i2c
+from . import devices
+from . import world as _world
+from . import vmachine
+from . import vnetwork
+from . import vframebuf
+from . import vmqtt
+from . import vasyncio
+from . import vtime
+from . import vmicropython
+from . import vgc
+
+SimStop = _clock.SimStop
+Restart = vmachine.Restart
+
+FIRMWARE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) #Repository root
+LUX_INTR_PIN = 2 #TSL2561 INT output
+DEFAULT_DATE = "2024-01-15T06:00:00Z"
+
+#GPIO state (kept by the board so interrupts can be raised by device models)
+class PinState:
+    def __init__(self):
+        self.level = 1 #Pulled up
+        self.mode = vmachine.Pin.IN
+        self.pull = None
+        self.trigger = 0
+        self.handler = None
+        self.pin = None #Pin object passed to the handler
+
+class Board:
+    #Constructor
+    ## i2cFreq: bus clock used for wire time (None uses the frequency the firmware asks for)
+    ## ambientLux: constant or function of time (s) giving the ambient light level
+    def __init__(self,i2cFreq=None,ambientLux=200.0,broker='192.168.0.10'):
+        self.clock = _clock.Clock()
+        self.bus = _i2c.Bus(self.clock, i2cFreq)
+        self.world = _world.World(self, ambientLux)
+        self.pins = {}
+        self.pwms = {}
+        self.timers = [] #Firmware timers, stopped on restart
+        self.wlans = {}
+        self.ap = vnetwork.AccessPoint()
+        self.brokers = {broker: vmqtt.Broker()}
+        self.broker = self.brokers[broker]
+        self.uniqueId = b'\x5c\xcf\x7f\x01'
+        self.cpuFreq = 80000000
+        self.resetCause = vmachine.PWRON_RESET
+        self.restarts = 0
+        self.rtcBase = 0 #RTC seconds since epoch at rtcBaseUs
+        self.rtcBaseUs = 0
+        self.rtcMemory = b''
+        self.rtcAlarmMs = 0
+        #Devices
+        self.lux = devices.TSL2561(self, 0x39, LUX_INTR_PIN)
+        self.colour = devices.TCS34725(self, 0x29)
+        self.oled = devices.SSD1306(self, 0x3D)
+        for device in (self.lux, self.colour, self.oled):
+            self.bus.Attach(device)
+
+    def PinState(self,id):
+        if id not in self.pins:
+            self.pins[id] = PinState()
+        return self.pins[id]
+
+    #Set pin level (from firmware or a device), running the interrupt handler on a matching edge
+    def DrivePin(self,id,level):
+        state = self.PinState(id)
+        old = state.level
+        state.level = level
+        if state.handler is None or old == level:
+            return
+        edge = vmachine.Pin.IRQ_FALLING if old else vmachine.Pin.IRQ_RISING
+        if state.trigger & edge:
+            state.handler(state.pin)
+
+    def Wlan(self,interface):
+        if interface not in self.wlans:
+            self.wlans[interface] = vnetwork.WlanState()
+        return self.wlans[interface]
+
+    def StationConnected(self):
+        return vnetwork.WLAN(vnetwork.STA_IF).isconnected()
+
+    #RTC
+    def RtcSeconds(self):
+        return self.rtcBase + (self.clock.us - self.rtcBaseUs) // 1000000
+
+    def RtcDatetime(self):
+        t = vtime.localtime(self.RtcSeconds())
+        return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], (self.clock.us - self.rtcBaseUs) % 1000000)
+
+    def SetRtc(self,dt):
+        self.rtcBase = vtime.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6]))
+        self.rtcBaseUs = self.clock.us
+
+    #Publish the time message the firmware sets its clock from (retained, so it is received on connect)
+    def PublishTime(self,date=DEFAULT_DATE):
+        self.broker.Publish("esys/time", json.dumps({'date': date}), retain=True)
+
+    #Publish a command to the device
+    def Command(self,**fields):
+        self.broker.Publish("esys/tbd/command", json.dumps(fields))
+
+    #Run fn() at a virtual time (seconds)
+    def At(self,seconds,fn):
+        return self.clock.Schedule(int(seconds * 1000000), lambda now: fn())
+
+    #Reset of the ESP8266 (peripherals and sensors keep their state)
+    def Restart(self,cause):
+        self.restarts += 1
+        self.resetCause = cause
+        for timer in self.timers:
+            timer.deinit()
+        self.timers = []
+        self.clock.scheduled = []
+        for state in self.pins.values():
+            state.handler = None
+            state.trigger = 0
+        for pwm in self.pwms.values():
+            pwm.active = False
+        self.pwms = {}
+        for state in self.wlans.values(): #Radio is off in deep sleep, the lease is in RAM
+            state.connectedAt = None
+            state.ifconfig = None
+        for broker in self.brokers.values():
+            for session in list(broker.sessions):
+                session.close()
+        if cause == vmachine.DEEPSLEEP_RESET: #Display is powered down with the board
+            self.oled.on = False
+
+    #Bus, network and broker counts
+    def Stats(self):
+        return {
+            'virtual_s': self.clock.us / 1000000,
+            'restarts': self.restarts,
+            'i2c': self.bus.stats.AsDict(),
+            'i2c_devices': {device.name: self.bus.deviceStats[addr].AsDict() for addr, device in self.bus.devices.items()},
+            'mqtt': {'connects': self.broker.connects, 'publishes': len(self.broker.log), 'bytes_in': self.broker.bytesIn, 'bytes_out': self.broker.bytesOut},
+            'sensors': {'tsl2561_cycles': self.lux.cycles, 'tcs34725_cycles': self.colour.cycles},
+            'oled': {'on': self.oled.on, 'commands': self.oled.commands, 'data_bytes': self.oled.dataBytes}
+        }
+
+board = None #Board in use after install()
+
+#Make stand-in modules importable under their MicroPython names, returns the board
+def install(newBoard=None,**kwargs):
+    global board
+    board = newBoard if newBoard is not None else Board(**kwargs)
+    for module in (vmachine, vnetwork, vmqtt, vasyncio, vtime, vmicropython):
+        module.board = board
+    umqtt = types.ModuleType("umqtt")
+    umqtt.simple = vmqtt
+    modules = {
+        'machine': vmachine,
+        'network': vnetwork,
+        'framebuf': vframebuf,
+        'micropython': vmicropython,
+        'gc': vgc,
+        'uasyncio': vasyncio,
+        'umqtt': umqtt,
+        'umqtt.simple': vmqtt,
+        'time': vtime,
+        'utime': vtime,
+        'ustruct': struct,
+        'ubinascii': binascii,
+        'uheapq': heapq,
+        'ujson': json,
+        'uos': os
+    }
+    sys.modules.update(modules)
+    builtins.const = vmicropython.const #Used without import by drivers (compiler builtin on device)
+    return board
+
+#Firmware modules loaded from the repository (dropped on restart so they start fresh)
+def _FirmwareModules():
+    names = []
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == FIRMWARE_PATH:
+            names.append(name)
+    return names
+
+#Import main.py as module main (runs the firmware), returns the module even if it stopped
+def boot():
+    for name in _FirmwareModules():
+        del sys.modules[name]
+    if FIRMWARE_PATH not in sys.path:
+        sys.path.insert(0, FIRMWARE_PATH)
+    path = os.path.join(FIRMWARE_PATH, "main.py")
+    module = types.ModuleType("main")
+    module.__file__ = path
+    sys.modules["main"] = module
+    with open(path) as f:
+        code = compile(f.read(), path, "exec")
+    try:
+        exec(code, module.__dict__)
+    finally:
+        sys.modules["main"] = module #Keep module for inspection when stopped
+    return module
+
+#Run firmware for a number of virtual seconds, restarting it after deep sleep or reset
+## flash: directory used as the board filesystem (current directory if None)
+def run(seconds,flash=None,date=DEFAULT_DATE):
+    if board is None:
+        install()
+    board.clock.limitUs = board.clock.us + int(seconds * 1000000)
+    if date is not None and "esys/time" not in board.broker.retained:
+        board.PublishTime(date)
+    cwd = os.getcwd()
+    if flash is not None:
+        os.chdir(flash)
+    module = None
+    try:
+        while True:
+            try:
+                module = boot()
+            except SimStop:
+                break
+            except Restart as restart:
+                board.Restart(restart.cause)
+                try:
+                    board.clock.Advance(restart.ms * 1000)
+                except SimStop:
+                    break
+    finally:
+        os.chdir(cwd)
+        module = sys.modules.get("main", module)
+    return module
@@ -0,0 +1,40 @@
+#Run the firmware on the host simulation and print bus, broker and screen state
+## python -m sim [--seconds N] [--i2c-hz HZ] [--lux LUX] [--date RFC3339] [--kill-broker S] [--restore-broker S]
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+import sim
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sim", description="Run main.py against virtual hardware")
+    parser.add_argument("--seconds", type=float, default=60, help="virtual time to run for")
+    parser.add_argument("--i2c-hz", type=int, default=None, help="I2C clock used for wire time (default: as requested by firmware)")
+    parser.add_argument("--lux", type=float, default=200.0, help="ambient light level")
+    parser.add_argument("--date", default=sim.DEFAULT_DATE, help="time published on esys/time")
+    parser.add_argument("--kill-broker", type=float, default=None, help="stop broker at this time (s)")
+    parser.add_argument("--restore-broker", type=float, default=None, help="restart broker at this time (s)")
+    parser.add_argument("--flash", default=None, help="directory used as the board filesystem (default: temporary)")
+    parser.add_argument("--quiet", action="store_true", help="hide firmware output")
+    parser.add_argument("--screen", action="store_true", help="print top of screen at the end")
+    args = parser.parse_args()
+
+    board = sim.install(i2cFreq=args.i2c_hz, ambientLux=args.lux)
+    if args.kill_broker is not None:
+        board.At(args.kill_broker, board.broker.Kill)
+    if args.restore_broker is not None:
+        board.At(args.restore_broker, board.broker.Start)
+    flash = args.flash if args.flash is not None else tempfile.mkdtemp(prefix="sunlite-flash-")
+    output = io.StringIO() if args.quiet else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output) if output is not None else contextlib.nullcontext():
+        sim.run(args.seconds, flash, args.date)
+    stats = board.Stats()
+    stats['wall_s'] = round(time.perf_counter() - start, 3)
+    print(json.dumps(stats, indent=2))
+    if args.screen:
+        print("\n".join(board.oled.Render(0, 8)))
+
+main()
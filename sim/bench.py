@@ -0,0 +1,256 @@
+#Benchmarks of the firmware code paths against the host simulation
+## The firmware is booted on the virtual board, then each component is called directly and
+## its cost per call measured: I2C transactions, bytes and modelled bus time, publishes and
+## payload bytes, memory kept by firmware code (tracemalloc, blocks allocated from the firmware
+## modules only) and wall time (median). Results are compared with budgets (sim/budgets.json) and
+## any metric over budget fails the run. Heap growth of the driver read paths is measured over
+## HEAP_READS calls and budgeted at zero.
+##
+## Wall time budgets are a ratio of the median measured when they were written, with no fixed
+## slack, so a slowdown of a short call fails as readily as one of a long call.
+##
+##   python -m sim.bench [--output results.json] [--update]
+import sys
+import os
+import io
+import json
+import argparse
+import contextlib
+import tempfile
+import tracemalloc
+import time
+import math
+import gc
+import sim
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "budgets.json")
+BOOT_SECONDS = 20 #Virtual time to run before measuring (WiFi, broker and clock set up)
+#Headroom applied to measured values when budgets are updated (other metrics are deterministic)
+HEADROOM = {'wall_us': 2.0, 'firmware_alloc_bytes': 1.5}
+TIME_RUNS = 7 #Batches of calls timed by Time(), the median batch is reported
+HEAP_READS = 10000 #Reads per heap growth measurement
+
+#Trace filters keeping only blocks allocated from lines of the firmware modules
+## (the simulation models are in this package, matched with its subdirectories)
+def FirmwareFilters():
+    return [tracemalloc.Filter(True, os.path.join(sim.FIRMWARE_PATH, "*.py")),
+        tracemalloc.Filter(False, os.path.join(os.path.dirname(os.path.abspath(__file__)), "*"))]
+
+#Median of a list of numbers
+def Median(values):
+    values = sorted(values)
+    n = len(values)
+    return values[n >> 1] if n & 1 else (values[(n >> 1) - 1] + values[n >> 1]) / 2
+
+#Boot firmware on a new board, returns (board, main object)
+def Setup(seconds=BOOT_SECONDS,flash=None):
+    board = sim.install()
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = sim.run(seconds, flash if flash is not None else tempfile.mkdtemp(prefix="sunlite-bench-"))
+    board.clock.limitUs = None
+    return board, module.m
+
+#Cost per call of fn, advanceUs of virtual time is let pass between calls (not measured)
+## Calls are repeated with tracemalloc running for the firmware memory, so it doesn't slow the
+## timed pass. firmware_alloc_bytes is memory allocated by firmware code and still held after
+## the calls (state replaced or kept by the call), per call; blocks freed within a call aren't seen.
+def Measure(board,fn,calls,advanceUs=0):
+    bus = board.bus
+    broker = board.broker
+    bus.ResetStats()
+    published = len(broker.log)
+    bytesIn = broker.bytesIn
+    wall = []
+    for i in range(calls):
+        t = time.perf_counter()
+        fn()
+        wall.append(time.perf_counter() - t)
+        if advanceUs:
+            board.clock.Advance(advanceUs)
+    results = {
+        'i2c_transactions': round(bus.stats.transactions / calls, 3),
+        'i2c_bytes': round(bus.stats.bytes / calls, 3),
+        'bus_us': round(bus.stats.wireUs / calls, 1),
+        'publishes': round((len(broker.log) - published) / calls, 3),
+        'payload_bytes': round((broker.bytesIn - bytesIn) / calls, 3),
+        'wall_us': round(Median(wall) * 1000000, 1)
+    }
+    firmware = FirmwareFilters()
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot().filter_traces(firmware)
+    for i in range(calls):
+        fn()
+        if advanceUs:
+            board.clock.Advance(advanceUs)
+    gc.collect()
+    end = tracemalloc.take_snapshot().filter_traces(firmware)
+    tracemalloc.stop()
+    kept = sum(stat.size_diff for stat in end.compare_to(start, 'lineno') if stat.size_diff > 0)
+    results['firmware_alloc_bytes'] = round(kept / calls, 1)
+    return results
+
+#Feed a lux reading through the alarm filter (window, median, trigger) and telemetry mean
+def FilterLux(m):
+    value = 400 + m.luxStats.pos * 60
+    m.luxStats.Add(value)
+    m.luxMean.Add1(value)
+    m.luxTrigger.Update(m.luxStats.Median(), 0)
+    if m.luxMean.count >= 10: #Published and cleared about once a second
+        m.luxMean.Clear()
+
+#Add a colour reading to the telemetry mean
+def MeanColour(m,counts):
+    m.colMean.Add(counts)
+    if m.colMean.count >= 10:
+        m.colMean.Clear()
+
+#Heap left allocated by firmware code (bytes) after calling fn, with garbage collected before and after
+## Only blocks allocated from lines of the firmware modules count, so state kept by the simulation
+## models (virtual clock events, bus counters) isn't mistaken for growth on the device
+def HeapGrowth(fn,calls=HEAP_READS):
+    fn() #First call may create lasting state (e.g. cached bound methods)
+    firmware = FirmwareFilters()
+    gc.collect()
+    tracemalloc.start()
+    fn() #State replaced on every call (e.g. running totals) is then traced in both snapshots
+    start = tracemalloc.take_snapshot().filter_traces(firmware)
+    for i in range(calls):
+        fn()
+    gc.collect()
+    end = tracemalloc.take_snapshot().filter_traces(firmware)
+    tracemalloc.stop()
+    return max(sum(stat.size_diff for stat in end.compare_to(start, 'filename')), 0)
+
+#Colour sensor sampled at the times its gate asks for, for a number of polls
+def Sampling(board,m,polls):
+    gate = m.colGate
+    gate.ResetStats()
+    cyclesBefore = board.colour.cycles
+    board.bus.ResetStats()
+    for i in range(polls):
+        m.sampleColour()
+        board.clock.Advance(m.colPeriod() * 1000)
+    samples = max(gate.samples, 1)
+    reads = board.bus.deviceStats[0x29].reads
+    return {
+        'colour_reads_per_sample': round(reads / samples, 3),
+        'colour_stale_reads': gate.staleReads,
+        'colour_missed': gate.missed,
+        'colour_unread_cycles': board.colour.cycles - cyclesBefore - gate.samples #Results completed but not read
+    }
+
+#Wall time per call (us) of a function that doesn't touch the simulation, median of TIME_RUNS batches of calls
+def Time(fn,calls):
+    batches = []
+    for run in range(TIME_RUNS):
+        start = time.perf_counter()
+        for i in range(calls):
+            fn()
+        batches.append((time.perf_counter() - start) * 1000000 / calls)
+    return round(Median(batches), 2)
+
+#Run all benchmarks, returns results dict
+def Run(iterations=30):
+    board, m = Setup()
+    results = {'iteration': {}, 'components': {}, 'timing': {}}
+    #One pass of the sequential main loop (includes its 1s sleep)
+    results['iteration'] = Measure(board, m.mainLoop, iterations)
+    components = results['components']
+    components['lux_read'] = Measure(board, m.lux.GetLux, 100)
+    components['colour_read'] = Measure(board, m.col.ReadRGBC, 100)
+    components['colour_sample'] = Measure(board, m.sampleColour, 20, 700000)
+    components['write_time'] = Measure(board, m.writeTime, 20, 1000000)
+    components['show_full'] = Measure(board, lambda: m.oled.show(True), 5)
+    #Samples that change every time (so none are dropped by the deadband), 1s apart
+    sample = [0]
+    def addSample():
+        sample[0] += 1
+        m.mqtt.AddSample(100 + 20 * (sample[0] & 1), (1000, 1200, 900, 3000 + 100 * (sample[0] & 1)))
+    components['publish'] = Measure(board, addSample, 60, 1000000)
+    #Colour sampling on its own schedule (as the sampling task runs it): bus reads and
+    #results lost per new result
+    results['sampling'] = Sampling(board, m, 200)
+    #Heap growth of the sensor read paths (register, burst and in place reads)
+    luxCounts = m.luxCounts
+    colCounts = m.colCounts
+    results['heap'] = {
+        'lux_get_lux': HeapGrowth(m.lux.GetLux),
+        'lux_read_adcs_into': HeapGrowth(lambda: m.lux.ReadADCs(luxCounts)),
+        'lux_register_read': HeapGrowth(m.lux.GetRevNumber),
+        'colour_read_rgbc_into': HeapGrowth(lambda: m.col.ReadRGBC(colCounts)),
+        'colour_status_read': HeapGrowth(m.col.GetRGBCValid),
+        'stats_lux_filter': HeapGrowth(lambda: FilterLux(m)),
+        'stats_colour_mean': HeapGrowth(lambda: MeanColour(m, colCounts))
+    }
+    #Wall time of pure code paths
+    timing = results['timing']
+    timing['GetLux'] = Time(m.lux.GetLux, 200)
+    timing['CalculateLux'] = Time(lambda: m.lux.CalculateLux(1200, 300), 2000)
+    timing['convTime'] = Time(lambda: m.convTime("2024-01-15T06:00:00Z"), 2000)
+    timing['json_build'] = Time(lambda: json.dumps({'name':'Light','Level':m.luxValue,'Colour':list(m.colValue)}), 2000)
+    telemetry = m.mqtt.telemetry
+    def pack():
+        for i in range(telemetry.flushSamples):
+            telemetry.Add(i, 100, (1, 2, 3, 4))
+        telemetry.Pack()
+    timing['telemetry_pack'] = Time(pack, 200)
+    return results
+
+#Metrics over budget, as (path, measured, budget)
+def Compare(results,budgets,path=""):
+    failures = []
+    for key, budget in budgets.items():
+        name = path + "." + key if path else key
+        if key not in results:
+            continue
+        if isinstance(budget, dict):
+            failures += Compare(results[key], budget, name)
+        elif results[key] > budget:
+            failures.append((name, results[key], budget))
+    return failures
+
+#Budgets from results, with headroom on host dependent metrics
+def MakeBudgets(results,metric=None):
+    budgets = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            budgets[key] = MakeBudgets(value, metric)
+        else:
+            kind = metric if metric is not None else key
+            budgets[key] = math.ceil(value * HEADROOM.get(kind, 1.0) * 1000) / 1000
+    return budgets
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sim.bench", description="Firmware benchmarks against the host simulation")
+    parser.add_argument("--output", default=None, help="write results JSON to file (default: stdout)")
+    parser.add_argument("--budgets", default=BUDGETS_PATH, help="budget file")
+    parser.add_argument("--update", action="store_true", help="write budgets from this run instead of checking")
+    parser.add_argument("--iterations", type=int, default=30, help="main loop passes measured")
+    parser.add_argument("--no-wall", action="store_true", help="don't check wall time budgets (e.g. on a loaded machine)")
+    args = parser.parse_args()
+
+    results = Run(args.iterations)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.update:
+        budgets = MakeBudgets(results)
+        budgets['timing'] = MakeBudgets(results['timing'], 'wall_us') #Timing results are all wall time
+        with open(args.budgets, "w") as f:
+            f.write(json.dumps(budgets, indent=2, sort_keys=True) + "\n")
+        return 0
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    failures = Compare(results, budgets)
+    if args.no_wall:
+        failures = [f for f in failures if not f[0].endswith('wall_us') and not f[0].startswith('timing.')]
+    for name, value, budget in failures:
+        print("Over budget: %s = %s (budget %s)" % (name, value, budget), file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
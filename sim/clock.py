@@ -0,0 +1,69 @@
+#Virtual clock for the host simulation
+## Time only moves when the firmware sleeps or does I/O (bus wire time), and events
+## (timers, sensor integration cycles) fire in order as it moves
+import heapq
+
+#Raised when the simulation time limit is reached
+class SimStop(Exception):
+    pass
+
+class Clock:
+    #Constructor
+    def __init__(self,limitUs=None):
+        self.us = 0
+        self.limitUs = limitUs #Stop simulation when this time is reached (None for no limit)
+        self.events = [] #Heap of [due time, sequence, function, cancelled]
+        self.sequence = 0
+        self.scheduled = [] #micropython.schedule queue (function, arg)
+        self.inEvent = False
+
+    #Call fn(now) at due (us), returns handle for Cancel
+    def Schedule(self,dueUs,fn):
+        event = [max(dueUs, self.us), self.sequence, fn, False]
+        self.sequence += 1
+        heapq.heappush(self.events, event)
+        return event
+
+    def Cancel(self,event):
+        if event is not None:
+            event[3] = True
+
+    #Queue function to run outside of interrupt context (micropython.schedule)
+    def Soft(self,fn,arg):
+        if len(self.scheduled) >= 8: #Same depth as MicroPython's schedule queue
+            raise RuntimeError("schedule queue full")
+        self.scheduled.append((fn, arg))
+
+    #Move time forward, firing events on the way
+    def Advance(self,us):
+        self.AdvanceTo(self.us + max(int(us), 0))
+
+    def AdvanceTo(self,targetUs):
+        if self.limitUs is not None and targetUs > self.limitUs:
+            targetUs = self.limitUs
+            stop = True
+        else:
+            stop = False
+        while self.events and self.events[0][0] <= targetUs:
+            event = heapq.heappop(self.events)
+            if event[3]:
+                continue
+            self.us = max(self.us, event[0])
+            self.inEvent = True
+            try:
+                event[2](self.us)
+            finally:
+                self.inEvent = False
+            self.RunScheduled()
+        self.us = max(self.us, targetUs)
+        self.RunScheduled()
+        if stop:
+            raise SimStop()
+
+    #Run functions queued by micropython.schedule
+    def RunScheduled(self):
+        if self.inEvent:
+            return
+        while self.scheduled:
+            fn, arg = self.scheduled.pop(0)
+            fn(arg)
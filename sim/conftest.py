@@ -0,0 +1,18 @@
+#Fixtures of the simulation tests (python -m pytest sim)
+## Each test gets a new simulated board, and runs the firmware from the repository on it
+import pytest
+import sim
+
+#New board with the MicroPython stand-ins installed
+@pytest.fixture
+def board():
+    return sim.install()
+
+#Run the firmware for a number of virtual seconds (flash directory is a temporary directory),
+#returns the main object (main.m)
+@pytest.fixture
+def run(board,tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path) #Files written outside of sim.run (e.g. after a firmware error) stay out of the repository
+    def Run(seconds):
+        return sim.run(seconds, str(tmp_path)).m
+    return Run
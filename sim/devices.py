@@ -0,0 +1,324 @@
+#Register level models of the I2C devices on the board
+## Each device takes whole bus transactions: Write(data) for a write (first byte is the
+## command/register), Read(n) for a read continuing from the last register addressed
+
+#TSL2561 light-to-digital converter (CS package)
+class TSL2561:
+    name = "TSL2561"
+    COMMAND = 0x80
+    CLEAR = 0x40
+    WORD = 0x20
+    INTEG_US = (13700, 101000, 402000) #Integration time of each INTEG field value
+    INTEG_SCALE = (0.034, 0.252, 1.0) #Count scale relative to 402ms
+    MAX_COUNT = (5047, 37177, 65535)
+    PART_ID = 0x10 #TSL2561CS, revision 0
+
+    def __init__(self,board,addr=0x39,intrPin=None):
+        self.board = board
+        self.addr = addr
+        self.intrPin = intrPin #GPIO driven by the (active low, open drain) interrupt output
+        self.regs = bytearray(16)
+        self.regs[0x1] = 0x02 #402ms, 1x gain
+        self.regs[0xA] = TSL2561.PART_ID
+        self.ptr = 0
+        self.data = [0, 0] #Latched channel counts
+        self.intr = False
+        self.outOfRange = 0 #Consecutive integration periods outside thresholds
+        self.cycleEvent = None
+        self.cycles = 0 #Completed integration cycles (for tests)
+
+    def Powered(self):
+        return self.regs[0x0] & 0x03 == 0x03
+
+    def Write(self,data):
+        if not data:
+            return
+        cmd = data[0]
+        if not cmd & TSL2561.COMMAND: #Command byte must have command bit set
+            return
+        self.ptr = cmd & 0x0F
+        if cmd & TSL2561.CLEAR:
+            self.__SetIntr(False)
+        timing = self.regs[0x1]
+        control = self.regs[0x0]
+        for value in data[1:]:
+            if self.ptr not in (0xA, 0xC, 0xD, 0xE, 0xF): #Read only registers
+                self.regs[self.ptr] = value
+            self.ptr = (self.ptr + 1) & 0x0F
+        if self.regs[0x1] != timing or (self.regs[0x0] ^ control) & 0x03:
+            self.__Restart()
+
+    def Read(self,n):
+        out = bytearray(n)
+        for i in range(n):
+            reg = self.ptr
+            if reg >= 0xC:
+                value = self.data[(reg - 0xC) >> 1]
+                out[i] = (value >> 8) & 0xFF if reg & 0x1 else value & 0xFF
+            else:
+                out[i] = self.regs[reg]
+            self.ptr = (self.ptr + 1) & 0x0F
+        return bytes(out)
+
+    #Integration restarts when powered on or timing changed
+    def __Restart(self):
+        clock = self.board.clock
+        clock.Cancel(self.cycleEvent)
+        self.cycleEvent = None
+        if not self.Powered():
+            self.data = [0, 0]
+            self.__SetIntr(False)
+            return
+        integ = self.regs[0x1] & 0x03
+        if integ == 0x3: #Manual integration is not modelled
+            return
+        self.cycleEvent = clock.Schedule(clock.us + TSL2561.INTEG_US[integ], self.__Cycle)
+
+    #End of integration cycle, latch counts and check interrupt
+    def __Cycle(self,now):
+        integ = self.regs[0x1] & 0x03
+        ch0, ch1 = self.board.world.TslCounts()
+        scale = TSL2561.INTEG_SCALE[integ] / (1 if self.regs[0x1] & 0x10 else 16)
+        maxCount = TSL2561.MAX_COUNT[integ]
+        self.data = [min(int(ch0 * scale), maxCount), min(int(ch1 * scale), maxCount)]
+        self.cycles += 1
+        self.__CheckIntr()
+        self.cycleEvent = self.board.clock.Schedule(now + TSL2561.INTEG_US[integ], self.__Cycle)
+
+    def __CheckIntr(self):
+        control = self.regs[0x6] & 0x30
+        if control == 0x00:
+            return
+        persist = self.regs[0x6] & 0x0F
+        low = self.regs[0x2] | self.regs[0x3] << 8
+        high = self.regs[0x4] | self.regs[0x5] << 8
+        if self.data[0] < low or self.data[0] > high:
+            self.outOfRange += 1
+        else:
+            self.outOfRange = 0
+        if control == 0x30 or persist == 0 or self.outOfRange >= persist: #Test mode always triggers
+            self.__SetIntr(True)
+
+    def __SetIntr(self,asserted):
+        self.intr = asserted
+        if not asserted:
+            self.outOfRange = 0
+        if self.intrPin is not None:
+            self.board.DrivePin(self.intrPin, 0 if asserted else 1)
+
+#TCS34725 colour light-to-digital converter
+class TCS34725:
+    name = "TCS34725"
+    COMMAND = 0x80
+    TYPE = 0x60
+    AUTO = 0x20
+    SPECIAL = 0x60
+    CLEAR_INTR = 0x06
+    CYCLE_US = 2400 #Integration/wait cycle
+    INIT_US = 2400 #Initialisation after PON and AEN set
+    GAINS = (1, 4, 16, 60)
+    PERSIST = (0, 1, 2, 3, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60)
+    DEVICE_ID = 0x44 #TCS34721/TCS34725
+
+    def __init__(self,board,addr=0x29,intrPin=None):
+        self.board = board
+        self.addr = addr
+        self.intrPin = intrPin
+        self.regs = bytearray(0x20)
+        self.regs[0x01] = 0xFF
+        self.regs[0x03] = 0xFF
+        self.regs[0x12] = TCS34725.DEVICE_ID
+        self.ptr = 0
+        self.autoInc = True
+        self.cycleEvent = None
+        self.outOfRange = 0
+        self.cycles = 0 #Completed integration cycles (for tests)
+
+    def Write(self,data):
+        if not data:
+            return
+        cmd = data[0]
+        if not cmd & TCS34725.COMMAND:
+            return
+        if cmd & TCS34725.TYPE == TCS34725.SPECIAL:
+            if cmd & 0x1F == TCS34725.CLEAR_INTR:
+                self.__SetIntr(False)
+            return #Data following special function is ignored
+        self.ptr = cmd & 0x1F
+        self.autoInc = cmd & TCS34725.TYPE == TCS34725.AUTO
+        enable = self.regs[0x00]
+        for value in data[1:]:
+            if self.ptr < 0x12: #ID, status and data are read only
+                self.regs[self.ptr] = value
+            self.__Next()
+        if (self.regs[0x00] ^ enable) & 0x03:
+            self.__Restart()
+
+    def Read(self,n):
+        out = bytearray(n)
+        for i in range(n):
+            out[i] = self.regs[self.ptr]
+            self.__Next()
+        return bytes(out)
+
+    def __Next(self):
+        if self.autoInc:
+            self.ptr = (self.ptr + 1) & 0x1F
+
+    #Integration cycle time including wait time
+    def __CycleUs(self):
+        atime = (256 - self.regs[0x01]) * TCS34725.CYCLE_US
+        wait = 0
+        if self.regs[0x00] & 0x08: #WEN
+            wait = (256 - self.regs[0x03]) * TCS34725.CYCLE_US
+            if self.regs[0x0D] & 0x02: #WLONG
+                wait *= 12
+        return atime, wait
+
+    #RGBC state machine restarts when PON/AEN change
+    def __Restart(self):
+        clock = self.board.clock
+        clock.Cancel(self.cycleEvent)
+        self.cycleEvent = None
+        self.regs[0x13] &= ~0x01 #AVALID cleared
+        if self.regs[0x00] & 0x03 != 0x03: #Needs PON and AEN
+            return
+        atime, wait = self.__CycleUs()
+        self.cycleEvent = clock.Schedule(clock.us + TCS34725.INIT_US + atime, self.__Cycle)
+
+    #End of RGBC integration, latch counts and check interrupt
+    def __Cycle(self,now):
+        atime, wait = self.__CycleUs()
+        cycles = 256 - self.regs[0x01]
+        gain = TCS34725.GAINS[self.regs[0x0F] & 0x03]
+        maxCount = min(1024 * cycles, 65535)
+        counts = self.board.world.TcsCounts()
+        scale = atime / 1000 * gain
+        clear, red, green, blue = (min(int(v * scale), maxCount) for v in (counts[3], counts[0], counts[1], counts[2]))
+        for i, value in enumerate((clear, red, green, blue)):
+            self.regs[0x14 + 2 * i] = value & 0xFF
+            self.regs[0x15 + 2 * i] = value >> 8
+        self.regs[0x13] |= 0x01 #AVALID
+        self.cycles += 1
+        self.__CheckIntr(clear)
+        self.cycleEvent = self.board.clock.Schedule(now + wait + atime, self.__Cycle)
+
+    def __CheckIntr(self,clear):
+        low = self.regs[0x04] | self.regs[0x05] << 8
+        high = self.regs[0x06] | self.regs[0x07] << 8
+        if clear < low or clear > high:
+            self.outOfRange += 1
+        else:
+            self.outOfRange = 0
+        persist = TCS34725.PERSIST[self.regs[0x0C] & 0x0F]
+        if persist == 0 or self.outOfRange >= persist:
+            self.regs[0x13] |= 0x10 #AINT
+            if self.regs[0x00] & 0x10 and self.intrPin is not None: #AIEN
+                self.board.DrivePin(self.intrPin, 0)
+
+    def __SetIntr(self,asserted):
+        if not asserted:
+            self.regs[0x13] &= ~0x10
+            self.outOfRange = 0
+            if self.intrPin is not None:
+                self.board.DrivePin(self.intrPin, 1)
+
+#SSD1306 OLED controller (I2C interface)
+class SSD1306:
+    name = "SSD1306"
+    #Number of argument bytes following each command
+    ARGS = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8D: 1, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+
+    def __init__(self,board,addr=0x3D,width=128,height=64):
+        self.board = board
+        self.addr = addr
+        self.width = width
+        self.pages = height // 8
+        self.gddram = bytearray(width * self.pages)
+        self.on = False
+        self.contrast = 0x7F
+        self.inverted = False
+        self.addrMode = 0x02 #Page addressing after reset
+        self.col0, self.col1 = 0, width - 1
+        self.page0, self.page1 = 0, self.pages - 1
+        self.col = 0
+        self.page = 0
+        self.commands = 0 #Counts for tests
+        self.dataBytes = 0
+        self.pending = [] #Command waiting for arguments (may span transactions)
+
+    def Write(self,data):
+        i = 0
+        n = len(data)
+        while i < n:
+            control = data[i]
+            i += 1
+            single = control & 0x80 #Co=1: one byte follows, then another control byte
+            isData = control & 0x40
+            end = min(i + 1, n) if single else n
+            for value in data[i:end]:
+                if isData:
+                    self.__Data(value)
+                else:
+                    self.__Command(value)
+            i = end
+
+    def Read(self,n):
+        return bytes(n) #Status reads are not used
+
+    def __Command(self,value):
+        self.pending.append(value)
+        cmd = self.pending[0]
+        if len(self.pending) <= SSD1306.ARGS.get(cmd, 0):
+            return
+        args = self.pending[1:]
+        self.pending = []
+        self.commands += 1
+        if cmd == 0x20:
+            self.addrMode = args[0] & 0x03
+        elif cmd == 0x21:
+            self.col0, self.col1 = args[0] & 0x7F, args[1] & 0x7F
+            self.col = self.col0
+        elif cmd == 0x22:
+            self.page0, self.page1 = args[0] & 0x07, args[1] & 0x07
+            self.page = self.page0
+        elif cmd == 0x81:
+            self.contrast = args[0]
+        elif cmd in (0xAE, 0xAF):
+            self.on = cmd == 0xAF
+        elif cmd in (0xA6, 0xA7):
+            self.inverted = cmd == 0xA7
+        elif 0xB0 <= cmd <= 0xB7: #Page start (page addressing mode)
+            self.page = cmd & 0x07
+        elif cmd <= 0x0F: #Lower column start (page addressing mode)
+            self.col = (self.col & 0xF0) | cmd
+        elif cmd <= 0x1F:
+            self.col = (self.col & 0x0F) | (cmd & 0x0F) << 4
+
+    def __Data(self,value):
+        self.dataBytes += 1
+        self.gddram[self.page * self.width + self.col] = value
+        if self.addrMode == 0x00: #Horizontal, wraps within window
+            if self.col >= self.col1:
+                self.col = self.col0
+                self.page = self.page0 if self.page >= self.page1 else self.page + 1
+            else:
+                self.col += 1
+        elif self.addrMode == 0x01: #Vertical
+            if self.page >= self.page1:
+                self.page = self.page0
+                self.col = self.col0 if self.col >= self.col1 else self.col + 1
+            else:
+                self.page += 1
+        else: #Page, column wraps within page
+            self.col = 0 if self.col >= self.width - 1 else self.col + 1
+
+    #Pixel state of GDDRAM
+    def Pixel(self,x,y):
+        return (self.gddram[(y >> 3) * self.width + x] >> (y & 0x07)) & 0x01
+
+    #Screen contents as text lines (rows y0 to y1), for printing
+    def Render(self,y0=0,y1=None):
+        if y1 is None:
+            y1 = self.pages * 8
+        return ["".join("#" if self.Pixel(x, y) else "." for x in range(self.width)) for y in range(y0, y1)]
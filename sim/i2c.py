@@ -0,0 +1,111 @@
+#Virtual I2C bus
+## Transactions are passed to the device model at the address, and counted with their
+## modelled time on the wire (which also moves the virtual clock forward)
+import errno
+
+START_BITS = 1
+STOP_BITS = 1
+BYTE_BITS = 9 #8 data bits and ACK
+
+#Transaction counts for the whole bus or a single device
+class BusStats:
+    def __init__(self):
+        self.Reset()
+
+    def Reset(self):
+        self.transactions = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes = 0 #Payload bytes (excluding address bytes)
+        self.wireUs = 0.0
+        self.nacks = 0
+
+    def Add(self,read,payload,wireUs):
+        self.transactions += 1
+        if read:
+            self.reads += 1
+        else:
+            self.writes += 1
+        self.bytes += payload
+        self.wireUs += wireUs
+
+    def AsDict(self):
+        return {'transactions': self.transactions, 'reads': self.reads, 'writes': self.writes,
+            'bytes': self.bytes, 'wire_us': round(self.wireUs, 1), 'nacks': self.nacks}
+
+class Bus:
+    #Constructor, freq overrides the clock requested by the firmware when given
+    def __init__(self,clock,freq=None):
+        self.clock = clock
+        self.freq = freq
+        self.devices = {}
+        self.stats = BusStats()
+        self.deviceStats = {}
+        self.log = None #List of (time us, addr, read, payload) when enabled
+        self.failures = {} #Address: number of following transactions that won't be acknowledged
+
+    def Attach(self,device):
+        self.devices[device.addr] = device
+        self.deviceStats[device.addr] = BusStats()
+
+    def Detach(self,addr):
+        self.devices.pop(addr, None)
+
+    #Make the next count transactions to an address fail to be acknowledged (e.g. bus noise)
+    def FailNext(self,addr,count=1):
+        self.failures[addr] = self.failures.get(addr, 0) + count
+
+    def ResetStats(self):
+        self.stats.Reset()
+        for stats in self.deviceStats.values():
+            stats.Reset()
+
+    #Bus clock used for a transfer at the requested frequency
+    def Clock(self,freq):
+        return self.freq if self.freq is not None else freq
+
+    #Account for a transaction and move time forward, raises OSError if nothing acknowledges the address
+    def __Transfer(self,freq,addr,bits,read,payload):
+        wireUs = bits * 1000000 / self.Clock(freq)
+        device = self.devices.get(addr)
+        self.stats.Add(read, payload, wireUs)
+        if self.failures.get(addr):
+            self.failures[addr] -= 1
+            device = None
+        if device is None:
+            self.stats.nacks += 1
+            self.clock.Advance(wireUs)
+            raise OSError(errno.ENODEV, "I2C address 0x%02X not acknowledged" % addr)
+        self.deviceStats[addr].Add(read, payload, wireUs)
+        if self.log is not None:
+            self.log.append((self.clock.us, addr, read, payload))
+        self.clock.Advance(wireUs)
+        return device
+
+    #Write transaction: start, address, data, stop
+    def Write(self,freq,addr,data,stop=True):
+        data = bytes(data)
+        bits = START_BITS + BYTE_BITS * (1 + len(data)) + (STOP_BITS if stop else 0)
+        self.__Transfer(freq, addr, bits, False, len(data)).Write(data)
+
+    #Read transaction: start, address, data, stop
+    def Read(self,freq,addr,n,stop=True):
+        bits = START_BITS + BYTE_BITS * (1 + n) + (STOP_BITS if stop else 0)
+        return self.__Transfer(freq, addr, bits, True, n).Read(n)
+
+    #Register read: start, address, register, repeated start, address, data, stop
+    def ReadMem(self,freq,addr,memaddr,n):
+        bits = 2 * START_BITS + BYTE_BITS * (3 + n) + STOP_BITS
+        device = self.__Transfer(freq, addr, bits, True, n + 1)
+        device.Write(bytes((memaddr,)))
+        return device.Read(n)
+
+    def Scan(self,freq):
+        found = []
+        for addr in range(0x08, 0x78):
+            try:
+                self.__Transfer(freq, addr, START_BITS + BYTE_BITS + STOP_BITS, False, 0)
+            except OSError:
+                continue
+            found.append(addr)
+        return found
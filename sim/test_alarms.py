@@ -0,0 +1,53 @@
+#Alarms that fell between the last check and now (reset, deep sleep, forward clock correction) still fire
+import json
+import os
+import sim
+
+#Seconds since 2000-01-01 of a time on the default simulation date
+def At(hour,minute):
+    return sim.vtime.mktime((2024, 1, 15, hour, minute, 0))
+
+def WriteAlarms(path,last,alarms):
+    with open(os.path.join(path, "alarms.json"), "w") as f:
+        json.dump({'last': last, 'alarms': alarms}, f)
+
+def ReadAlarms(path):
+    with open(os.path.join(path, "alarms.json")) as f:
+        return json.load(f)
+
+#Alarm at 06:30, then the clock is corrected from 06:00 to 07:00
+def test_forward_clock_correction_fires(board,run):
+    board.At(5, lambda: board.Command(command="time", hour=6, min=30))
+    board.At(10, lambda: board.PublishTime("2024-01-15T07:00:00Z"))
+    m = run(15)
+    assert m.alarmCurrent
+    assert m.alarms.SecondsUntilNext() > 23 * 3600 #Next one is tomorrow
+
+#Alarm staying on leaves the LEDs at full light without rewriting them every alarm check
+def test_alarm_on_writes_leds_once(board,run):
+    board.At(5, lambda: board.Command(command="time", hour=6, min=30))
+    board.At(10, lambda: board.PublishTime("2024-01-15T07:00:00Z"))
+    writes = []
+    board.At(12, lambda: writes.append(board.pwms[14].writes))
+    m = run(20)
+    assert m.alarmCurrent and m.fade.Finished()
+    assert board.pwms[14].writes == writes[0]
+
+def test_clock_set_back_doesnt_fire(board,run):
+    board.At(5, lambda: board.Command(command="time", hour=5, min=30))
+    board.At(10, lambda: board.PublishTime("2024-01-15T05:00:00Z"))
+    m = run(15)
+    assert not m.alarmCurrent
+
+#Alarm passed while the board was off (last checked at 05:50, alarm at 05:55, clock synced to 06:00)
+def test_alarm_missed_during_reset_fires(board,run,tmp_path):
+    WriteAlarms(str(tmp_path), At(5, 50), [[1, 5, 55, 0x7F, False]])
+    m = run(10)
+    assert m.alarmCurrent
+    assert ReadAlarms(str(tmp_path))['last'] >= At(6, 0)
+
+#Alarm already fired before the reset doesn't fire again, and one missed by over an hour is skipped
+def test_alarm_not_fired_twice(board,run,tmp_path):
+    WriteAlarms(str(tmp_path), At(5, 56), [[1, 5, 55, 0x7F, False], [2, 4, 30, 0x7F, False]])
+    m = run(10)
+    assert not m.alarmCurrent
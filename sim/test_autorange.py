@@ -0,0 +1,15 @@
+#Gain and integration time selection
+import importlib
+
+#Normalised counts are exact, and scaling a count up to the range's max count stays a small int (below 2^30)
+def test_normalise_small_ints(board):
+    autorange = importlib.import_module("autorange")
+    for lib in ("TCS34725Lib", "TSL2561Lib"):
+        ranges = getattr(importlib.import_module(lib), lib).AUTO_RANGES
+        ranger = autorange.AutoRange(ranges, 0)
+        for index in range(len(ranges)):
+            ranger.index = index
+            maxCount = ranges[index][2]
+            assert maxCount * ranger.normNum[index] < 1 << 30
+            for count in (0, 1, 7, maxCount >> 1, maxCount):
+                assert ranger.Normalise(count) == count * ranger.maxSens // ranger.sens[index]
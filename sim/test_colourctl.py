@@ -0,0 +1,32 @@
+#Closed loop colour control on the simulated LEDs and colour sensor
+import sys
+
+#Main object of the running firmware (for calls scheduled during a run)
+def Main():
+    return sys.modules["main"].m
+
+#Lights held part way along the sunrise: measured lux and colour temperature settle on the targets
+def test_pi_converges(board,run):
+    board.world.ambientLux = 20.0
+    board.world.ledLux = 600.0 #Target brightness is within the LEDs' range
+    board.At(5, lambda: Main().fade.Seek(220))
+    errors = []
+    def Probe():
+        ctl = Main().colourCtl
+        targetLux, targetCct = ctl.Target()
+        errors.append((abs(ctl.lux - targetLux) / targetLux, abs(ctl.cct - targetCct) / targetCct))
+    for t in range(6, 60, 2):
+        board.At(t, Probe)
+    m = run(60)
+    assert errors[0][0] > 0.2 or errors[0][1] > 0.2 #Starts away from the target
+    assert all(lux < 0.05 and cct < 0.05 for lux, cct in errors[-5:])
+    #Settled inside the trim limits (controllers aren't saturated)
+    assert all(512 < trim < 2048 for trim in m.fade.trim)
+
+#Lights off: colour samples don't rewrite the LED outputs
+def test_off_no_pwm_writes(board,run):
+    writes = []
+    board.At(10, lambda: writes.append(sum(pwm.writes for pwm in board.pwms.values())))
+    run(30)
+    assert Main().colourCtl.lux > 0 #Controller has been fed samples
+    assert sum(pwm.writes for pwm in board.pwms.values()) == writes[0]
@@ -0,0 +1,21 @@
+#Shared I2C bus transaction counts
+import importlib
+
+def test_count_delta_across_wrap(board):
+    i2cbus = importlib.import_module("i2cbus")
+    assert i2cbus.CountDelta(5, 0xFFFFFFFE) == 7
+    assert i2cbus.CountDelta(300, 100) == 200
+
+#Reading with reset returns the counts of the period and starts a new one
+def test_stats_reset_on_read(board):
+    i2cbus = importlib.import_module("i2cbus")
+    i2c, hardware = i2cbus.Open(5, 4)
+    bus = i2cbus.I2CBus(i2c, hardware=hardware)
+    buf = bytearray(1)
+    for i in range(3):
+        bus.readfrom_mem_into(0x39, 0x8A, buf)
+    stats = bus.Stats(True)
+    assert stats[0x39][i2cbus.STAT_TRANSACTIONS] == 3
+    assert stats[0x39][i2cbus.STAT_BYTES] == 6 #Register address and data byte
+    bus.readfrom_mem_into(0x39, 0x8A, buf)
+    assert bus.Stats()[0x39][i2cbus.STAT_TRANSACTIONS] == 1
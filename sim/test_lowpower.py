@@ -0,0 +1,72 @@
+#Deep sleep duty cycling: waking restores the saved state without probing or configuring the devices again
+import glob
+import json
+import os
+import shutil
+import pytest
+import sim
+
+#Firmware copy with low power mode on
+@pytest.fixture
+def lowPower(board,tmp_path,monkeypatch):
+    firmware = tmp_path / "firmware"
+    firmware.mkdir()
+    for path in glob.glob(os.path.join(sim.FIRMWARE_PATH, "*.py")):
+        shutil.copy(path, str(firmware))
+    main = firmware / "main.py"
+    source = main.read_text()
+    assert "LOW_POWER_MODE = False" in source
+    main.write_text(source.replace("LOW_POWER_MODE = False", "LOW_POWER_MODE = True"))
+    monkeypatch.setattr(sim, "FIRMWARE_PATH", str(firmware))
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    monkeypatch.chdir(str(flash))
+    #Bus log and the time of each restart
+    board.bus.log = []
+    restarts = []
+    restart = board.Restart
+    def Restart(cause):
+        restarts.append((board.clock.us, cause))
+        restart(cause)
+    board.Restart = Restart
+    return restarts
+
+#Sensor transactions in the first 30ms of bus activity after a time (device start up)
+def Startup(board,afterUs):
+    start = [entry[0] for entry in board.bus.log if entry[0] >= afterUs][0]
+    return len([entry for entry in board.bus.log if start <= entry[0] < start + 30000 and entry[1] in (0x29, 0x39)])
+
+def test_wake_skips_probe_and_configuration(board,lowPower):
+    board.world.ambientLux = 150.0
+    m = sim.run(307, os.getcwd()).m #Sleeps 300s after the first 3s awake
+    assert [cause for us, cause in lowPower] == [sim.vmachine.DEEPSLEEP_RESET]
+    wakeUs = lowPower[0][0]
+    #Address only transactions are the bus scan
+    probes = [entry for entry in board.bus.log if not entry[2] and not entry[3]]
+    assert probes and all(us < wakeUs for us, addr, read, payload in probes)
+    #Register shadows come from RTC memory, the sensors are only powered on
+    assert m.wokeFromSleep
+    assert board.lux.Powered()
+    assert Startup(board, 0) > 2 * Startup(board, wakeUs)
+    assert m.luxAddr == 0x39 and m.oledAddr == 0x3D
+    #Screen is switched on without the configuration sequence, and still shows the time
+    assert board.oled.on
+    assert any(board.oled.gddram)
+    #Samples are taken and sent after waking
+    assert m.luxValue > 0
+    assert any(m.colValue)
+
+#Stale cached lease on waking: the board isn't reset (the state saved in RTC memory would be lost),
+#the cache is dropped and the next wake joins with DHCP
+def test_wake_with_stale_lease_keeps_state(board,lowPower):
+    board.world.ambientLux = 150.0
+    def Replace():
+        with open("net.json", "w") as f:
+            json.dump({'ssid': "EEERover", 'bssid': "020000000099", 'channel': 6, 'ifconfig': ['10.0.0.7', '255.255.255.0', '10.0.0.1', '10.0.0.1']}, f)
+        board.ap.up = False
+    board.At(100, Replace)
+    m = sim.run(310, os.getcwd()).m #Cached join given up 3s after waking
+    assert [cause for us, cause in lowPower] == [sim.vmachine.DEEPSLEEP_RESET]
+    assert m.wokeFromSleep
+    assert m.mqtt.net.staleLease
+    assert not os.path.exists("net.json")
@@ -0,0 +1,137 @@
+#Light level alarm trigger and lux readings (interrupt mode, the default)
+import struct
+import json
+import sys
+
+#Ambient light: level during [start, end) seconds, 100 lux otherwise
+def Pulse(level,start,end):
+    return lambda t: level if start <= t < end else 100.0
+
+#Lux of every sample in the telemetry frames the broker received
+def TelemetryLux(board):
+    lux = []
+    for payload in board.broker.Messages("esys/tbd/telemetry/v1"):
+        count = payload[1]
+        for i in range(count):
+            lux.append(struct.unpack_from("<HIIIII", payload, 8 + 22 * i)[1])
+    return lux
+
+#Steady light below the threshold: no interrupts, the sensor is only read once a telemetry frame
+def test_steady_light_reads_rarely(board,run):
+    board.world.ambientLux = 150.0
+    board.At(5, lambda: board.bus.deviceStats[0x39].Reset())
+    run(65)
+    assert board.bus.deviceStats[0x39].reads <= 2
+
+#Light well above the alarm threshold, but far below the interrupt threshold used before (13000 counts)
+def test_sustained_light_starts_ramp(board,run):
+    board.world.ambientLux = Pulse(800.0, 10, 1000)
+    m = run(20)
+    assert m.luxTrigger.state
+    assert m.fade.running
+
+def test_short_pulse_ignored(board,run):
+    board.world.ambientLux = Pulse(3000.0, 10, 11)
+    m = run(20)
+    assert m.luxTrigger.changes == 0
+    assert not m.fade.running
+
+def test_trigger_releases_when_dark(board,run):
+    board.world.ambientLux = Pulse(800.0, 5, 12)
+    m = run(25)
+    assert m.luxTrigger.changes == 2
+    assert not m.luxTrigger.state
+
+#Interrupt fires above the alarm level while the trigger is off, below the release level while it is on
+def test_interrupt_thresholds(board,run):
+    board.world.ambientLux = Pulse(800.0, 10, 1000)
+    seen = []
+    def Check(now):
+        lux = __import__("main").m.lux
+        seen.append((lux.GetIntrLowThreshold(), lux.GetIntrHighThreshold(), lux.LuxToCount(400), lux.LuxToCount(500)))
+    board.clock.Schedule(8000000, Check)
+    board.clock.Schedule(19000000, Check)
+    run(20)
+    low, high, release, alarm = seen[0]
+    assert (low, high) == (0, min(alarm, 65000))
+    low, high, release, alarm = seen[1]
+    assert (low, high) == (release, 65000)
+
+#Lux is read once a telemetry frame between interrupts, so telemetry doesn't carry a stale or zero level
+def test_telemetry_lux_live(board,run):
+    board.world.ambientLux = Pulse(300.0, 20, 1000)
+    run(100)
+    lux = TelemetryLux(board)
+    live = lux[[bool(v) for v in lux].index(True):] #Samples from before the first reading at boot are 0
+    assert any(95 <= v <= 105 for v in live)
+    assert 295 <= live[-1] <= 305
+    assert 0 not in live
+
+#Light alarm turned off by the user stays off while it is still light, and comes back after dark
+def test_alarm_off_acknowledged(board,run):
+    board.world.ambientLux = lambda t: 800.0 if 10 <= t < 40 or t >= 50 else 100.0
+    board.At(20, lambda: board.Command(command="alarm"))
+    seen = []
+    def Check():
+        m = __import__("main").m
+        seen.append((m.luxTrigger.state, m.fade.running, m.fade.index))
+    board.At(19, Check)
+    board.At(35, Check)
+    board.At(45, Check)
+    m = run(60)
+    assert seen[0][:2] == (True, True) #Ramping
+    assert seen[1] == (True, False, 0) #Turned off, still light
+    assert seen[2][0] is False #Dark, acknowledgement cleared
+    assert m.luxTrigger.state and m.fade.running #Light again starts a new ramp
+
+#Alarm command is acknowledged with the time from its arrival to the LEDs changing
+def test_alarm_command_latency_acknowledged(board,run):
+    board.world.ambientLux = Pulse(800.0, 5, 1000)
+    board.At(20.003, lambda: board.Command(command="alarm"))
+    m = run(25)
+    acks = [json.loads(payload) for payload in board.broker.Messages("esys/tbd/ack")]
+    assert len(acks) == 1
+    assert acks[0]['command'] == 'alarm'
+    assert 0 < acks[0]['latency_ms'] <= 50 and not acks[0]['over']
+    assert m.cmdLatencyOver == 0
+
+#Datasheet lux equations with unbounded integers, as reference
+def ReferenceLux(lib,ch0,ch1,rangeIndex):
+    chScale = lib.LUX_CH_SCALE[rangeIndex >> 1]
+    if not rangeIndex & 1: #1x gain
+        chScale <<= 4
+    channel0 = (ch0 * chScale) >> 10
+    channel1 = (ch1 * chScale) >> 10
+    if not channel0:
+        return 0
+    ratio = ((channel1 << 10) // channel0 + 1) >> 1
+    coeffs = lib.LUX_COEFFS
+    for i in range(0, len(coeffs), 3):
+        if ratio <= coeffs[i]:
+            return (max(channel0 * coeffs[i + 1] - channel1 * coeffs[i + 2], 0) + (1 << 13)) >> 14
+    return 0
+
+#Lux calculation keeps every intermediate a MicroPython small int (below 2^30) over the whole count
+#range of every gain and integration time, and agrees with the datasheet equations
+def test_calculate_lux_small_ints(board,run):
+    m = run(3)
+    board.clock.limitUs = None
+    lux = m.lux
+    peak = [0]
+    def Trace(frame,event,arg):
+        if frame.f_code.co_name != "CalculateLux":
+            return None
+        def Line(frame,event,arg):
+            peak[0] = max([peak[0]] + [abs(v) for v in frame.f_locals.values() if type(v) is int])
+            return Line
+        return Line
+    for rangeIndex in range(len(lux.AUTO_RANGES)):
+        lux.SetRange(rangeIndex)
+        for ch0 in list(range(0, 65536, 1021)) + [65535]:
+            for ch1 in (0, ch0 >> 3, ch0 >> 1, ch0):
+                sys.settrace(Trace)
+                value = lux.CalculateLux(ch0, ch1)
+                sys.settrace(None)
+                reference = ReferenceLux(lux, ch0, ch1, rangeIndex)
+                assert abs(value - reference) <= max(1, reference // 100)
+    assert 0 < peak[0] < 1 << 30
@@ -0,0 +1,45 @@
+#WiFi bring-up with the cached access point and lease
+import json
+import os
+import sim
+
+CACHE = "net.json"
+
+#Cache of the last connection left by an earlier boot
+def WriteCache(path,bssid,lease):
+    with open(os.path.join(path, CACHE), "w") as f:
+        json.dump({'ssid': "EEERover", 'bssid': bssid, 'channel': 6, 'ifconfig': list(lease)}, f)
+
+def test_cached_join(board,run,tmp_path):
+    WriteCache(str(tmp_path), "020000000001", board.ap.lease)
+    m = run(10)
+    assert board.restarts == 0
+    assert m.mqtt.net.usedCache
+    assert m.mqtt.sta_if.isconnected()
+
+#Access point replaced: the stale lease is static until reset, so the cache is dropped and the board
+#restarts at boot (before the tasks start) to join with a scan and DHCP
+def test_stale_cache_resets_to_dhcp(board,run,tmp_path):
+    WriteCache(str(tmp_path), "020000000099", ('10.0.0.7', '255.255.255.0', '10.0.0.1', '10.0.0.1'))
+    board.ap.up = False
+    board.At(1, lambda: setattr(board.ap, 'up', True))
+    m = run(30)
+    assert board.restarts == 1
+    assert board.resetCause == sim.vmachine.SOFT_RESET
+    assert not m.mqtt.net.usedCache
+    assert m.mqtt.sta_if.isconnected()
+    assert m.mqtt.sta_if.ifconfig() == board.ap.lease
+    with open(os.path.join(str(tmp_path), CACHE)) as f:
+        assert json.load(f)['bssid'] == "020000000001"
+
+#Joining after a scan doesn't hold up the other tasks
+def test_join_runs_alongside_tasks(board,run):
+    seen = []
+    def Check():
+        m = __import__("main").m
+        seen.append((m.mqtt.net.joining, m.colGate.Stats()['samples'], any(board.oled.gddram)))
+    board.At(3.5, Check) #Scan done (it blocks), joining without a BSSID and with DHCP
+    m = run(10)
+    joining, samples, shown = seen[0]
+    assert joining and samples > 0 and shown
+    assert m.mqtt.connected
@@ -0,0 +1,50 @@
+#Sample-ready gating: each colour sensor result is read once, polls between results are skipped
+import array
+import sys
+
+#Main object of the running firmware (for calls scheduled during a run)
+def Main():
+    return sys.modules["main"].m
+
+#A stale poll is a one byte STATUS read and leaves the sample alone, a new result adds the channel burst and a one byte clear
+def test_stale_poll_skipped(board,run):
+    stats = board.bus.deviceStats[0x29]
+    results = []
+    def Poll():
+        stats.Reset()
+        into = array.array('H', (1, 2, 3, 4))
+        results.append((Main().col.ReadRGBCIfNew(into), stats.reads, stats.writes, stats.bytes, list(into)))
+    #Once a cycle has completed that the firmware hasn't read, then again straight after
+    def PollNew(now):
+        if not board.colour.regs[0x13] & 0x10: #AINT
+            board.clock.Schedule(now + 1000, PollNew)
+            return
+        Poll()
+        Poll()
+    board.clock.Schedule(10000000, PollNew)
+    run(11)
+    new, stale = results
+    assert new[:4] == (True, 2, 1, 2 + 9 + 1) #STATUS, CDATAL through BDATAH burst, clear command byte
+    assert new[4] != [1, 2, 3, 4]
+    assert stale == (False, 1, 0, 2, [1, 2, 3, 4]) #No burst or clear, sample unchanged
+
+#Running firmware: every result is read exactly once, the interrupt is only cleared for new
+#results, and few polls find no new result
+def test_gate_reads_each_result_once(board,run):
+    #Results completed by now, less one completed but not read yet (read after the mark, or never)
+    def ReadCycles():
+        return board.colour.cycles - (1 if board.colour.regs[0x13] & 0x10 else 0)
+    start = []
+    def Mark():
+        Main().colGate.ResetStats()
+        board.bus.deviceStats[0x29].Reset()
+        start.append(ReadCycles())
+    board.At(10, Mark)
+    m = run(40)
+    stats = m.colGate.Stats()
+    bus = board.bus.deviceStats[0x29]
+    assert stats['samples'] == ReadCycles() - start[0]
+    assert stats['missed'] == 0
+    assert stats['stale_reads'] <= stats['samples'] // 10
+    assert bus.reads == 2 * stats['samples'] + stats['stale_reads'] #STATUS and channel burst for each result
+    assert bus.writes == stats['samples']
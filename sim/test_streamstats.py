@@ -0,0 +1,48 @@
+#Streaming statistics against straightforward calculations
+import importlib
+import random
+
+def test_window_matches_brute_force(board):
+    streamstats = importlib.import_module("streamstats")
+    rng = random.Random(1)
+    for size in (1, 2, 5, 8):
+        window = streamstats.Window(size)
+        values = []
+        for i in range(200):
+            value = rng.randint(-1000, 1000)
+            window.Add(value)
+            values = (values + [value])[-size:]
+            assert window.Median() == sorted(values)[len(values) >> 1]
+        window.Clear()
+        assert window.Median() == 0
+
+def test_accumulator_means(board):
+    streamstats = importlib.import_module("streamstats")
+    acc = streamstats.Accumulator(4)
+    into = [9, 9, 9, 9]
+    assert acc.Mean() is None
+    assert acc.Means(into) == [9, 9, 9, 9] #Unchanged without samples
+    for sample in ((1, 10, 100, 1000), (2, 20, 200, 2000), (4, 40, 400, 4000)):
+        acc.Add(sample)
+    assert acc.Means(into) == [2, 23, 233, 2333] #Rounded
+    acc.Clear()
+    assert acc.Mean(3) is None
+
+#Hysteresis between the levels, and a crossing must last the dwell time
+def test_trigger_debounce(board):
+    streamstats = importlib.import_module("streamstats")
+    trigger = streamstats.Trigger(500, 400, 2000)
+    assert not trigger.Update(800, 0)
+    assert not trigger.Update(800, 1999)
+    assert not trigger.Update(450, 2500) #Between the levels restarts the dwell time
+    assert not trigger.Update(800, 3000)
+    assert trigger.Update(800, 5000)
+    assert trigger.state
+    assert not trigger.Update(450, 9000) #Above the release level stays on
+    assert not trigger.Update(300, 10000)
+    assert trigger.Update(300, 12000)
+    assert not trigger.state
+    assert trigger.changes == 2
+    trigger.Update(800, 13000)
+    trigger.Reset()
+    assert not trigger.Update(800, 14000) #Dwell starts again after a reset
@@ -0,0 +1,47 @@
+#Telemetry frames and deadband when the clock is set back
+import importlib
+import struct
+
+def Offsets(frame):
+    count = frame[1]
+    return [struct.unpack_from("<H", frame, 8 + 22 * i)[0] for i in range(count)]
+
+def test_pack_clamps_negative_offset(board):
+    telemetry = importlib.import_module("telemetry")
+    t = telemetry.Telemetry()
+    t.Add(1000, 1, (1, 2, 3, 4))
+    t.Add(990, 2, (1, 2, 3, 4)) #Clock set back 10s
+    assert Offsets(bytes(t.Pack())) == [0, 0]
+
+def test_clock_set_back_flushes_frame(board):
+    telemetry = importlib.import_module("telemetry")
+    t = telemetry.Telemetry()
+    t.Add(1000, 1, (1, 2, 3, 4))
+    t.Add(1001, 2, (1, 2, 3, 4))
+    assert t.Fits(1002)
+    assert not t.Fits(990)
+    assert not t.Fits(1000 + 0x10000)
+    assert t.Due(990) #Not stalled until the clock catches up
+
+def test_deadband_heartbeat_after_clock_set_back(board):
+    telemetry = importlib.import_module("telemetry")
+    d = telemetry.Deadband(heartbeat=300)
+    assert d.Check(10000, 100, (1, 2, 3, 4))
+    assert not d.Check(10001, 100, (1, 2, 3, 4))
+    assert d.Check(9000, 100, (1, 2, 3, 4)) #Heartbeat restarts from the new time
+    assert not d.Check(9001, 100, (1, 2, 3, 4))
+
+#Time resync an hour back while samples are buffered: firmware keeps running and sending frames
+def test_firmware_survives_clock_set_back(board,run):
+    board.At(20, lambda: board.PublishTime("2024-01-15T05:00:00Z"))
+    board.world.ambientLux = lambda t: 100.0 + 20 * int(t) #Every sample kept by the deadband
+    run(90)
+    frames = board.broker.Messages("esys/tbd/telemetry/v1")
+    assert len(frames) >= 3
+    #Frames sampled before the first time message (the network is joined in the background at boot) are at 2000-01-01
+    starts = [start for start in (struct.unpack_from("<I", frame, 4)[0] for frame in frames) if start >= 86400]
+    assert len(starts) >= 3
+    assert min(starts[1:]) < starts[0] #Frames from after the resync
+    assert board.clock.us >= 90000000
+    for frame in frames:
+        assert all(offset < 100 for offset in Offsets(frame))
@@ -0,0 +1,108 @@
+#Stand-in for uasyncio (v3 API subset) running on the virtual clock
+## Tasks wait on sleeps only, the loop jumps the clock to the earliest wake up (firing timers
+## and interrupts on the way)
+import heapq
+
+board = None #Set by sim.install()
+
+#Awaitable yielded to the loop with the time to wake
+class _Sleep:
+    def __init__(self,us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+class CancelledError(Exception):
+    pass
+
+class Task:
+    def __init__(self,coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.cancelled = False
+        self.waiting = [] #Tasks awaiting this one
+
+    def cancel(self):
+        self.cancelled = True
+        return True
+
+    def __await__(self):
+        while not self.done:
+            yield self
+        return self.result
+
+_queue = [] #Heap of (wake time, sequence, task)
+_sequence = 0
+
+def _Push(task,wakeUs):
+    global _sequence
+    heapq.heappush(_queue, (wakeUs, _sequence, task))
+    _sequence += 1
+
+def sleep(t):
+    return _Sleep(int(t * 1000000))
+
+def sleep_ms(t):
+    return _Sleep(int(t * 1000))
+
+def create_task(coro):
+    task = Task(coro)
+    _Push(task, board.clock.us)
+    return task
+
+#Step task until it sleeps or finishes
+def _Step(task):
+    if task.cancelled:
+        task.coro.close()
+        task.done = True
+    else:
+        try:
+            waitOn = task.coro.send(None)
+        except StopIteration as result:
+            task.done = True
+            task.result = result.value
+        else:
+            if isinstance(waitOn, _Sleep):
+                _Push(task, board.clock.us + max(waitOn.us, 0))
+            elif isinstance(waitOn, Task):
+                waitOn.waiting.append(task)
+            else:
+                _Push(task, board.clock.us) #Bare yield
+    if task.done:
+        for waiter in task.waiting:
+            _Push(waiter, board.clock.us)
+
+#Run coroutine as the main task until it finishes (or the simulation time limit stops the clock)
+def run(coro):
+    del _queue[:]
+    main = create_task(coro)
+    while not main.done:
+        wakeUs, sequence, task = heapq.heappop(_queue)
+        board.clock.AdvanceTo(wakeUs)
+        _Step(task)
+    return main.result
+
+async def gather(*awaitables):
+    results = []
+    for awaitable in awaitables:
+        results.append(await awaitable)
+    return results
+
+def get_event_loop():
+    return _Loop()
+
+class _Loop:
+    def create_task(self,coro):
+        return create_task(coro)
+
+    def run_until_complete(self,coro):
+        return run(coro)
+
+    def run_forever(self):
+        run(_Idle())
+
+async def _Idle():
+    while True:
+        await sleep(3600)
@@ -0,0 +1,99 @@
+#Stand-in for the MicroPython framebuf module (MONO_VLSB only, as used by the SSD1306 driver)
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+#5x7 glyphs (column bytes, bit 0 at top) for the characters the firmware draws, other
+#characters are drawn as a box. Glyphs sit in an 8x8 cell like the built in font.
+GLYPHS = {
+    '0': (0x3E, 0x51, 0x49, 0x45, 0x3E),
+    '1': (0x00, 0x42, 0x7F, 0x40, 0x00),
+    '2': (0x42, 0x61, 0x51, 0x49, 0x46),
+    '3': (0x21, 0x41, 0x45, 0x4B, 0x31),
+    '4': (0x18, 0x14, 0x12, 0x7F, 0x10),
+    '5': (0x27, 0x45, 0x45, 0x45, 0x39),
+    '6': (0x3C, 0x4A, 0x49, 0x49, 0x30),
+    '7': (0x01, 0x71, 0x09, 0x05, 0x03),
+    '8': (0x36, 0x49, 0x49, 0x49, 0x36),
+    '9': (0x06, 0x49, 0x49, 0x29, 0x1E),
+    ':': (0x00, 0x36, 0x36, 0x00, 0x00),
+    '.': (0x00, 0x60, 0x60, 0x00, 0x00),
+    '-': (0x08, 0x08, 0x08, 0x08, 0x08),
+    ' ': (0x00, 0x00, 0x00, 0x00, 0x00)
+}
+BOX = (0x7F, 0x41, 0x41, 0x41, 0x7F)
+
+class FrameBuffer:
+    def __init__(self,buffer,width,height,format=MONO_VLSB,stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is simulated")
+        self.buf = buffer
+        self.width = width
+        self.height = height
+
+    def pixel(self,x,y,c=None):
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return None
+        index = (y >> 3) * self.width + x
+        bit = 1 << (y & 0x07)
+        if c is None:
+            return 1 if self.buf[index] & bit else 0
+        if c:
+            self.buf[index] |= bit
+        else:
+            self.buf[index] &= ~bit & 0xFF
+
+    def fill(self,c):
+        value = 0xFF if c else 0x00
+        for i in range(self.width * ((self.height + 7) // 8)):
+            self.buf[i] = value
+
+    def fill_rect(self,x,y,w,h,c):
+        for yy in range(max(y, 0), min(y + h, self.height)):
+            for xx in range(max(x, 0), min(x + w, self.width)):
+                self.pixel(xx, yy, c)
+
+    def hline(self,x,y,w,c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self,x,y,h,c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self,x,y,w,h,c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self,x1,y1,x2,y2,c):
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        for i in range(steps + 1):
+            self.pixel(x1 + (x2 - x1) * i // steps, y1 + (y2 - y1) * i // steps, c)
+
+    def text(self,string,x,y,c=1):
+        for n, char in enumerate(string):
+            glyph = GLYPHS.get(char, BOX)
+            for col, bits in enumerate(glyph):
+                for row in range(8):
+                    if bits >> row & 0x01:
+                        self.pixel(x + 8 * n + col + 1, y + row, c)
+
+    def scroll(self,dx,dy):
+        old = [[self.pixel(x, y) for x in range(self.width)] for y in range(self.height)]
+        for y in range(self.height):
+            for x in range(self.width):
+                sx = x - dx
+                sy = y - dy
+                if 0 <= sx < self.width and 0 <= sy < self.height:
+                    self.pixel(x, y, old[sy][sx])
+
+    def blit(self,fbuf,x,y,key=-1):
+        for yy in range(fbuf.height):
+            for xx in range(fbuf.width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
+
+#Older constructor used by the SSD1306 driver
+def FrameBuffer1(buffer,width,height):
+    return FrameBuffer(buffer, width, height, MONO_VLSB)
@@ -0,0 +1,26 @@
+#Stand-in for the MicroPython gc module
+## The host heap isn't the device's, so the heap figures are fixed (ESP8266 heap size and a typical
+## amount in use after boot). Anything else is passed to the host gc module.
+import gc as _host
+
+HEAP_BYTES = 37952 #ESP8266 MicroPython heap
+ALLOC_BYTES = 21504 #In use (not modelled)
+
+collections = 0 #Calls to collect (for tests)
+
+def collect():
+    global collections
+    collections += 1
+    return _host.collect()
+
+def mem_alloc():
+    return ALLOC_BYTES
+
+def mem_free():
+    return HEAP_BYTES - ALLOC_BYTES
+
+def threshold(amount=None):
+    return -1
+
+def __getattr__(name):
+    return getattr(_host, name)
@@ -0,0 +1,234 @@
+#Stand-in for the MicroPython machine module (ESP8266 port)
+## Peripherals are attached to the board installed by sim.install()
+
+board = None #Set by sim.install()
+
+PWRON_RESET = 0
+WDT_RESET = 1
+SOFT_RESET = 4
+DEEPSLEEP_RESET = 5
+HARD_RESET = 6
+DEEPSLEEP = 4
+IDLE = 1
+SLEEP = 2
+
+#Raised by deepsleep() and reset(), the runner restarts the firmware after ms
+class Restart(Exception):
+    def __init__(self,cause,ms=0):
+        Exception.__init__(self, cause, ms)
+        self.cause = cause
+        self.ms = ms
+
+def unique_id():
+    return board.uniqueId
+
+def reset_cause():
+    return board.resetCause
+
+def freq(value=None):
+    if value is None:
+        return board.cpuFreq
+    board.cpuFreq = value
+
+def idle():
+    pass
+
+def reset():
+    raise Restart(SOFT_RESET)
+
+def deepsleep(ms=None):
+    if ms is None:
+        ms = board.rtcAlarmMs
+    raise Restart(DEEPSLEEP_RESET, ms)
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self,id,mode=-1,pull=-1,value=None):
+        self.id = id
+        self.state = board.PinState(id)
+        self.init(mode, pull, value)
+
+    def init(self,mode=-1,pull=-1,value=None):
+        if mode != -1:
+            self.state.mode = mode
+        if pull not in (-1, None):
+            self.state.pull = pull
+        if value is not None:
+            self.value(value)
+
+    def value(self,v=None):
+        if v is None:
+            return self.state.level
+        board.DrivePin(self.id, 1 if v else 0)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def __call__(self,v=None):
+        return self.value(v)
+
+    def irq(self,trigger=IRQ_FALLING | IRQ_RISING,handler=None):
+        self.state.trigger = trigger
+        self.state.handler = handler
+        self.state.pin = self
+
+    def __repr__(self):
+        return "Pin(%d)" % self.id
+
+class PWM:
+    def __init__(self,pin,freq=None,duty=None):
+        self.pin = pin
+        self.freqValue = 1000
+        self.dutyValue = 512
+        self.active = True
+        self.changes = 0 #Number of duty cycle changes (for tests)
+        self.writes = 0 #Number of duty cycle writes, changed or not
+        board.pwms[pin.id] = self
+        if freq is not None:
+            self.freq(freq)
+        if duty is not None:
+            self.duty(duty)
+
+    def freq(self,value=None):
+        if value is None:
+            return self.freqValue
+        self.freqValue = value
+
+    def duty(self,value=None):
+        if value is None:
+            return self.dutyValue
+        value = min(max(int(value), 0), 1023)
+        self.writes += 1
+        if value != self.dutyValue:
+            self.changes += 1
+        self.dutyValue = value
+
+    def init(self,freq=None,duty=None):
+        self.active = True
+        if freq is not None:
+            self.freq(freq)
+        if duty is not None:
+            self.duty(duty)
+
+    def deinit(self):
+        self.active = False
+
+class RTC:
+    ALARM0 = 0
+
+    def __init__(self,id=0):
+        pass
+
+    def datetime(self,dt=None):
+        if dt is None:
+            return board.RtcDatetime()
+        board.SetRtc(dt)
+
+    def memory(self,data=None):
+        if data is None:
+            return bytes(board.rtcMemory)
+        if len(data) > 492:
+            raise ValueError("buffer too long")
+        board.rtcMemory = bytes(data)
+
+    def irq(self,trigger=ALARM0,wake=None):
+        pass
+
+    def alarm(self,id,time):
+        board.rtcAlarmMs = time
+
+    def alarm_left(self,id=0):
+        return board.rtcAlarmMs
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self,id=-1):
+        self.id = id
+        self.event = None
+        self.callback = None
+        self.periodUs = 0
+        self.mode = Timer.ONE_SHOT
+        board.timers.append(self)
+
+    def init(self,mode=PERIODIC,period=-1,callback=None,freq=-1):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self.periodUs = max(int(period * 1000), 1000) #Software timers have 1ms resolution
+        self.mode = mode
+        self.callback = callback
+        self.event = board.clock.Schedule(board.clock.us + self.periodUs, self.__Fire)
+
+    def deinit(self):
+        board.clock.Cancel(self.event)
+        self.event = None
+
+    def __Fire(self,now):
+        if self.mode == Timer.PERIODIC:
+            self.event = board.clock.Schedule(now + self.periodUs, self.__Fire)
+        else:
+            self.event = None
+        if self.callback is not None:
+            self.callback(self)
+
+class I2C:
+    #I2C(-1, scl, sda) is software I2C, I2C(0, ...) hardware where the port has it (not the ESP8266)
+    def __init__(self,id=-1,scl=None,sda=None,freq=400000,timeout=255):
+        if id != -1:
+            raise ValueError("I2C(%d) doesn't exist" % id)
+        self.id = id
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+        self.bus = board.bus
+
+    def init(self,scl=None,sda=None,freq=400000):
+        self.freq = freq
+
+    def scan(self):
+        return self.bus.Scan(self.freq)
+
+    def writeto(self,addr,buf,stop=True):
+        self.bus.Write(self.freq, addr, buf, stop)
+        return len(buf)
+
+    def readfrom(self,addr,nbytes,stop=True):
+        return self.bus.Read(self.freq, addr, nbytes, stop)
+
+    def readfrom_into(self,addr,buf,stop=True):
+        buf[:] = self.bus.Read(self.freq, addr, len(buf), stop)
+
+    def writeto_mem(self,addr,memaddr,buf,addrsize=8):
+        self.bus.Write(self.freq, addr, bytes((memaddr,)) + bytes(buf))
+
+    def readfrom_mem(self,addr,memaddr,nbytes,addrsize=8):
+        return self.bus.ReadMem(self.freq, addr, memaddr, nbytes)
+
+    def readfrom_mem_into(self,addr,memaddr,buf,addrsize=8):
+        buf[:] = self.bus.ReadMem(self.freq, addr, memaddr, len(buf))
+
+#Software I2C has the same interface
+SoftI2C = I2C
+
+def time_pulse_us(pin,level,timeout=1000000):
+    return -2
+
+def disable_irq():
+    return 0
+
+def enable_irq(state=0):
+    pass
@@ -0,0 +1,33 @@
+#Stand-in for the micropython module
+board = None #Set by sim.install()
+
+def const(value):
+    return value
+
+#Run function soon, outside of interrupt context (fails when the queue is full, like on the device)
+def schedule(function,arg):
+    board.clock.Soft(function, arg)
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+def mem_info(verbose=None):
+    print("mem: simulated")
+
+def opt_level(level=None):
+    return 0
+
+def heap_lock():
+    pass
+
+def heap_unlock():
+    return 0
+
+def kbd_intr(chr):
+    pass
+
+#Native code emitters have no effect on the host
+def native(function):
+    return function
+
+viper = native
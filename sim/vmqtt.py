@@ -0,0 +1,169 @@
+#In-process MQTT broker and stand-in for umqtt.simple
+## The broker can be killed and restarted to exercise reconnection, and records everything
+## published to it
+import errno
+
+board = None #Set by sim.install()
+
+#Modelled network times (us)
+CONNECT_US = 40000 #TCP connect and CONNECT/CONNACK
+SUBSCRIBE_US = 10000 #SUBSCRIBE/SUBACK round trip
+PUBLISH_US = 1500 #QoS 0 publish (socket write)
+POLL_US = 200 #Non-blocking socket poll
+
+class MQTTException(Exception):
+    pass
+
+#Topic filter match with + and # wildcards
+def TopicMatches(pattern,topic):
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, level in enumerate(p):
+        if level == '#':
+            return True
+        if i >= len(t) or (level != '+' and level != t[i]):
+            return False
+    return len(p) == len(t)
+
+#Connection from a client
+class Session:
+    def __init__(self,broker,clientId):
+        self.broker = broker
+        self.clientId = clientId
+        self.subscriptions = []
+        self.inbox = []
+        self.alive = True
+
+    def close(self):
+        if self.alive:
+            self.alive = False
+            self.broker.Drop(self)
+
+class Broker:
+    def __init__(self):
+        self.running = True
+        self.sessions = []
+        self.retained = {}
+        self.log = [] #(time us, client id, topic, payload) of every publish received
+        self.connects = 0
+        self.bytesIn = 0 #Topic and payload bytes published to the broker
+        self.bytesOut = 0 #Topic and payload bytes delivered to clients
+
+    #Stop broker, dropping all connections
+    def Kill(self):
+        self.running = False
+        for session in list(self.sessions):
+            session.alive = False
+        self.sessions = []
+
+    def Start(self):
+        self.running = True
+
+    def Connect(self,clientId):
+        if not self.running:
+            raise OSError(errno.ECONNREFUSED, "broker not running")
+        session = Session(self, clientId)
+        self.sessions.append(session)
+        self.connects += 1
+        return session
+
+    def Drop(self,session):
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    def Subscribe(self,session,topic):
+        session.subscriptions.append(topic)
+        for name, payload in self.retained.items():
+            if TopicMatches(topic, name):
+                session.inbox.append((name, payload))
+
+    #Publish message (from a client, or from the test harness when session is None)
+    def Publish(self,topic,payload,retain=False,session=None):
+        if isinstance(topic, bytes):
+            topic = topic.decode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        payload = bytes(payload)
+        self.bytesIn += len(topic) + len(payload)
+        self.log.append((board.clock.us, None if session is None else session.clientId, topic, payload))
+        if retain:
+            self.retained[topic] = payload
+        for target in self.sessions:
+            if any(TopicMatches(pattern, topic) for pattern in target.subscriptions):
+                target.inbox.append((topic, payload))
+
+    #Messages published on topic (payloads)
+    def Messages(self,topic):
+        return [entry[3] for entry in self.log if entry[2] == topic]
+
+class MQTTClient:
+    def __init__(self,client_id,server,port=0,user=None,password=None,keepalive=0,ssl=False,ssl_params={}):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.cb = None
+        self.sock = None
+        self.published = 0 #Counts for tests
+        self.publishedBytes = 0
+
+    def set_callback(self,f):
+        self.cb = f
+
+    def set_last_will(self,topic,msg,retain=False,qos=0):
+        pass
+
+    def __Broker(self):
+        if not board.Wlan(0).active or not board.StationConnected():
+            raise OSError(errno.EHOSTUNREACH, "network unreachable")
+        broker = board.brokers.get(self.server)
+        if broker is None:
+            raise OSError(errno.ETIMEDOUT, "no broker at %s" % self.server)
+        return broker
+
+    def __Session(self):
+        if self.sock is None or not self.sock.alive or not board.StationConnected():
+            raise OSError(errno.ECONNRESET, "connection lost")
+        return self.sock
+
+    def connect(self,clean_session=True):
+        board.clock.Advance(CONNECT_US)
+        self.sock = self.__Broker().Connect(self.client_id)
+        return False
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+
+    def ping(self):
+        self.__Session()
+
+    def publish(self,topic,msg,retain=False,qos=0):
+        session = self.__Session()
+        board.clock.Advance(PUBLISH_US)
+        session.broker.Publish(topic, msg, retain, session)
+        self.published += 1
+        self.publishedBytes += len(topic) + len(msg)
+
+    def subscribe(self,topic,qos=0):
+        session = self.__Session()
+        board.clock.Advance(SUBSCRIBE_US)
+        if isinstance(topic, bytes):
+            topic = topic.decode()
+        session.broker.Subscribe(session, topic)
+
+    #Deliver one pending message, if any
+    def check_msg(self):
+        session = self.__Session()
+        board.clock.Advance(POLL_US)
+        if not session.inbox:
+            return None
+        topic, payload = session.inbox.pop(0)
+        session.broker.bytesOut += len(topic) + len(payload)
+        self.cb(topic.encode(), payload)
+
+    def wait_msg(self):
+        session = self.__Session()
+        while not session.inbox:
+            board.clock.Advance(POLL_US)
+            session = self.__Session()
+        self.check_msg()
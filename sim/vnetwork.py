@@ -0,0 +1,111 @@
+#Stand-in for the MicroPython network module (ESP8266 WLAN)
+## A single access point is modelled with connection times for a full join (scan, association
+## and DHCP) and a fast join (known BSSID and reused IP settings)
+board = None #Set by sim.install()
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = 2
+STAT_NO_AP_FOUND = 3
+STAT_CONNECT_FAIL = 4
+STAT_GOT_IP = 5
+
+#Modelled times (ms)
+SCAN_MS = 2200 #Active scan of all channels
+FIND_MS = 1800 #Finding the access point when joining without a BSSID
+ASSOC_MS = 300 #Authentication and association
+DHCP_MS = 900 #DHCP lease
+
+#Access point seen by the station
+class AccessPoint:
+    def __init__(self,ssid="EEERover",password="exhibition",bssid=b'\x02\x00\x00\x00\x00\x01',channel=6,rssi=-55):
+        self.ssid = ssid
+        self.password = password
+        self.bssid = bssid
+        self.channel = channel
+        self.rssi = rssi
+        self.up = True
+        self.lease = ('192.168.0.42', '255.255.255.0', '192.168.0.1', '192.168.0.1')
+
+class WLAN:
+    def __init__(self,interface=STA_IF):
+        self.interface = interface
+        self.state = board.Wlan(interface)
+
+    def active(self,is_active=None):
+        if is_active is None:
+            return self.state.active
+        self.state.active = bool(is_active)
+        if not is_active:
+            self.state.connectedAt = None
+
+    def connect(self,ssid=None,password=None,bssid=None):
+        state = self.state
+        ap = board.ap
+        state.status = STAT_CONNECTING
+        state.connectedAt = None
+        if not state.active or not ap.up or ssid != ap.ssid:
+            state.status = STAT_NO_AP_FOUND
+            return
+        if password != ap.password:
+            state.status = STAT_WRONG_PASSWORD
+            return
+        delay = ASSOC_MS
+        if bssid is None or bytes(bssid) != ap.bssid:
+            delay += FIND_MS
+        if state.ifconfig is None: #DHCP
+            delay += DHCP_MS
+        state.connectedAt = board.clock.us + delay * 1000
+
+    def disconnect(self):
+        self.state.connectedAt = None
+        self.state.status = STAT_IDLE
+
+    def isconnected(self):
+        state = self.state
+        if state.connectedAt is None or not board.ap.up:
+            return False
+        if board.clock.us < state.connectedAt:
+            return False
+        state.status = STAT_GOT_IP
+        if state.ifconfig is None:
+            state.ifconfig = board.ap.lease
+        return True
+
+    def status(self,param=None):
+        if param == 'rssi':
+            return board.ap.rssi
+        self.isconnected()
+        return self.state.status
+
+    def scan(self):
+        board.clock.Advance(SCAN_MS * 1000)
+        ap = board.ap
+        if not ap.up:
+            return []
+        return [(ap.ssid.encode(), ap.bssid, ap.channel, ap.rssi, 3, False)]
+
+    def ifconfig(self,config=None):
+        if config is None:
+            if self.state.ifconfig is None:
+                return ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+            return self.state.ifconfig
+        if not isinstance(config, (tuple, list)): #No ifconfig('dhcp') on the ESP8266 port
+            raise TypeError("object '%s' isn't a tuple or list" % type(config).__name__)
+        self.state.ifconfig = tuple(config) #Static configuration, DHCP client stays stopped until reset
+
+    def config(self,*args,**kwargs):
+        if args == ('mac',):
+            return b'\x5c\xcf\x7f\x00\x00\x01'
+        if args == ('essid',):
+            return board.ap.ssid
+
+#Interface state (kept by the board across firmware restarts)
+class WlanState:
+    def __init__(self):
+        self.active = False
+        self.status = STAT_IDLE
+        self.connectedAt = None
+        self.ifconfig = None
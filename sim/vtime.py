@@ -0,0 +1,57 @@
+#Stand-in for the MicroPython time module, running on the virtual clock
+## Seconds since epoch use the MicroPython epoch (2000-01-01) and come from the virtual RTC
+import time as _time
+import calendar
+
+board = None #Set by sim.install()
+
+EPOCH_OFFSET = 946684800 #Seconds from 1970-01-01 to 2000-01-01
+TICKS_PERIOD = 1 << 30 #ticks_* values wrap like on the device
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+def sleep(seconds):
+    board.clock.Advance(seconds * 1000000)
+
+def sleep_ms(ms):
+    board.clock.Advance(ms * 1000)
+
+def sleep_us(us):
+    board.clock.Advance(us)
+
+def ticks_ms():
+    return (board.clock.us // 1000) & TICKS_MAX
+
+def ticks_us():
+    return board.clock.us & TICKS_MAX
+
+def ticks_cpu():
+    return ticks_us()
+
+def ticks_add(ticks,delta):
+    return (ticks + delta) & TICKS_MAX
+
+def ticks_diff(ticks1,ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+def time():
+    return board.RtcSeconds()
+
+def time_ns():
+    return board.RtcSeconds() * 1000000000 + (board.clock.us % 1000000) * 1000
+
+#(year, month, mday, hour, minute, second, weekday, yearday), weekday 0 is Monday
+def localtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _time.gmtime(int(secs) + EPOCH_OFFSET)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+gmtime = localtime
+
+def mktime(t):
+    return calendar.timegm((t[0], t[1], t[2], t[3], t[4], t[5], 0, 0, 0)) - EPOCH_OFFSET
+
+#Anything else (struct_time, perf_counter, ...) is the host time module, for host libraries
+def __getattr__(name):
+    return getattr(_time, name)
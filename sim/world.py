@@ -0,0 +1,81 @@
+#Light seen by the virtual sensors
+## Ambient light plus the light from the three LEDs (driven by the virtual PWM outputs)
+
+#Relative response of the sensor red, green, blue channels to each light source
+AMBIENT_COLOUR = (0.30, 0.40, 0.30)
+LED_COLOUR = (
+    (0.85, 0.10, 0.05), #Red LED
+    (0.10, 0.80, 0.10), #Green LED
+    (0.05, 0.15, 0.80)  #Blue LED
+)
+LED_PINS = (14, 12, 13) #PWM pins of red, green, blue LEDs
+DUTY_MAX = 1023 #LEDs are off at max duty cycle (active low)
+#TSL2561 CS package lux coefficients (ratio threshold, CH0 coefficient, CH1 coefficient)
+TSL_COEFFS = (
+    (0.13, 0.0315, 0.0262),
+    (0.26, 0.0337, 0.0430),
+    (0.39, 0.0363, 0.0529),
+    (0.52, 0.0392, 0.0605),
+    (0.65, 0.0229, 0.0291),
+    (0.80, 0.0157, 0.0180),
+    (1.30, 0.00338, 0.0026)
+)
+TCS_DF = 310 #TCS34725 device factor (lux per count per ms at 1x gain)
+
+class World:
+    #Constructor
+    ## ambientLux: constant or function of time (seconds) giving the ambient light level
+    ## ledLux: light at the sensors from each LED fully on
+    def __init__(self,board,ambientLux=200.0,irRatio=0.25,ledLux=150.0):
+        self.board = board
+        self.ambientLux = ambientLux
+        self.irRatio = irRatio #Infrared over visible+infrared (TSL2561 CH1/CH0)
+        self.ledLux = ledLux
+
+    #Ambient light level now
+    def Ambient(self):
+        if callable(self.ambientLux):
+            return float(self.ambientLux(self.board.clock.us / 1000000))
+        return float(self.ambientLux)
+
+    #On fraction of each LED from the PWM duty cycles
+    def LedLevels(self):
+        levels = []
+        for pin in LED_PINS:
+            pwm = self.board.pwms.get(pin)
+            if pwm is None or not pwm.active:
+                levels.append(0.0)
+            else:
+                levels.append(max(DUTY_MAX - pwm.dutyValue, 0) / DUTY_MAX)
+        return levels
+
+    #Total light level (lux) and response of red, green, blue channels (lux weighted)
+    def Light(self):
+        ambient = self.Ambient()
+        rgb = [ambient * c for c in AMBIENT_COLOUR]
+        lux = ambient
+        for level, colour in zip(self.LedLevels(), LED_COLOUR):
+            lux += level * self.ledLux
+            for c in range(3):
+                rgb[c] += level * self.ledLux * colour[c]
+        return lux, rgb
+
+    #TSL2561 raw channel counts at 402ms and 16x gain (inverse of the datasheet lux calculation)
+    def TslCounts(self):
+        lux, rgb = self.Light()
+        ratio = self.irRatio
+        for k, b, m in TSL_COEFFS:
+            if ratio <= k:
+                break
+        perCount = b - m * ratio
+        ch0 = lux / perCount if perCount > 0 else 0.0
+        return ch0, ch0 * ratio
+
+    #TCS34725 raw counts (red, green, blue, clear) per ms of integration at 1x gain
+    def TcsCounts(self):
+        lux, rgb = self.Light()
+        scale = 1 / TCS_DF
+        red, green, blue = (v * scale for v in rgb)
+        ir = lux * self.irRatio * scale
+        #Each channel also sees infrared, clear sees everything
+        return red + ir, green + ir, blue + ir, red + green + blue + ir
@@ -0,0 +1,83 @@
+#Store-and-forward queue for messages that could not be sent
+## Messages are kept in a small number of preallocated RAM slots, the oldest being
+## spilled to an append-only log file in flash when the slots are full
+## Log record: length (H) followed by message bytes
+import ustruct
+import array
+import os
+
+class Spool:
+    #Constructor
+    def __init__(self,slots=2,slotSize=1024,path="spool.bin",maxLogBytes=32768):
+        self.slots = [bytearray(slotSize) for i in range(slots)]
+        self.slotViews = [memoryview(slot) for slot in self.slots]
+        self.lengths = array.array("H", [0] * slots)
+        self.head = 0 #Oldest RAM slot
+        self.count = 0 #Used RAM slots
+        self.path = path
+        self.maxLogBytes = maxLogBytes
+        self.lenBuf = bytearray(2)
+        self.dropped = 0 #Messages lost because the log was full
+        #Resume log left from before a reset (read position is not kept, so the whole log is resent)
+        try:
+            self.logSize = os.stat(path)[6]
+        except OSError:
+            self.logSize = 0
+        self.logOffset = 0 #Read position of oldest unsent message in log
+
+    #Number of unsent messages in RAM, and whether the log holds unsent messages
+    def Pending(self):
+        return self.count, self.logOffset < self.logSize
+
+    #Queue a message, spilling the oldest RAM message to flash if the slots are full
+    def Put(self,msg):
+        if len(msg) > len(self.slots[0]):
+            raise Exception("Message too large for spool")
+        if self.count == len(self.slots):
+            self.__Spill()
+        i = (self.head + self.count) % len(self.slots)
+        self.slots[i][:len(msg)] = msg
+        self.lengths[i] = len(msg)
+        self.count += 1
+
+    #Move oldest RAM message to the log
+    def __Spill(self):
+        length = self.lengths[self.head]
+        if self.logSize + 2 + length <= self.maxLogBytes:
+            ustruct.pack_into("<H", self.lenBuf, 0, length)
+            with open(self.path, "ab") as log:
+                log.write(self.lenBuf)
+                log.write(self.slotViews[self.head][:length])
+            self.logSize += 2 + length
+        else:
+            self.dropped += 1
+        self.head = (self.head + 1) % len(self.slots)
+        self.count -= 1
+
+    #Move all RAM messages to the log (e.g. before deep sleep, which loses RAM)
+    def Flush(self):
+        while self.count:
+            self.__Spill()
+
+    #Send queued messages oldest first using send(msg), which returns False on failure
+    ## Stops at the first failure (that message stays queued), returns True when everything is sent
+    def Drain(self,send):
+        if self.logOffset < self.logSize:
+            with open(self.path, "rb") as log:
+                log.seek(self.logOffset)
+                while self.logOffset < self.logSize:
+                    log.readinto(self.lenBuf)
+                    length = ustruct.unpack_from("<H", self.lenBuf, 0)[0]
+                    msg = log.read(length)
+                    if not send(msg):
+                        return False
+                    self.logOffset += 2 + length
+            os.remove(self.path)
+            self.logSize = 0
+            self.logOffset = 0
+        while self.count:
+            if not send(self.slotViews[self.head][:self.lengths[self.head]]):
+                return False
+            self.head = (self.head + 1) % len(self.slots)
+            self.count -= 1
+        return True
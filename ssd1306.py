@@ -25,19 +25,34 @@ SET_CHARGE_PUMP     = const(0x8d)
 
 
 class SSD1306:
-    def __init__(self, width, height, external_vcc):
+    # init=False skips the reset and configuration sequence when the
+    # controller has kept its settings and display RAM (display only
+    # switched off by poweroff()), the display is just switched back on
+    def __init__(self, width, height, external_vcc, init=True):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
+        # Dirty column range of each page, only these windows are sent by
+        # show().  A page is clean when its start is past its end.
+        self.dirty_x0 = bytearray(self.pages)
+        self.dirty_x1 = bytearray(self.pages)
+        # Set to False to always send the full frame buffer on show()
+        self.partial = True
+        self.clear_dirty()
+        # Preallocated address window command sequence used by show()
+        self.winbuf = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
         # Note the subclass must initialize self.framebuf to a framebuffer.
         # This is necessary because the underlying data buffer is different
         # between I2C and SPI implementations (I2C needs an extra byte).
         self.poweron()
-        self.init_display()
+        if init:
+            self.init_display()
+        else:
+            self.write_cmd(SET_DISP | 0x01)
 
     def init_display(self):
-        for cmd in (
+        self.write_cmds((
             SET_DISP | 0x00, # off
             # address setting
             SET_MEM_ADDR, 0x00, # horizontal
@@ -58,8 +73,7 @@ class SSD1306:
             SET_NORM_INV, # not inverted
             # charge pump
             SET_CHARGE_PUMP, 0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01): # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01)) # on
         self.fill(0)
         self.show()
 
@@ -67,45 +81,96 @@ class SSD1306:
         self.write_cmd(SET_DISP | 0x00)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmds((SET_CONTRAST, contrast))
 
     def invert(self, invert):
-        self.write_cmd(SET_NORM_INV | (invert & 1))
+        self.write_cmds((SET_NORM_INV | (invert & 1),))
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    def set_window(self, x0, x1, page0, page1):
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_framebuf()
+        self.winbuf[1] = x0
+        self.winbuf[2] = x1
+        self.winbuf[4] = page0
+        self.winbuf[5] = page1
+        self.write_cmds(self.winbuf)
+
+    def show(self, full=False):
+        if full or not self.partial or self.all_dirty():
+            self.set_window(0, self.width - 1, 0, self.pages - 1)
+            self.write_framebuf()
+        else:
+            for page in range(self.pages):
+                x0 = self.dirty_x0[page]
+                x1 = self.dirty_x1[page]
+                if x0 <= x1:
+                    self.set_window(x0, x1, page, page)
+                    start = page * self.width
+                    self.write_window(start + x0, start + x1 + 1)
+        self.clear_dirty()
+
+    def clear_dirty(self):
+        for page in range(self.pages):
+            self.dirty_x0[page] = 0xff
+            self.dirty_x1[page] = 0
+
+    def all_dirty(self):
+        for page in range(self.pages):
+            if self.dirty_x0[page] != 0 or self.dirty_x1[page] != self.width - 1:
+                return False
+        return True
+
+    def mark_dirty(self, x0, y0, x1, y1):
+        # Clip the rectangle to the display
+        if x0 < 0:
+            x0 = 0
+        if y0 < 0:
+            y0 = 0
+        if x1 >= self.width:
+            x1 = self.width - 1
+        if y1 >= self.height:
+            y1 = self.height - 1
+        if x0 > x1 or y0 > y1:
+            return
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if x0 < self.dirty_x0[page]:
+                self.dirty_x0[page] = x0
+            if x1 > self.dirty_x1[page]:
+                self.dirty_x1[page] = x1
 
     def fill(self, col):
         self.framebuf.fill(col)
+        self.mark_dirty(0, 0, self.width - 1, self.height - 1)
+
+    def fill_rect(self, x, y, w, h, col):
+        self.framebuf.fill_rect(x, y, w, h, col)
+        self.mark_dirty(x, y, x + w - 1, y + h - 1)
 
     def pixel(self, x, y, col):
         self.framebuf.pixel(x, y, col)
+        self.mark_dirty(x, y, x, y)
 
     def scroll(self, dx, dy):
         self.framebuf.scroll(dx, dy)
+        self.mark_dirty(0, 0, self.width - 1, self.height - 1)
 
     def text(self, string, x, y, col=1):
         self.framebuf.text(string, x, y, col)
+        # 8x8 font
+        self.mark_dirty(x, y, x + 8 * len(string) - 1, y + 7)
 
 
 class SSD1306_I2C(SSD1306):
-    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False):
+    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False, init=True):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
+        # Command sequence buffer, first byte is the control byte Co=0, D/C#=0
+        # so every following byte in the transaction is a command
+        self.cmdbuf = bytearray(32)
+        self.cmdview = memoryview(self.cmdbuf)
         # Add an extra byte to the data buffer to hold an I2C data/command byte
         # to use hardware-compatible I2C transactions.  A memoryview of the
         # buffer is used to mask this byte from the framebuffer operations
@@ -113,19 +178,42 @@ class SSD1306_I2C(SSD1306):
         # buffer).
         self.buffer = bytearray(((height // 8) * width) + 1)
         self.buffer[0] = 0x40  # Set first byte of data buffer to Co=0, D/C=1
-        self.framebuf = framebuf.FrameBuffer1(memoryview(self.buffer)[1:], width, height)
-        super().__init__(width, height, external_vcc)
+        self.bufview = memoryview(self.buffer)
+        self.framebuf = framebuf.FrameBuffer1(self.bufview[1:], width, height)
+        super().__init__(width, height, external_vcc, init)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80 # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # Send the whole sequence in as few transactions as the buffer allows
+        buf = self.cmdbuf
+        n = 0
+        for cmd in cmds:
+            n += 1
+            buf[n] = cmd
+            if n == len(buf) - 1:
+                self.i2c.writeto(self.addr, buf)
+                n = 0
+        if n:
+            self.i2c.writeto(self.addr, self.cmdview[:n + 1])
+
     def write_framebuf(self):
         # Blast out the frame buffer using a single I2C transaction to support
         # hardware I2C interfaces.
         self.i2c.writeto(self.addr, self.buffer)
 
+    def write_window(self, start, end):
+        # Send frame buffer bytes start to end (exclusive) in one transaction.
+        # The byte before the window is temporarily replaced with the data
+        # control byte so no separate buffer is needed.
+        saved = self.buffer[start]
+        self.buffer[start] = 0x40
+        self.i2c.writeto(self.addr, self.bufview[start:end + 1])
+        self.buffer[start] = saved
+
     def poweron(self):
         pass
 
@@ -141,7 +229,10 @@ class SSD1306_SPI(SSD1306):
         self.res = res
         self.cs = cs
         self.buffer = bytearray((height // 8) * width)
+        self.bufview = memoryview(self.buffer)
         self.framebuf = framebuf.FrameBuffer1(self.buffer, width, height)
+        self.cmdbuf = bytearray(32)
+        self.cmdview = memoryview(self.cmdbuf)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
@@ -149,7 +240,26 @@ class SSD1306_SPI(SSD1306):
         self.cs.high()
         self.dc.low()
         self.cs.low()
-        self.spi.write(bytearray([cmd]))
+        self.cmdbuf[0] = cmd
+        self.spi.write(self.cmdview[:1])
+        self.cs.high()
+
+    def write_cmds(self, cmds):
+        # Send the whole sequence with a single chip select assertion
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs.high()
+        self.dc.low()
+        self.cs.low()
+        buf = self.cmdbuf
+        n = 0
+        for cmd in cmds:
+            buf[n] = cmd
+            n += 1
+            if n == len(buf):
+                self.spi.write(buf)
+                n = 0
+        if n:
+            self.spi.write(self.cmdview[:n])
         self.cs.high()
 
     def write_framebuf(self):
@@ -160,6 +270,14 @@ class SSD1306_SPI(SSD1306):
         self.spi.write(self.buffer)
         self.cs.high()
 
+    def write_window(self, start, end):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs.high()
+        self.dc.high()
+        self.cs.low()
+        self.spi.write(self.bufview[start:end])
+        self.cs.high()
+
     def poweron(self):
         self.res.high()
         time.sleep_ms(1)
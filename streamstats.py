@@ -0,0 +1,121 @@
+#Streaming statistics of sensor readings in fixed size buffers
+## All buffers are allocated when a structure is created, adding a sample doesn't allocate.
+## Values are integers (lux, raw or normalised counts).
+
+import array
+import time
+
+#Last size samples, median of the window
+class Window:
+    #Constructor
+    def __init__(self,size):
+        self.size = size
+        self.values = array.array("l", [0] * size) #Sample ring
+        self.count = 0
+        self.pos = 0 #Ring position the next sample is written to
+        self.sorted = array.array("l", [0] * size) #Scratch for the median
+
+    #Add a sample, replacing the oldest once the window is full
+    def Add(self,value):
+        self.values[self.pos] = value
+        if self.count < self.size:
+            self.count += 1
+        self.pos = (self.pos + 1) % self.size
+
+    #Median of the window (upper median for an even count, 0 if empty)
+    ## Insertion sort of a copy, meant for small windows (outlier rejection over a few samples)
+    def Median(self):
+        n = self.count
+        if not n:
+            return 0
+        values = self.values
+        out = self.sorted
+        for i in range(n):
+            value = values[i]
+            j = i
+            while j and out[j - 1] > value:
+                out[j] = out[j - 1]
+                j -= 1
+            out[j] = value
+        return out[n >> 1]
+
+    def Clear(self):
+        self.count = 0
+        self.pos = 0
+
+#Mean of a number of channels over the samples added since it was last cleared
+## Used to summarise the samples taken between two publishes
+class Accumulator:
+    #Constructor
+    def __init__(self,channels=1):
+        self.sums = array.array("l", [0] * channels)
+        self.count = 0
+
+    #Add a sample of every channel (sequence of channels values)
+    def Add(self,values):
+        sums = self.sums
+        for c in range(len(sums)):
+            sums[c] += values[c]
+        self.count += 1
+
+    #Add a sample of a single channel accumulator
+    def Add1(self,value):
+        self.sums[0] += value
+        self.count += 1
+
+    #Mean of a channel (rounded, None if no samples)
+    def Mean(self,channel=0):
+        count = self.count
+        if not count:
+            return None
+        return (self.sums[channel] + (count >> 1)) // count
+
+    #Copy means of all channels into into (array or list), left unchanged if no samples, returns into
+    def Means(self,into):
+        count = self.count
+        if count:
+            for c in range(len(self.sums)):
+                into[c] = (self.sums[c] + (count >> 1)) // count
+        return into
+
+    def Clear(self):
+        for c in range(len(self.sums)):
+            self.sums[c] = 0
+        self.count = 0
+
+#Threshold trigger with hysteresis and a minimum dwell time
+## Turns on when the value has stayed above high for dwellMs, and off when it has stayed below low
+## for dwellMs (a value that doesn't cross the level restarts the dwell time)
+class Trigger:
+    #Constructor
+    def __init__(self,high,low,dwellMs=0):
+        if low > high:
+            raise Exception("Trigger low level above high level")
+        self.high = high
+        self.low = low
+        self.dwellMs = dwellMs
+        self.state = False
+        self.pendingMs = None #Time the value first crossed towards the other state
+        self.changes = 0 #Number of state changes
+
+    #Feed a value, returns True if the state changed
+    def Update(self,value,nowMs=None):
+        crossing = value < self.low if self.state else value > self.high
+        if not crossing:
+            self.pendingMs = None
+            return False
+        if nowMs is None:
+            nowMs = time.ticks_ms()
+        if self.pendingMs is None:
+            self.pendingMs = nowMs
+        if time.ticks_diff(nowMs, self.pendingMs) < self.dwellMs:
+            return False
+        self.state = not self.state
+        self.pendingMs = None
+        self.changes += 1
+        return True
+
+    #Force state (e.g. after the alarm has been turned off)
+    def Reset(self,state=False):
+        self.state = state
+        self.pendingMs = None
@@ -0,0 +1,133 @@
+#Batched binary telemetry
+## Samples are held in a preallocated ring and sent as a single packed frame
+##
+## Frame format (version 1, little endian):
+##- Header: version (B), sample count (B), sequence number (H), timestamp of first sample (I, seconds)
+##- Record: timestamp offset from first sample (H, seconds), lux (I), red, green, blue, clear (I each)
+## Colour is the mean of the readings taken for the sample, in counts normalised to the most sensitive
+## range of the sensor (700ms, 60x gain) rather than raw counts with their gain and integration time:
+## automatic ranging can change range between the readings a sample averages, and raw counts from
+## different ranges can't be averaged. Raw count = value * range sensitivity / 368640 (integration
+## time in 0.1ms times gain, see TCS34725Lib.AUTO_RANGES). With main.AUTO_RANGE off they are raw counts.
+import ustruct
+import array
+
+VERSION = 1
+HEADER_FMT = "<BBHI"
+HEADER_SIZE = 8
+RECORD_FMT = "<HIIIII"
+RECORD_SIZE = 22
+
+class Telemetry:
+    #Constructor
+    ## A frame is due every flushSamples samples or flushSeconds after the first buffered sample
+    def __init__(self,capacity=32,flushSamples=30,flushSeconds=30):
+        if capacity > 255: #Count has to fit in header
+            raise Exception("Telemetry capacity too large")
+        self.capacity = capacity
+        self.flushSamples = min(flushSamples, capacity)
+        self.flushSeconds = flushSeconds
+        #Sample ring
+        self.times = array.array("I", [0] * capacity)
+        self.lux = array.array("I", [0] * capacity)
+        self.colour = array.array("I", [0] * (4 * capacity)) #Red, green, blue, clear per sample
+        self.head = 0 #Index of oldest sample
+        self.count = 0
+        self.sequence = 0 #Frame sequence number (lets receiver detect lost frames)
+        self.dropped = 0 #Samples overwritten before being sent
+        #Frame buffer
+        self.frame = bytearray(HEADER_SIZE + RECORD_SIZE * capacity)
+        self.frameView = memoryview(self.frame)
+
+    #Add sample to ring, overwrites the oldest sample when full
+    def Add(self,timestamp,lux,colour):
+        if self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.dropped += 1
+        i = (self.head + self.count) % self.capacity
+        self.times[i] = timestamp
+        self.lux[i] = lux
+        for c in range(4):
+            self.colour[4 * i + c] = colour[c]
+        self.count += 1
+
+    #Check whether a sample taken at timestamp can go in the same frame as the buffered samples
+    ## Offsets from the first sample are 0 to 65535 seconds, and samples are in time order. When the
+    ## clock is set back (or jumps far ahead) the buffered samples have to be sent first.
+    def Fits(self,timestamp):
+        if not self.count:
+            return True
+        newest = self.times[(self.head + self.count - 1) % self.capacity]
+        return timestamp >= newest and timestamp - self.times[self.head] <= 0xFFFF
+
+    #Check whether a frame should be sent (also when the clock has been set back)
+    def Due(self,now):
+        if not self.count:
+            return False
+        elapsed = now - self.times[self.head]
+        return self.count >= self.flushSamples or elapsed >= self.flushSeconds or elapsed < 0
+
+    #Pack buffered samples into a frame and empty the ring, returns view of frame
+    def Pack(self):
+        base = self.times[self.head]
+        ustruct.pack_into(HEADER_FMT, self.frame, 0, VERSION, self.count, self.sequence, base)
+        offset = HEADER_SIZE
+        for n in range(self.count):
+            i = (self.head + n) % self.capacity
+            c = 4 * i
+            ustruct.pack_into(RECORD_FMT, self.frame, offset, max(0, min(self.times[i] - base, 0xFFFF)), self.lux[i],
+                self.colour[c], self.colour[c + 1], self.colour[c + 2], self.colour[c + 3])
+            offset += RECORD_SIZE
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.head = 0
+        self.count = 0
+        return self.frameView[:offset]
+
+#Publish-on-change filter
+## A sample is kept when lux or any colour channel moves by more than its threshold since the
+## last kept sample, or when heartbeat seconds have passed (so silence is not mistaken for failure)
+## The threshold is the larger of the absolute value and rel percent of the last kept value
+class Deadband:
+    #Constructor
+    def __init__(self,absLux=10,absColour=50,rel=10,heartbeat=300,enabled=True):
+        self.enabled = enabled
+        self.absLux = absLux
+        self.absColour = absColour
+        self.rel = rel
+        self.heartbeat = heartbeat
+        self.last = array.array("I", [0] * 5) #Lux, red, green, blue, clear of last kept sample
+        self.lastTime = None #Time of last kept sample (None: no sample kept yet)
+
+    #Change settings (None leaves a setting unchanged)
+    def Configure(self,enabled=None,absLux=None,absColour=None,rel=None,heartbeat=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if absLux is not None:
+            self.absLux = absLux
+        if absColour is not None:
+            self.absColour = absColour
+        if rel is not None:
+            self.rel = rel
+        if heartbeat is not None:
+            self.heartbeat = heartbeat
+
+    #Check whether value moved by more than its threshold
+    def __Moved(self,index,value,absThreshold):
+        last = self.last[index]
+        return abs(value - last) > max(absThreshold, last * self.rel // 100)
+
+    #Check whether a sample should be kept (updates last kept sample if so)
+    def Check(self,now,lux,colour):
+        elapsed = 0 if self.lastTime is None else now - self.lastTime #Negative if the clock has been set back
+        keep = not self.enabled or self.lastTime is None or elapsed >= self.heartbeat or elapsed < 0 or self.__Moved(0,lux,self.absLux)
+        for c in range(4):
+            if keep:
+                break
+            keep = self.__Moved(c + 1,colour[c],self.absColour)
+        if keep:
+            self.lastTime = now
+            self.last[0] = lux
+            for c in range(4):
+                self.last[c + 1] = colour[c]
+        return keep
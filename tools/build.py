@@ -0,0 +1,292 @@
+#Build and deploy the firmware
+## Modules are compiled to .mpy bytecode with mpy-cross, so the board doesn't compile sources at
+## import time (saves boot time and the heap spike of the compiler). main.py stays as source (the
+## board only runs main.py), with comments removed using the tokenizer so strings are untouched.
+##
+## A content hash manifest of what is on the board (deploy.json, also kept on the board) means
+## only changed files are uploaded. Files an earlier deploy recorded that are no longer built are
+## removed, as are .py files shadowing a built .mpy (the board imports .py before .mpy). Other
+## files on the board (webrepl_cfg.py, the user's own scripts and data) are left alone.
+##
+## --profile builds with the PROFILE switch of the modules set (main.py, i2cbus.py), so the
+## firmware publishes phase timings and heap figures (diag.py). Without it the switch is left as
+## in the sources (0), and the compiler drops the profiling code.
+##
+## python3 tools/build.py build                 Compile to build/
+## python3 tools/build.py manifest              Write build/manifest.py for freezing modules into firmware
+## python3 tools/build.py deploy --port PORT    Build, upload changed files, report timings
+## python3 tools/build.py probe --port PORT     Report import time and RAM of each module on the board
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tokenize
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) #Firmware sources
+BUILD_DIR = os.path.join(ROOT, "build")
+MANIFEST_NAME = "deploy.json" #Hash manifest (local copy in build/, and on the board)
+SOURCE_ONLY = ("main.py", "boot.py") #Run by the board as source
+KEEP = ("boot.py", "webrepl_cfg.py") #Board's boot script and WebREPL password are never removed
+ARCH = "xtensa" #ESP8266
+BAUD = 115200
+PROFILE_OFF = "PROFILE = const(0)" #Profiling switch as written in the sources
+PROFILE_ON = "PROFILE = const(1)"
+
+#Firmware modules (top level .py files of the repository)
+def Modules():
+    return sorted(name for name in os.listdir(ROOT) if name.endswith(".py"))
+
+#Source with comments and blank lines removed (multi-line strings are kept intact)
+def StripSource(source):
+    lines = source.splitlines(True)
+    cuts = {} #Line number: column comment starts at
+    keep = set() #Lines inside multi-line strings
+    tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            cuts[token.start[0]] = token.start[1]
+        elif token.type == tokenize.STRING and token.start[0] != token.end[0]:
+            keep.update(range(token.start[0] + 1, token.end[0] + 1))
+    out = []
+    for number, line in enumerate(lines, 1):
+        if number in cuts:
+            line = line[:cuts[number]].rstrip() + "\n"
+        if number in keep or line.strip():
+            out.append(line)
+    return "".join(out)
+
+#Source with the profiling switch turned on
+def EnableProfile(source):
+    return "".join(PROFILE_ON + line[len(PROFILE_OFF):] if line.startswith(PROFILE_OFF) else line
+        for line in source.splitlines(True))
+
+def Hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+#Compile modules into build/, returns {board file name: local path}
+def Build(mpyCross="mpy-cross",arch=ARCH,opt=None,sourceOnly=False,profile=False):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    artefacts = {}
+    for name in Modules():
+        src = os.path.join(ROOT, name)
+        if profile:
+            with open(src) as f:
+                source = f.read()
+            if PROFILE_OFF in source: #Compiled from a copy with the switch on
+                src = os.path.join(BUILD_DIR, "profile", name)
+                os.makedirs(os.path.dirname(src), exist_ok=True)
+                with open(src, "w") as f:
+                    f.write(EnableProfile(source))
+        if sourceOnly or name in SOURCE_ONLY:
+            out = os.path.join(BUILD_DIR, name)
+            with open(src) as f:
+                stripped = StripSource(f.read())
+            with open(out, "w") as f:
+                f.write(stripped)
+            artefacts[name] = out
+            continue
+        out = os.path.join(BUILD_DIR, name[:-3] + ".mpy")
+        command = [mpyCross, "-march=" + arch, "-o", out]
+        if src != os.path.join(ROOT, name):
+            command += ["-s", name] #Source name as on the board, not the copy's path
+        if opt is not None:
+            command.append("-O%d" % opt)
+        command.append(src)
+        try:
+            subprocess.run(command, check=True, cwd=ROOT)
+        except FileNotFoundError:
+            sys.exit("mpy-cross not found (pip install mpy-cross, matching the board's MicroPython version), or use --source")
+        artefacts[os.path.basename(out)] = out
+    return artefacts
+
+#Frozen module manifest for building the modules into the firmware image
+## Frozen modules run from flash, so they take no heap for their bytecode at all
+def WriteManifest(path=None):
+    path = path if path is not None else os.path.join(BUILD_DIR, "manifest.py")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    modules = [name for name in Modules() if name not in SOURCE_ONLY]
+    with open(path, "w") as f:
+        f.write("# Sun-Lite modules frozen into the firmware (pass as FROZEN_MANIFEST to make)\n")
+        f.write("include(\"$(PORT_DIR)/boards/manifest.py\")\n")
+        f.write("freeze(%r, (\n" % ROOT)
+        for name in modules:
+            f.write("    %r,\n" % name)
+        f.write("))\n")
+    return path
+
+class Board:
+    #Board filesystem access through ampy
+    def __init__(self,port,baud=BAUD,dryRun=False):
+        self.port = port
+        self.baud = baud
+        self.dryRun = dryRun
+
+    def Ampy(self,*args,capture=False):
+        command = ["ampy", "-p", self.port, "-b", str(self.baud)] + list(args)
+        if self.dryRun:
+            print(" ".join(command))
+            return ""
+        result = subprocess.run(command, check=True, stdout=subprocess.PIPE if capture else None, universal_newlines=True)
+        return result.stdout if capture else ""
+
+    def List(self):
+        if self.dryRun:
+            return []
+        return [name.lstrip("/") for name in self.Ampy("ls", capture=True).split()]
+
+    #Manifest on the board (None if missing or unreadable)
+    def Manifest(self):
+        if self.dryRun:
+            return None
+        try:
+            return json.loads(self.Ampy("get", MANIFEST_NAME, capture=True))
+        except (subprocess.CalledProcessError, ValueError):
+            return None
+
+    def Put(self,local,name):
+        self.Ampy("put", local, name)
+
+    def Remove(self,name):
+        self.Ampy("rm", name)
+
+    def Reset(self):
+        self.Ampy("reset")
+
+    #Run a script on the board and return its output
+    def Run(self,script):
+        return self.Ampy("run", script, capture=True)
+
+#Upload artefacts that differ from the board's manifest, returns report
+def Deploy(board,artefacts):
+    localManifest = os.path.join(BUILD_DIR, "deploy-%s.json" % os.path.basename(board.port))
+    remote = board.Manifest()
+    if remote is None: #No manifest on board (first deploy, or flashed by hand), fall back to local record
+        try:
+            with open(localManifest) as f:
+                remote = json.load(f)
+        except (OSError, ValueError):
+            remote = {}
+    hashes = {name: Hash(path) for name, path in artefacts.items()}
+    changed = [name for name in sorted(hashes) if remote.get(name) != hashes[name]]
+    #Files to remove: deployed earlier but no longer built, or source shadowing a compiled module
+    shadowing = set(name for name in board.List() if name.endswith(".py") and name[:-3] + ".mpy" in hashes)
+    stale = sorted(name for name in set(remote) | shadowing if name not in hashes and name not in KEEP)
+    start = time.time()
+    for name in stale:
+        print("Removing", name)
+        try:
+            board.Remove(name)
+        except subprocess.CalledProcessError: #Already gone
+            pass
+    for name in changed:
+        print("Uploading", name)
+        board.Put(artefacts[name], name)
+    manifestPath = os.path.join(BUILD_DIR, MANIFEST_NAME)
+    with open(manifestPath, "w") as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    if changed or stale:
+        board.Put(manifestPath, MANIFEST_NAME)
+    deploySeconds = time.time() - start
+    if not board.dryRun:
+        with open(localManifest, "w") as f:
+            json.dump(hashes, f, indent=1, sort_keys=True)
+    return {
+        'uploaded': changed,
+        'removed': stale,
+        'unchanged': len(hashes) - len(changed),
+        'upload_bytes': sum(os.path.getsize(artefacts[name]) for name in changed),
+        'deploy_s': round(deploySeconds, 2)
+    }
+
+#Script run on the board to time each import and measure the heap it takes
+## ampy runs it after a soft reset in raw REPL mode, so main.py hasn't run and nothing is imported.
+## alloc is heap used by the import before collection (compiler/loader garbage included), resident
+## is what is left after collection. Modules imported by an earlier module are already loaded, so
+## their cost is counted there. main.py is compiled (not run) to time the source it still has.
+PROBE = """
+import gc, time
+result = {}
+for name in %r:
+    gc.collect()
+    free = gc.mem_free()
+    start = time.ticks_us()
+    __import__(name)
+    us = time.ticks_diff(time.ticks_us(), start)
+    alloc = free - gc.mem_free()
+    gc.collect()
+    result[name] = (us, alloc, free - gc.mem_free())
+gc.collect()
+free = gc.mem_free()
+try:
+    with open('main.py') as f:
+        start = time.ticks_us()
+        code = compile(f.read(), 'main.py', 'exec')
+    result['main.py'] = (time.ticks_diff(time.ticks_us(), start), free - gc.mem_free(), 0)
+    del code
+except (OSError, NameError, MemoryError):
+    pass
+gc.collect()
+print('PROBE', result, gc.mem_free())
+"""
+
+#Import time and RAM of each module on the board
+def Probe(board):
+    modules = [name[:-3] for name in Modules() if name not in SOURCE_ONLY]
+    script = os.path.join(BUILD_DIR, "probe.py")
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(script, "w") as f:
+        f.write(PROBE % (modules,))
+    output = board.Run(script)
+    for line in output.splitlines():
+        if line.startswith("PROBE"):
+            body, free = line[6:].rsplit(" ", 1)
+            imports = eval(body, {})
+            return {
+                'imports': {name: {'us': v[0], 'alloc_bytes': v[1], 'resident_bytes': v[2]} for name, v in imports.items()},
+                'boot_us': sum(v[0] for v in imports.values()), #Imports and main.py compile
+                'peak_import_alloc_bytes': max(v[1] for v in imports.values()),
+                'mem_free_after_imports': int(free)
+            }
+    return {'error': 'no probe output', 'output': output}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and deploy Sun-Lite firmware")
+    parser.add_argument("command", choices=("build", "manifest", "deploy", "probe"))
+    parser.add_argument("--port", help="serial port of the board")
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="mpy-cross executable (same version as the board firmware)")
+    parser.add_argument("--arch", default=ARCH)
+    parser.add_argument("-O", dest="opt", type=int, default=None, help="mpy-cross optimisation level")
+    parser.add_argument("--source", action="store_true", help="upload stripped sources instead of .mpy")
+    parser.add_argument("--profile", action="store_true", help="build with profiling on (diagnostics published on esys/tbd/diag)")
+    parser.add_argument("--no-probe", action="store_true", help="don't measure import time/RAM after deploying")
+    parser.add_argument("--dry-run", action="store_true", help="print board commands instead of running them")
+    args = parser.parse_args()
+
+    if args.command == "manifest":
+        print(WriteManifest())
+        return
+    if args.command == "build":
+        for name, path in sorted(Build(args.mpy_cross, args.arch, args.opt, args.source, args.profile).items()):
+            print(name, os.path.getsize(path))
+        return
+    if args.port is None:
+        parser.error("--port is needed for " + args.command)
+    board = Board(args.port, args.baud, args.dry_run)
+    report = {}
+    if args.command == "deploy":
+        report['deploy'] = Deploy(board, Build(args.mpy_cross, args.arch, args.opt, args.source, args.profile))
+    if args.command == "probe" or (not args.no_probe and not args.dry_run):
+        report['boot'] = Probe(board)
+    board.Reset() #Start firmware
+    print(json.dumps(report, indent=2))
+    with open(os.path.join(BUILD_DIR, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,25 @@ def TurnOffAlarm():
     client.loop_start()
     data = json.dumps({'command':'alarm'})
     client.publish("esys/tbd/command", data)
+def SetDeadband(enable=None,lux=None,colour=None,rel=None,heartbeat=None):
+    client = paho.Client()
+    client.connect("192.168.0.10")
+    client.loop_start()
+    command = {'command':'deadband'}
+    for key, value in (('enable',enable),('lux',lux),('colour',colour),('rel',rel),('heartbeat',heartbeat)):
+        if value is not None:
+            command[key] = value
+    data = json.dumps(command)
+    client.publish("esys/tbd/command", data)
+def AddAlarm(hour,minute,days=0x7F,once=False):
+    client = paho.Client()
+    client.connect("192.168.0.10")
+    client.loop_start()
+    data = json.dumps({'command':'addalarm','hour':hour,'min':minute,'days':days,'once':once})
+    client.publish("esys/tbd/command", data)
+def ClearAlarms():
+    client = paho.Client()
+    client.connect("192.168.0.10")
+    client.loop_start()
+    data = json.dumps({'command':'clearalarms'})
+    client.publish("esys/tbd/command", data)
@@ -0,0 +1,30 @@
+# pip install paho-mqtt
+# Decoder for the batched telemetry frames sent by the device
+# Colour channels are counts normalised to the 700ms, 60x gain range (see Telemetry in README.md)
+import struct
+import paho.mqtt.client as paho
+VERSION = 1
+TOPIC = "esys/tbd/telemetry/v%d" % VERSION
+HEADER_FMT = "<BBHI"
+RECORD_FMT = "<HIIIII"
+def DecodeFrame(payload):
+    version, count, sequence, base = struct.unpack_from(HEADER_FMT, payload, 0)
+    if version != VERSION:
+        raise ValueError("Unsupported telemetry version %d" % version)
+    samples = []
+    offset = struct.calcsize(HEADER_FMT)
+    for i in range(count):
+        dt, lux, red, green, blue, clear = struct.unpack_from(RECORD_FMT, payload, offset)
+        samples.append({'time':base + dt,'lux':lux,'red':red,'green':green,'blue':blue,'clear':clear})
+        offset += struct.calcsize(RECORD_FMT)
+    return sequence, samples
+def PrintTelemetry():
+    def on_message(client, userdata, msg):
+        sequence, samples = DecodeFrame(msg.payload)
+        for sample in samples:
+            print(sequence, sample)
+    client = paho.Client()
+    client.on_message = on_message
+    client.connect("192.168.0.10")
+    client.subscribe(TOPIC)
+    client.loop_forever()